@@ -0,0 +1,282 @@
+"""HTML fixtures for the benchmarks and the local server that serves them.
+
+A fixture directory holds an index.json mapping request paths (with their
+query string) to files. It is either generated here, deterministically
+from a seed, in the markup the static parsers read, or recorded from the
+live site with ``python -m benchmarks.fixtures record`` so runs can be
+repeated against real pages without the network.
+
+The server can also play a struggling site: a fixed latency per request,
+a random share of 503s, and 429s for requests beyond a concurrency
+capacity. ``python -m benchmarks.fixtures serve`` runs it on its own, to
+point a crawler's --base-url (or BASE_URL) at.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin, urlsplit
+
+from data_acquisition.case_law.courts_and_tribunals.case_parser import NOT_FOUND_MARKER
+
+INDEX = "index.json"
+LISTING_PATH = "/judgments/KEBENCH/BENCH/"
+CONSTITUTION_PATH = "/akn/ke/act/2010/constitution/eng@2010-09-03"
+CASES_PER_LISTING_PAGE = 10
+
+NOT_FOUND_PAGE = f'<html><body><h1 class="mb-4">{NOT_FOUND_MARKER}</h1></body></html>'
+
+_WORDS = ("court appeal petitioner respondent judgment ruling evidence section article constitution "
+          "tribunal held that the applicant honourable learned counsel submitted act order costs "
+          "jurisdiction law of and in to is was by for with under trial magistrate high").split()
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng):
+    return " ".join(_sentence(rng, rng.randint(8, 25)) for _ in range(rng.randint(2, 6)))
+
+
+def judgment_page(rng, number, paragraphs):
+    year = 2000 + number % 24
+    body = "".join(
+        f'<section class="akn-paragraph"><span class="akn-num">{i}.</span>'
+        f'<span class="akn-content">{_paragraph(rng)} See [{year - 1}] KEHC {rng.randint(1, 999)} (KLR).</span></section>'
+        for i in range(1, paragraphs + 1)
+    )
+    return (
+        "<html><body>"
+        '<div id="header">'
+        f'<h1 class="doc-title">Petitioner {number} v Respondent {number} [{year}] KEBENCH {number} (KLR)</h1>'
+        f'<dl><dt>Citation</dt><dd class="neutral-citation">[{year}] KEBENCH {number} (KLR)</dd>'
+        '<dt>Court</dt><dd class="doc-authority">Benchmark Court</dd>'
+        f'<dt>Case Number</dt><dd class="docket-number">Petition {number} of {year}</dd>'
+        f'<dt>Judgment Date</dt><dd class="doc-date">{rng.randint(1, 28)} March {year}</dd></dl>'
+        f'<div class="header-note">Judgment {number}</div>'
+        '<div class="parties-listing">'
+        f'<div class="parties-listing"><div class="akn-div">Petitioner {number}</div><div class="akn-div">Petitioner</div></div>'
+        f'<div class="parties-listing"><div class="akn-div">Respondent {number}</div><div class="akn-div">Respondent</div></div>'
+        "</div></div>"
+        f'<div id="judgmentBody">{body}</div>'
+        '<div id="conclusions"></div>'
+        "</body></html>"
+    )
+
+
+def listing_page(page, last_page, links):
+    rows = "".join(f'<tr><td class="cell-title"><a href="{link}">Case</a></td></tr>' for link in links)
+    pagination = "".join(f'<li><a href="?page={n}">{n}</a></li>' for n in range(1, last_page + 1))
+    return f'<html><body><table>{rows}</table><ul class="pagination">{pagination}</ul></body></html>'
+
+
+def constitution_page(rng, chapters, sections):
+    parts = ['<html><body><div class="coverpage"><h1>The Constitution of Kenya (Benchmark)</h1></div>',
+             '<div class="publication-info">Benchmark edition</div>']
+    for number in range(1, 4):
+        parts.append(f'<p id="hcontainer_1__p_{number}">{_sentence(rng, 20)}</p>')
+    section_number = 1
+    for chapter in range(1, chapters + 1):
+        chp = f"chp_{chapter}"
+        parts.append(f'<section id="{chp}"><h2>Chapter {chapter}</h2>')
+        for _ in range(sections):
+            sec = f"{chp}__sec_{section_number}"
+            parts.append(f'<section id="{sec}"><h3>{section_number}. {_sentence(rng, 4)}</h3>')
+            for subsection in range(1, rng.randint(2, 5)):
+                subsec = f"{sec}__subsec_{subsection}"
+                if subsection % 2:
+                    paras = "".join(
+                        f'<div id="{subsec}__para_{letter}"><span class="akn-num">({letter})</span>'
+                        f'<span class="akn-content">{_sentence(rng, 12)}</span></div>'
+                        for letter in "abc"
+                    )
+                    parts.append(f'<div id="{subsec}"><span class="akn-num">({subsection})</span>'
+                                 f'<span class="akn-intro">{_sentence(rng, 10)}</span>{paras}</div>')
+                else:
+                    parts.append(f'<div id="{subsec}"><span class="akn-num">({subsection})</span>'
+                                 f'<span class="akn-content">{_paragraph(rng)}</span></div>')
+            parts.append("</section>")
+            section_number += 1
+        parts.append("</section>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def generate(directory, cases=200, paragraphs=40, chapters=18, sections=14, seed=0):
+    """Write a deterministic fixture set and return its index"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    index = {}
+
+    def write(request_path, name, text):
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(text)
+        index[request_path] = name
+
+    links = [f"/akn/ke/judgment/kebench/{number}/eng" for number in range(1, cases + 1)]
+    for number, link in enumerate(links, start=1):
+        write(link, f"judgment-{number}.html", judgment_page(rng, number, paragraphs))
+    last_page = max(1, -(-cases // CASES_PER_LISTING_PAGE))
+    for page in range(1, last_page + 1):
+        page_links = links[(page - 1) * CASES_PER_LISTING_PAGE:page * CASES_PER_LISTING_PAGE]
+        write(f"{LISTING_PATH}?page={page}", f"listing-{page}.html", listing_page(page, last_page, page_links))
+    write(CONSTITUTION_PATH, "constitution.html", constitution_page(rng, chapters, sections))
+    with open(os.path.join(directory, INDEX), "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+def record(directory, base_url, paths):
+    """Fetch paths from base_url into a fixture directory, adding them to its index"""
+    from data_acquisition.fetcher import fetch_page
+
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, INDEX)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            index = json.load(f)
+    for path in paths:
+        status, text = fetch_page(urljoin(base_url, path))
+        if status != 200:
+            print(f"HTTP {status} for {path}, not recorded")
+            continue
+        name = f"recorded-{len(index) + 1}.html"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(text)
+        index[path] = name
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+class FixtureServer:
+    """Serves a fixture directory on a local port; unknown paths get the site's 404 page.
+
+    latency delays every response by that many seconds, error_rate answers
+    that share of requests with a 503, and capacity answers requests beyond
+    that many in flight with a 429 (retry_after sets its Retry-After).
+    """
+
+    def __init__(self, directory, port=0, latency=0.0, error_rate=0.0, capacity=None, retry_after=None, seed=0):
+        with open(os.path.join(directory, INDEX), encoding="utf-8") as f:
+            index = json.load(f)
+        pages = {}
+        for request_path, name in index.items():
+            with open(os.path.join(directory, name), "rb") as f:
+                pages[request_path] = f.read()
+        rng = random.Random(seed)
+        lock = threading.Lock()
+        in_flight = [0]
+        faults = {"requests": 0, "overloaded": 0, "errors": 0}
+
+        def fault():
+            """Status to fail this request with, or None to serve it"""
+            with lock:
+                in_flight[0] += 1
+                faults["requests"] += 1
+                if capacity and in_flight[0] > capacity:
+                    faults["overloaded"] += 1
+                    return 429
+                if error_rate and rng.random() < error_rate:
+                    faults["errors"] += 1
+                    return 503
+            return None
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; don't let delayed ACKs stall keep-alive requests
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                try:
+                    status = fault()
+                    if latency:
+                        time.sleep(latency)
+                    if status is not None:
+                        self.respond(status, f"<html><body>HTTP {status}</body></html>".encode("utf-8"))
+                        return
+                    parts = urlsplit(self.path)
+                    key = parts.path + (f"?{parts.query}" if parts.query else "")
+                    body = pages.get(key)
+                    if body is None:
+                        self.respond(404, NOT_FOUND_PAGE.encode("utf-8"))
+                    else:
+                        self.respond(200, body)
+                finally:
+                    with lock:
+                        in_flight[0] -= 1
+
+            def respond(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429 and retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.index = index
+        self.faults = faults
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fixture-server", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate or record benchmark fixtures")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gen = commands.add_parser("generate", help="write a synthetic fixture set")
+    gen.add_argument("directory")
+    gen.add_argument("--cases", type=int, default=200)
+    gen.add_argument("--paragraphs", type=int, default=40)
+    gen.add_argument("--seed", type=int, default=0)
+    rec = commands.add_parser("record", help="record pages from the live site")
+    rec.add_argument("directory")
+    rec.add_argument("paths", nargs="+", help="request paths such as /judgments/KESC/SCK/?page=1")
+    rec.add_argument("--base-url", default=os.getenv("BASE_URL"))
+    serve = commands.add_parser("serve", help="serve a fixture directory, optionally with injected faults")
+    serve.add_argument("directory")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    serve.add_argument("--capacity", type=int, help="requests in flight beyond this get a 429")
+    serve.add_argument("--retry-after", type=int, help="Retry-After seconds sent with 429s")
+    serve.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "serve":
+        server = FixtureServer(args.directory, port=args.port, latency=args.latency, error_rate=args.error_rate,
+                               capacity=args.capacity, retry_after=args.retry_after, seed=args.seed)
+        with server:
+            print(f"Serving {len(server.index)} fixtures at {server.base_url}, Ctrl-C to stop")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+        print(f"Faults injected: {server.faults}")
+        return
+    if args.command == "generate":
+        index = generate(args.directory, cases=args.cases, paragraphs=args.paragraphs, seed=args.seed)
+    else:
+        index = record(args.directory, args.base_url, args.paths)
+    print(f"{len(index)} fixtures in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
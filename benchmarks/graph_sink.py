@@ -0,0 +1,47 @@
+"""In-process stand-in for a Neo4j transaction.
+
+Answers the statements graph_writer.write_tree runs with fresh element
+ids, counts the nodes and relationships they would create, and encodes
+each statement's parameters as JSON to stand in for Bolt serialisation,
+so a benchmark measures the Python side of a graph write without a
+database.
+"""
+import itertools
+import json
+
+
+class MemoryResult:
+    def __init__(self, records):
+        self._records = records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self):
+        return self._records[0] if self._records else None
+
+    def consume(self):
+        return None
+
+
+class MemoryGraph:
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.statements = 0
+        self.nodes = 0
+        self.edges = 0
+        self.bytes = 0
+
+    def run(self, query, **params):
+        self.statements += 1
+        self.bytes += len(query) + len(json.dumps(params, default=str))
+        if "rows" in params:
+            rows = params["rows"]
+            if "CREATE" in query:
+                self.nodes += len(rows)
+                self.edges += len(rows)
+            return MemoryResult([{"tmp": row.get("tmp"), "node_id": f"bench:{next(self._ids)}"} for row in rows])
+        if "CREATE" in query:
+            self.nodes += 1
+            return MemoryResult([{"node_id": f"bench:{next(self._ids)}"}])
+        return MemoryResult([])
@@ -0,0 +1,316 @@
+"""Offline benchmarks for listing walks, judgment and constitution parsing and graph writes.
+
+Fixtures are served from a local HTTP server (see fixtures.py) and graph
+writes go to the in-process MemoryGraph, so results depend only on the
+code under test and the machine. The throttle benchmark gets its own
+server with the latency, errors and capacity in FAULTS, to measure how
+close the adaptive limits get to the rate the server sustains. Each
+benchmark runs in its own process so its peak RSS is its own; throughput
+is the best of --repeat runs.
+
+Results are written as JSON to benchmarks/results/ with the commit they
+were measured at. Pass --compare with an earlier results file to print
+the change in each metric and exit non-zero on regressions beyond
+--tolerance.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+from benchmarks.fixtures import FixtureServer, generate
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Metric -> True when larger is better
+DIRECTIONS = {
+    "pages_per_s": True,
+    "docs_per_s": True,
+    "parse_ms_median": False,
+    "parse_ms_p95": False,
+    "nodes_edges_per_s": True,
+    "peak_rss_mb": False,
+    "ok_ratio": True,
+}
+
+# Server faults per benchmark: seconds of latency, share of 503s, requests in flight before 429s
+FAULTS = {
+    "throttle": {"latency": 0.02, "error_rate": 0.02, "capacity": 8},
+}
+THROTTLE_BENCH_WORKERS = 32
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _classify(index):
+    listing = sorted((path for path in index if "?page=" in path), key=lambda p: int(p.rsplit("=", 1)[1]))
+    constitution = [path for path in index if "/constitution/" in path]
+    judgments = [path for path in index if path not in listing and path not in constitution]
+    return listing, constitution, judgments
+
+
+def bench_listing(base_url, index, repeat):
+    from data_acquisition.case_law.courts_and_tribunals.court_cases import iter_case_links
+    from data_acquisition.fetcher import create_session
+
+    listing, _, _ = _classify(index)
+    if not listing:
+        return None
+    url = base_url + listing[0].rsplit("=", 1)[0] + "="
+    best = None
+    for _ in range(repeat):
+        session = create_session()
+        start = time.perf_counter()
+        links = list(iter_case_links(None, url, session=session))
+        elapsed = time.perf_counter() - start
+        session.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return {"pages": len(listing), "links": len(links), "seconds": round(best, 4),
+            "pages_per_s": round(len(listing) / best, 1)}
+
+
+def bench_judgments(base_url, index, repeat):
+    from data_acquisition.case_law.courts_and_tribunals.case_parser import parse_case
+    from data_acquisition.case_law.courts_and_tribunals.court_cases import getCaseContent
+    from data_acquisition.fetcher import create_session, fetch_page, parse_html
+
+    _, _, judgments = _classify(index)
+    if not judgments:
+        return None
+    urls = [base_url + path for path in judgments]
+    best = None
+    for _ in range(repeat):
+        session = create_session()
+        start = time.perf_counter()
+        cases = [getCaseContent(None, url, session=session) for url in urls]
+        elapsed = time.perf_counter() - start
+        session.close()
+        best = elapsed if best is None else min(best, elapsed)
+    # Parse time alone, from pages already in memory
+    pages = [fetch_page(url)[1] for url in urls]
+    parse_ms = []
+    for text in pages:
+        start = time.perf_counter()
+        parse_case(parse_html(text))
+        parse_ms.append(1000 * (time.perf_counter() - start))
+    return {"documents": len(urls), "parsed": sum(case is not None for case in cases), "seconds": round(best, 4),
+            "pages_per_s": round(len(urls) / best, 1),
+            "parse_ms_median": round(statistics.median(parse_ms), 3),
+            "parse_ms_p95": round(_percentile(parse_ms, 0.95), 3)}
+
+
+def bench_constitution(base_url, index, repeat):
+    from data_acquisition.akn_parser import parse_constitution
+    from data_acquisition.fetcher import fetch_page, parse_html
+
+    _, constitution, _ = _classify(index)
+    if not constitution:
+        return None
+    _, text = fetch_page(base_url + constitution[0])
+    parse_ms = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hierarchy = parse_constitution(parse_html(text))
+        parse_ms.append(1000 * (time.perf_counter() - start))
+    return {"bytes": len(text), "chapters": len(hierarchy["content"]),
+            "parse_ms_median": round(statistics.median(parse_ms), 3),
+            "docs_per_s": round(1000 / min(parse_ms), 2)}
+
+
+def bench_graph_write(base_url, index, repeat):
+    from benchmarks.graph_sink import MemoryGraph
+    from data_acquisition.akn_parser import parse_constitution
+    from data_acquisition.case_law.courts_and_tribunals.case_parser import parse_case
+    from data_acquisition.fetcher import fetch_page, parse_html
+    from data_acquisition.graph_writer import write_tree
+
+    _, constitution, judgments = _classify(index)
+    trees = []
+    if judgments:
+        trees.append({"case": [parse_case(parse_html(fetch_page(base_url + path)[1])) for path in judgments]})
+    if constitution:
+        trees.append(parse_constitution(parse_html(fetch_page(base_url + constitution[0])[1])))
+    best = None
+    for _ in range(repeat):
+        graph = MemoryGraph()
+        start = time.perf_counter()
+        for tree in trees:
+            write_tree(graph, tree)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"nodes": graph.nodes, "edges": graph.edges, "statements": graph.statements,
+            "payload_bytes": graph.bytes, "seconds": round(best, 4),
+            "nodes_edges_per_s": round((graph.nodes + graph.edges) / best, 1)}
+
+
+def bench_throttle(base_url, index, repeat):
+    from data_acquisition.fetcher import create_session, fetch_page
+    from data_acquisition.throttle import configure_throttle
+
+    _, _, judgments = _classify(index)
+    if not judgments:
+        return None
+    urls = [base_url + path for path in judgments]
+    best = None
+    for _ in range(repeat):
+        throttle = configure_throttle(retry_base=0.05)
+        session = create_session(pool_size=THROTTLE_BENCH_WORKERS)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=THROTTLE_BENCH_WORKERS) as pool:
+            statuses = list(pool.map(lambda url: fetch_page(url, session=session)[0], urls))
+        elapsed = time.perf_counter() - start
+        session.close()
+        if best is None or elapsed < best[0]:
+            best = (elapsed, statuses, next(iter(throttle.stats().values())))
+    elapsed, statuses, stats = best
+    return {"documents": len(urls), "workers": THROTTLE_BENCH_WORKERS, "faults": FAULTS["throttle"],
+            "seconds": round(elapsed, 4), "pages_per_s": round(len(urls) / elapsed, 1),
+            "ok_ratio": round(statuses.count(200) / len(urls), 4), "retries": stats["retries"],
+            "backoffs": stats["backoffs"], "final_limit": stats["limit"]}
+
+
+BENCHMARKS = {
+    "listing": bench_listing,
+    "judgments": bench_judgments,
+    "constitution": bench_constitution,
+    "graph_write": bench_graph_write,
+    "throttle": bench_throttle,
+}
+
+
+def _run_child(name, base_url, index, repeat, queue):
+    import logging
+
+    from data_acquisition.page_cache import configure_cache
+
+    logging.disable(logging.INFO)
+    # Always go to the fixture server, never to an on-disk page cache
+    configure_cache(None)
+    try:
+        result = BENCHMARKS[name](base_url, index, repeat)
+        if result is not None:
+            result["peak_rss_mb"] = _peak_rss_mb()
+        queue.put((name, result, None))
+    except Exception as e:
+        queue.put((name, None, f"{type(e).__name__}: {e}"))
+
+
+def run_benchmarks(fixture_dir, names, repeat):
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    with FixtureServer(fixture_dir) as server:
+        for name in names:
+            faults = FAULTS.get(name)
+            with FixtureServer(fixture_dir, **faults) if faults else nullcontext(server) as target:
+                queue = context.Queue()
+                process = context.Process(target=_run_child, args=(name, target.base_url, target.index, repeat, queue))
+                process.start()
+                _, result, error = queue.get()
+                process.join()
+            if error:
+                print(f"{name}: failed: {error}")
+                results[name] = {"error": error}
+            elif result is not None:
+                print(f"{name}: {result}")
+                results[name] = result
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline, tolerance):
+    """Print each metric against the baseline; returns the regressions beyond tolerance"""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if metric not in DIRECTIONS or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = -change if DIRECTIONS[metric] else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            print(f"{name}.{metric}: {old} -> {value} ({change:+.1%}){flag}")
+            if flag:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks")
+    parser.add_argument("--fixtures", help="serve this fixture directory instead of generating one")
+    parser.add_argument("--cases", type=int, default=200, help="judgments in the generated fixtures")
+    parser.add_argument("--paragraphs", type=int, default=40, help="paragraphs per generated judgment")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as generated:
+        fixture_dir = args.fixtures
+        if not fixture_dir:
+            fixture_dir = generated
+            generate(fixture_dir, cases=args.cases, paragraphs=args.paragraphs, seed=args.seed)
+        results = run_benchmarks(fixture_dir, args.only or list(BENCHMARKS), args.repeat)
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "fixtures": args.fixtures or {"cases": args.cases, "paragraphs": args.paragraphs, "seed": args.seed},
+        "repeat": args.repeat,
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Single-pass parser for Akoma Ntoso legislation pages.
+
+Every element carrying an ``id`` is indexed once. AKN ids encode the
+document hierarchy (``chp_ONE__part_1__sec_4__subsec_2__para_a``), so the
+same pass also records each chapter, part, section, subsection and
+paragraph under its parent's id. The tree is then assembled by walking that
+index, without probing for ids that might not exist.
+"""
+import re
+
+from data_acquisition.fetcher import parse_html, text_of
+
+_COMPONENT = re.compile(r"^(chp|part|sec|subsec|para)_([^_]+)$")
+PREAMBLE_ID = "hcontainer_1__p_{}"
+
+
+class AknParseError(ValueError):
+    """Raised when a page does not contain the expected Akoma Ntoso markup"""
+
+
+class AknIndex:
+    """Elements by id, and structural children by parent id in document order"""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.elements = {}
+        self._children = {}
+        for element in tree.iter():
+            eid = element.get("id") if isinstance(element.tag, str) else None
+            if not eid:
+                continue
+            self.elements[eid] = element
+            parent, _, component = eid.rpartition("__")
+            match = _COMPONENT.match(component)
+            if match:
+                self._children.setdefault((parent, match.group(1)), []).append((match.group(2), eid))
+
+    def children(self, parent_id, kind):
+        """[(suffix, id)] of the parent's direct children of one kind ('chp', 'part', 'sec', ...)"""
+        return self._children.get((parent_id, kind), [])
+
+    def first_text(self, element_id, selector):
+        matches = self.elements[element_id].cssselect(selector)
+        return text_of(matches[0]) if matches else ""
+
+
+def _first_text(tree, selector):
+    matches = tree.cssselect(selector)
+    return text_of(matches[0]) if matches else ""
+
+
+def parse_cover_page(index):
+    """Title, publication details and preamble paragraphs"""
+    tree = index.tree
+    coverpage = tree.cssselect(".coverpage")
+    preamble = []
+    number = 1
+    while PREAMBLE_ID.format(number) in index.elements:
+        preamble.append(text_of(index.elements[PREAMBLE_ID.format(number)]))
+        number += 1
+    return {
+        "title": _first_text(coverpage[0], "h1") if coverpage else "",
+        "publication_info": _first_text(tree, ".publication-info"),
+        "assent_date": _first_text(tree, ".assent-date"),
+        "commencement_date": _first_text(tree, ".commencement-date"),
+        "preamble": preamble
+    }
+
+
+def parse_paragraphs(index, container_id):
+    return {
+        f"Paragraph {letter}": {
+            "letter": index.first_text(para_id, ".akn-num"),
+            "content": index.first_text(para_id, ".akn-content"),
+        }
+        for letter, para_id in index.children(container_id, "para")
+    }
+
+
+def parse_content(index, container_id):
+    """An intro with lettered paragraphs, or a single point"""
+    element = index.elements[container_id]
+    intro = element.cssselect(".akn-intro")
+    if intro:
+        return {"intro": text_of(intro[0]), "paragraphs": parse_paragraphs(index, container_id)}
+    return {"point": index.first_text(container_id, ".akn-content")}
+
+
+def parse_subsections(index, section_id):
+    return {
+        f"Subsection {number}": {
+            "number": index.first_text(subsec_id, ".akn-num"),
+            "sub_sections": parse_content(index, subsec_id),
+        }
+        for number, (_, subsec_id) in enumerate(index.children(section_id, "subsec"), start=1)
+    }
+
+
+def parse_sections(index, container_id):
+    sections = {}
+    for number, sec_id in index.children(container_id, "sec"):
+        title = index.first_text(sec_id, "h3")
+        if index.children(sec_id, "subsec"):
+            sections[f"Section {number}"] = {"title": title, "sub_sections": parse_subsections(index, sec_id)}
+        else:
+            sections[f"Section {number}"] = {"title": title, "Content": parse_content(index, sec_id)}
+    return sections
+
+
+def parse_parts(index, container_id):
+    return {
+        f"Part {number}": {
+            "title": index.first_text(part_id, "h2"),
+            "Sections": parse_sections(index, part_id),
+        }
+        for number, (_, part_id) in enumerate(index.children(container_id, "part"), start=1)
+    }
+
+
+def parse_chapters(index, container_id=""):
+    chapters = {}
+    for name, chp_id in index.children(container_id, "chp"):
+        title = index.first_text(chp_id, "h2")
+        if index.children(chp_id, "part"):
+            chapters[f"CHAPTER {name}"] = {"title": title, "sections": parse_parts(index, chp_id)}
+        else:
+            chapters[f"CHAPTER {name}"] = {"title": title, "sections": parse_sections(index, chp_id)}
+    return chapters
+
+
+def parse_constitution(tree):
+    """The constitution tree scrape_constitution_data returns, from a parsed page"""
+    index = AknIndex(tree)
+    content = parse_chapters(index)
+    if not content:
+        raise AknParseError("no chapters found")
+    return {"cover page": parse_cover_page(index), "content": content}
+
+
+def parse_body(index):
+    """An act's body: chapters if it has them, otherwise top-level parts or sections"""
+    if index.children("", "chp"):
+        return parse_chapters(index)
+    if index.children("", "part"):
+        return parse_parts(index, "")
+    return parse_sections(index, "")
+
+
+def parse_act(tree):
+    """Normalised hierarchy of any act or statutory instrument in AKN markup.
+
+    The constitution is the case with chapters, so its tree has the same
+    shape as parse_constitution's.
+    """
+    index = AknIndex(tree)
+    content = parse_body(index)
+    if not content:
+        raise AknParseError("no chapters, parts or sections found")
+    return {"cover page": parse_cover_page(index), "content": content}
+
+
+def parse_constitution_html(html):
+    return parse_constitution(parse_html(html))
+
+
+def parse_constitution_file(path):
+    """Parse a saved copy of the constitution page"""
+    with open(path, encoding="utf-8") as f:
+        return parse_constitution_html(f.read())
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+from urllib.parse import urlsplit
+
+import aiohttp
+from dotenv import load_dotenv
+
+from data_acquisition.fetcher import FETCH_TIMEOUT, FETCH_USER_AGENT, parse_html
+from data_acquisition.throttle import THROTTLE_ENABLED, AsyncThrottle, classify_status
+
+# Load environment variables from .env file
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "16"))
+ASYNC_PER_HOST_LIMIT = int(os.getenv("ASYNC_PER_HOST_LIMIT", "8"))
+ASYNC_RETRY_EXCEPTIONS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+class AsyncFetcher:
+    """Awaitable page fetcher over a small pool of keep-alive connections.
+
+    Any number of fetches can be awaited at once; the connector caps open
+    sockets and an adaptive per-host limit (an AsyncThrottle, at most
+    per_host_limit) caps requests in flight to each host, retrying
+    throttled and failed ones. With adaptive=False a fixed per-host
+    semaphore is used instead.
+
+        async with AsyncFetcher() as fetcher:
+            status, tree = await fetcher.fetch_tree(url)
+    """
+
+    def __init__(self, max_connections=ASYNC_MAX_CONNECTIONS, per_host_limit=ASYNC_PER_HOST_LIMIT,
+                 timeout=FETCH_TIMEOUT, adaptive=THROTTLE_ENABLED):
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.throttle = AsyncThrottle(maximum=per_host_limit) if adaptive else None
+        self._session = None
+        self._host_semaphores = {}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host_limit,
+                                         ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": FETCH_USER_AGENT},
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _semaphore(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_semaphores[host]
+
+    async def _get(self, url):
+        async with self._session.get(url) as response:
+            return response.status, await response.text(), response.headers.get("Retry-After")
+
+    async def fetch_page(self, url):
+        """Fetch a page and return (status_code, html_text)"""
+        if self.throttle is None:
+            async with self._semaphore(url):
+                status, text, _ = await self._get(url)
+        else:
+            status, text, _ = await self.throttle.call(url, lambda: self._get(url),
+                                                       classify=lambda result: classify_status(result[0], result[2]),
+                                                       retry_on=ASYNC_RETRY_EXCEPTIONS)
+        return status, text
+
+    async def fetch_tree(self, url):
+        """Fetch a page and return (status_code, lxml tree)"""
+        status, text = await self.fetch_page(url)
+        return status, parse_html(text, base_url=url)
@@ -0,0 +1,181 @@
+"""One Chrome factory for every Selenium scraper.
+
+Drivers run headless, skip images, fonts, stylesheets and media, and stop
+waiting for a page once its DOM is ready. A ManagedDriver restarts its
+browser after BROWSER_MAX_PAGES page loads or once Chrome's memory passes
+BROWSER_MAX_MEMORY_MB, so long crawls don't slow down as the browser bloats.
+
+The wait helpers wait for the document to be ready and then give an element
+only a short grace period to appear: the site is server-rendered, so an
+element that is missing from a ready page is not coming, and there is no
+point burning the full timeout on it.
+"""
+import logging
+import os
+
+from dotenv import load_dotenv
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from data_acquisition.metrics import inc, timed
+from data_acquisition.throttle import get_throttle
+
+try:
+    import psutil
+except ImportError:  # memory-based recycling is skipped without psutil
+    psutil = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "1") == "1"
+BROWSER_BLOCK_RESOURCES = os.getenv("BROWSER_BLOCK_RESOURCES", "1") == "1"
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "200"))
+BROWSER_MAX_MEMORY_MB = int(os.getenv("BROWSER_MAX_MEMORY_MB", "1024"))
+BROWSER_PAGE_LOAD_TIMEOUT = float(os.getenv("BROWSER_PAGE_LOAD_TIMEOUT", "30"))
+BROWSER_WAIT_TIMEOUT = float(os.getenv("BROWSER_WAIT_TIMEOUT", "20"))
+BROWSER_ELEMENT_GRACE = float(os.getenv("BROWSER_ELEMENT_GRACE", "2"))
+# Memory is sampled every few page loads rather than on every one
+MEMORY_CHECK_INTERVAL = 10
+
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.css", "*.mp4", "*.webm", "*.mp3",
+]
+
+
+def chrome_options(headless=BROWSER_HEADLESS, block_resources=BROWSER_BLOCK_RESOURCES):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    # Return from driver.get once the DOM is parsed, not after every subresource
+    options.page_load_strategy = "eager"
+    if block_resources:
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.fonts": 2,
+        })
+    return options
+
+
+def create_driver(headless=BROWSER_HEADLESS, block_resources=BROWSER_BLOCK_RESOURCES):
+    """Start a tuned Chrome WebDriver"""
+    driver = webdriver.Chrome(options=chrome_options(headless, block_resources))
+    driver.set_page_load_timeout(BROWSER_PAGE_LOAD_TIMEOUT)
+    if block_resources:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        except WebDriverException as e:
+            logger.warning(f"Could not block resources over CDP: {e}")
+    return driver
+
+
+def browser_memory_mb(driver):
+    """Resident memory of the browser and its child processes, or None if unknown"""
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+    except (AttributeError, psutil.Error):
+        return None
+
+
+class ManagedDriver:
+    """A WebDriver that restarts its browser after max_pages loads or when memory grows.
+
+    Page loads go through the fetch throttle, so timeouts are retried and
+    count against the host's circuit breaker. Everything except get() and
+    quit() is passed through to the current driver, so it can be used
+    wherever a WebDriver is expected.
+    """
+
+    def __init__(self, max_pages=BROWSER_MAX_PAGES, max_memory_mb=BROWSER_MAX_MEMORY_MB, **driver_options):
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self._driver_options = driver_options
+        self._driver = create_driver(**driver_options)
+        self.pages = 0
+        self.recycles = 0
+
+    def _needs_recycle(self):
+        if self.max_pages and self.pages >= self.max_pages:
+            return f"{self.pages} pages loaded"
+        if self.max_memory_mb and self.pages and self.pages % MEMORY_CHECK_INTERVAL == 0:
+            memory = browser_memory_mb(self._driver)
+            if memory is not None and memory > self.max_memory_mb:
+                return f"{memory:.0f} MB in use"
+        return None
+
+    def recycle(self, reason="requested"):
+        logger.info(f"Recycling browser: {reason}")
+        self.quit()
+        self._driver = create_driver(**self._driver_options)
+        self.pages = 0
+        self.recycles += 1
+
+    def get(self, url):
+        reason = self._needs_recycle()
+        if reason:
+            self.recycle(reason)
+        self.pages += 1
+        inc("browser_pages_total")
+        throttle = get_throttle()
+        if throttle:
+            # Rendering time says little about the server, so only timeouts and errors feed the limit
+            throttle.call(url, lambda: self._load(url), retry_on=(TimeoutException,), track_latency=False)
+        else:
+            self._load(url)
+
+    def _load(self, url):
+        with timed("page_load"):
+            self._driver.get(url)
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def quit(self):
+        try:
+            self._driver.quit()
+        except WebDriverException as e:
+            logger.warning(f"Error quitting browser: {e}")
+
+
+def managed_driver():
+    """Factory for the scrapers: a headless, resource-blocking, self-recycling Chrome"""
+    return ManagedDriver()
+
+
+def wait_until_ready(driver, timeout=BROWSER_WAIT_TIMEOUT):
+    """Wait until the document has been parsed"""
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.execute_script("return document.readyState") in ("interactive", "complete")
+    )
+
+
+def wait_for_elements(driver, by, value, timeout=BROWSER_WAIT_TIMEOUT, grace=BROWSER_ELEMENT_GRACE):
+    """Return the elements matching (by, value) once the page is ready.
+
+    Raises TimeoutException after the grace period if a ready page has none.
+    """
+    wait_until_ready(driver, timeout)
+    try:
+        with timed("element_lookup"):
+            return WebDriverWait(driver, grace).until(EC.presence_of_all_elements_located((by, value)))
+    except TimeoutException:
+        raise TimeoutException(f"no elements matching {by}={value!r} on {driver.current_url}")
+
+
+def wait_for_element(driver, by, value, timeout=BROWSER_WAIT_TIMEOUT, grace=BROWSER_ELEMENT_GRACE):
+    """Return the first element matching (by, value) once the page is ready"""
+    return wait_for_elements(driver, by, value, timeout, grace)[0]
@@ -0,0 +1,250 @@
+"""Export scraped trees as CSV files for ``neo4j-admin database import``.
+
+The exporter writes the same labels and relationship types as the
+transactional writers (Segment, Classification, Court, Station,
+Constitution and Node; BELONGS_TO, PART_OF and HAS_CHILD), but as one node
+file per label and one relationship file per type. Node IDs are derived
+from each node's path in its tree, so exporting the same data twice gives
+the same IDs.
+
+Rows are spooled to a temporary JSON-lines file per label while the set of
+property columns is discovered, then written out as CSV in a second pass,
+so only node IDs (for de-duplication) are held in memory.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+
+from data_acquisition.graph_writer import node_props
+
+logger = logging.getLogger(__name__)
+
+# Unit separator: legal text is full of semicolons and commas, never this
+ARRAY_DELIMITER = "\x1f"
+
+_TYPE_NAMES = ((bool, "boolean"), (int, "long"), (float, "double"), (str, "string"))
+
+
+def stable_id(label, *path):
+    """Deterministic node ID from a label and the node's path in its tree"""
+    digest = hashlib.sha1("\x1f".join(str(part) for part in path).encode("utf-8")).hexdigest()[:20]
+    return f"{label.lower()}-{digest}"
+
+
+def _type_name(value):
+    if isinstance(value, list):
+        item_types = {_type_name(item) for item in value}
+        return (item_types.pop() if len(item_types) == 1 else "string") + "[]"
+    for python_type, name in _TYPE_NAMES:
+        if isinstance(value, python_type):
+            return name
+    return "string"
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        items = [_csv_value(item) for item in value]
+        if any(ARRAY_DELIMITER in item for item in items):
+            raise ValueError(f"array item contains the array delimiter {ARRAY_DELIMITER!r}: {items!r}")
+        return ARRAY_DELIMITER.join(items)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _column_name(key):
+    # neo4j-admin splits header fields on ':' to read the type
+    return str(key).replace(":", "_")
+
+
+class BulkExportWriter:
+    """Collects nodes and relationships and writes neo4j-admin import CSVs"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self._spools = {}
+        self._columns = {}
+        self._seen = set()
+        self._relationship_files = {}
+        self.node_count = 0
+        self.relationship_count = 0
+
+    def add_node(self, node_id, label, props):
+        """Spool a node; False (and nothing written) when node_id was already exported"""
+        if node_id in self._seen:
+            return False
+        self._seen.add(node_id)
+        if label not in self._spools:
+            self._spools[label] = open(self._spool_path(label), "w", encoding="utf-8")
+            self._columns[label] = {}
+        columns = self._columns[label]
+        row = {}
+        for key, value in props.items():
+            column = _column_name(key)
+            type_name = _type_name(value)
+            if columns.get(column, type_name) != type_name:
+                # Conflicting types across rows are stored as strings
+                type_name = "string[]" if type_name.endswith("[]") else "string"
+            columns[column] = type_name
+            row[column] = value
+        self._spools[label].write(json.dumps([node_id, row], ensure_ascii=False) + "\n")
+        self.node_count += 1
+        return True
+
+    def add_relationship(self, start_id, end_id, rel_type):
+        if rel_type not in self._relationship_files:
+            f = open(os.path.join(self.output_dir, f"rels_{rel_type}.csv"), "w", encoding="utf-8", newline="")
+            writer = csv.writer(f)
+            writer.writerow([":START_ID", ":END_ID", ":TYPE"])
+            self._relationship_files[rel_type] = (f, writer)
+        self._relationship_files[rel_type][1].writerow([start_id, end_id, rel_type])
+        self.relationship_count += 1
+
+    def _spool_path(self, label):
+        return os.path.join(self.output_dir, f".nodes_{label}.jsonl.tmp")
+
+    def node_files(self):
+        return {label: os.path.join(self.output_dir, f"nodes_{label}.csv") for label in self._columns}
+
+    def relationship_files(self):
+        return {rel_type: f.name for rel_type, (f, _) in self._relationship_files.items()}
+
+    def close(self):
+        """Write the node CSVs from the spooled rows and close every file"""
+        for label, spool in self._spools.items():
+            spool.close()
+            columns = self._columns[label]
+            names = sorted(columns)
+            header = ["id:ID"] + [
+                name if columns[name] == "string" else f"{name}:{columns[name]}" for name in names
+            ] + [":LABEL"]
+            with open(self.node_files()[label], "w", encoding="utf-8", newline="") as out, \
+                    open(self._spool_path(label), encoding="utf-8") as rows:
+                writer = csv.writer(out)
+                writer.writerow(header)
+                for line in rows:
+                    node_id, row = json.loads(line)
+                    values = [_csv_value(row[name]) if name in row else "" for name in names]
+                    writer.writerow([node_id] + values + [label])
+            os.remove(self._spool_path(label))
+        self._spools = {}
+        for f, _ in self._relationship_files.values():
+            f.close()
+        logger.info(f"Exported {self.node_count} nodes and {self.relationship_count} relationships to {self.output_dir}")
+
+    def import_command(self, database="neo4j"):
+        """The neo4j-admin invocation that loads the exported files"""
+        parts = ["neo4j-admin database import full", database]
+        parts += [f"--nodes={label}={path}" for label, path in sorted(self.node_files().items())]
+        parts += [f"--relationships={path}" for _, path in sorted(self.relationship_files().items())]
+        parts.append(f"--array-delimiter=U+{ord(ARRAY_DELIMITER):04X}")
+        # Judgment and constitution text contains line breaks
+        parts.append("--multiline-fields=true")
+        return " ".join(parts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def export_tree(writer, data, parent_id=None, node_label="Node", root_label="Constitution", path=()):
+    """Export a nested dict tree with the same shape graph_writer.write_tree produces.
+
+    Without parent_id a root node labelled root_label is exported; otherwise
+    the tree's children hang off the given (already exported) node.
+    """
+    if parent_id is None:
+        parent_id = stable_id(root_label, *path)
+        writer.add_node(parent_id, root_label, node_props(data))
+    stack = [(parent_id, data, tuple(path))]
+    while stack:
+        node_id, value, node_path = stack.pop()
+        for key, child in value.items():
+            children = [child] if isinstance(child, dict) else child if isinstance(child, list) else []
+            for index, item in enumerate(children):
+                if not isinstance(item, dict):
+                    continue
+                child_path = node_path + (key, index)
+                child_id = stable_id(node_label, *child_path)
+                props = {"name": key}
+                props.update(node_props(item))
+                if writer.add_node(child_id, node_label, props):
+                    writer.add_relationship(node_id, child_id, "HAS_CHILD")
+                    stack.append((child_id, item, child_path))
+    return parent_id
+
+
+def export_constitution(writer, constitution):
+    """Export the dict returned by scrape_constitution_data"""
+    return export_tree(writer, constitution, path=("constitution",))
+
+
+def export_taxonomy(writer, data, cases_by_link=None):
+    """Export the classification/court/station tree, as insert_data writes it.
+
+    Cases are taken from each station's 'cases' list (as the async crawler
+    produces) or from cases_by_link, keyed by station or court link.
+    """
+    cases_by_link = cases_by_link or {}
+    segment_id = stable_id("Segment", "Case Law")
+    writer.add_node(segment_id, "Segment", {"name": "Case Law"})
+    for classification in data:
+        classification_path = ("Case Law", classification['classification'])
+        classification_id = stable_id("Classification", *classification_path)
+        if writer.add_node(classification_id, "Classification", {"name": classification['classification']}):
+            writer.add_relationship(classification_id, segment_id, "BELONGS_TO")
+        for court in classification['courts']:
+            court_path = classification_path + (court['name'],)
+            court_id = stable_id("Court", *court_path)
+            if writer.add_node(court_id, "Court", {"name": court['name']}):
+                writer.add_relationship(court_id, classification_id, "BELONGS_TO")
+            stations = court.get('stations') or []
+            if not stations:
+                _export_cases(writer, court_id, court, cases_by_link, court_path)
+            for station in stations:
+                station_path = court_path + (station['name'],)
+                station_id = stable_id("Station", *station_path)
+                # A station listed twice under one court is exported, and linked, once
+                if not writer.add_node(station_id, "Station", {"name": station['name'],
+                                                               "link": station.get('link', '')}):
+                    continue
+                writer.add_relationship(station_id, court_id, "PART_OF")
+                _export_cases(writer, station_id, station, cases_by_link, station_path)
+
+
+def _export_cases(writer, parent_id, station, cases_by_link, path):
+    cases = station.get('cases') or cases_by_link.get(station.get('link'))
+    if cases:
+        export_tree(writer, {"case": cases}, parent_id=parent_id, path=path)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export scraped data as neo4j-admin import CSVs")
+    parser.add_argument("--output", default="neo4j_import", help="directory for the CSV files")
+    parser.add_argument("--taxonomy", help="classification/court/station tree, e.g. kenya_courts_data.json")
+    parser.add_argument("--constitution-json", help="constitution tree saved as JSON")
+    parser.add_argument("--scrape-constitution", action="store_true", help="scrape the constitution first")
+    args = parser.parse_args()
+
+    with BulkExportWriter(args.output) as writer:
+        if args.taxonomy:
+            with open(args.taxonomy, encoding="utf-8") as f:
+                export_taxonomy(writer, json.load(f))
+        if args.constitution_json:
+            with open(args.constitution_json, encoding="utf-8") as f:
+                export_constitution(writer, json.load(f))
+        elif args.scrape_constitution:
+            from data_acquisition.constitution import scrape_constitution_data
+            export_constitution(writer, scrape_constitution_data())
+    logger.info(writer.import_command())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""asyncio crawl engine for the case law scrapers.
+
+The functions here mirror the Selenium scrapers in case_laws.py and
+court_cases.py, but every page load is an awaitable fetch through an
+AsyncFetcher, so thousands of pages can be in flight over a handful of
+keep-alive connections. Parsing is done by the same static parsers used by
+the HTTP fast path, and listings are paginated by court_cases'
+listing_walk; only the fetching differs. Pages that would need the
+browser are skipped.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from urllib.parse import urljoin
+
+from dotenv import load_dotenv
+
+from data_acquisition.akn_parser import AknParseError, parse_constitution
+from data_acquisition.async_fetcher import AsyncFetcher, ASYNC_MAX_CONNECTIONS, ASYNC_PER_HOST_LIMIT
+from data_acquisition.constitution import constitutionUrl
+from data_acquisition.metrics import record_error
+from data_acquisition.throttle import THROTTLE_ENABLED
+from data_acquisition.case_law.taxonomy_parser import (
+    parse_court_classifications,
+    parse_court_stations,
+    parse_courts,
+    parse_elections,
+)
+from data_acquisition.case_law.courts_and_tribunals.case_parser import StaticParseError
+from data_acquisition.case_law.courts_and_tribunals.court_cases import (
+    BROWSER,
+    FETCH,
+    LINKS,
+    listing_url,
+    listing_walk,
+    read_case_page,
+)
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_URL = os.getenv("BASE_URL")
+
+
+async def get_court_classifications(fetcher, base_url=None):
+    """Get top-level court classifications"""
+    try:
+        _, tree = await fetcher.fetch_tree(base_url or BASE_URL)
+        classifications = parse_court_classifications(tree)
+        logger.info(f"Found {len(classifications)} classifications")
+        return classifications
+    except Exception as e:
+        logger.error(f"Error getting classifications: {str(e)}")
+        return []
+
+
+async def get_courts(fetcher, classification_link):
+    """Scrape courts from a classification page"""
+    try:
+        _, tree = await fetcher.fetch_tree(classification_link)
+        courts = parse_courts(tree)
+        logger.info(f"Found {len(courts)} courts")
+        return courts
+    except Exception as e:
+        logger.error(f"Error getting courts: {str(e)}")
+        return []
+
+
+async def get_court_stations(fetcher, court_link):
+    """Scrape court stations from the court's specific page"""
+    try:
+        _, tree = await fetcher.fetch_tree(court_link)
+        court_stations = parse_court_stations(tree)
+        logger.info(f"Found {len(court_stations)} court stations for {court_link}")
+        return court_stations
+    except Exception as e:
+        logger.error(f"Error getting court stations for {court_link}: {str(e)}")
+        return []
+
+
+async def getElections(fetcher, classification_link):
+    try:
+        _, tree = await fetcher.fetch_tree(classification_link)
+        return parse_elections(tree)
+    except Exception as e:
+        logger.error(f"Error getting court stations elections: {str(e)}")
+        return []
+
+
+async def fetch_listing_pages(fetcher, url, indexes):
+    """(status, tree), or the exception raised, for each listing page index, fetched concurrently"""
+    return await asyncio.gather(*(fetcher.fetch_tree(f"{url}{index}") for index in indexes),
+                                return_exceptions=True)
+
+
+async def getCaseLinks(fetcher, url, journal=None):
+    """Return every judgment link of a listing, without duplicates.
+
+    Drives listing_walk with awaitable fetches, so pages are walked as the
+    threaded crawler walks them. With no browser to hand over to, a listing
+    page that can't be read statically ends the walk.
+    """
+    links = []
+    walk = listing_walk(url, journal=journal)
+    reply = None
+    try:
+        while True:
+            try:
+                step, value = walk.send(reply)
+            except StopIteration:
+                return links
+            reply = None
+            if step == FETCH:
+                reply = await fetch_listing_pages(fetcher, url, value)
+            elif step == LINKS:
+                links.extend(value)
+            else:
+                logger.error(f"Could not read {url}{value} statically, stopping listing")
+                return links
+    finally:
+        walk.close()
+
+
+async def getCaseContent(fetcher, link):
+    """Fetch and parse one judgment, returning None if it can't be parsed statically"""
+    try:
+        status, tree = await fetcher.fetch_tree(link)
+        case = read_case_page(link, status, tree)
+    except StaticParseError as e:
+        record_error("static_parse_case")
+        logger.warning(f"Could not parse {link} statically: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error getting case content for {link}: {e}")
+        return None
+    if case == BROWSER:
+        logger.warning(f"HTTP {status} for {link}")
+        return None
+    return case
+
+
+async def get_constitution(fetcher, base_url=None):
+    """Fetch and parse the constitution with the static AKN parser, or None if it can't be read"""
+    url = urljoin(base_url or BASE_URL, constitutionUrl)
+    try:
+        status, tree = await fetcher.fetch_tree(url)
+        if status != 200:
+            logger.error(f"HTTP {status} for {url}")
+            return None
+        return parse_constitution(tree)
+    except AknParseError as e:
+        logger.error(f"Could not parse {url} statically: {e}")
+    except Exception as e:
+        logger.error(f"Error getting the constitution from {url}: {e}")
+    return None
+
+
+async def crawl_court(fetcher, court):
+    court_details = dict(court)
+    court_details['stations'] = await get_court_stations(fetcher, court['link'])
+    return court_details
+
+
+async def crawl_classification(fetcher, classification, is_elections=False):
+    if is_elections:
+        courts = await getElections(fetcher, classification['link'])
+    else:
+        courts = await get_courts(fetcher, classification['link'])
+        courts = await asyncio.gather(*(crawl_court(fetcher, court) for court in courts))
+    logger.info(f"Processed Classification: {classification['classification']}")
+    return {
+        'classification': classification['classification'],
+        'courts': list(courts)
+    }
+
+
+async def crawl_taxonomy(fetcher, base_url=None):
+    """Build the classification/court/station tree saved in kenya_courts_data.json"""
+    classifications = await get_court_classifications(fetcher, base_url)
+    total = len(classifications)
+    # The last dropdown entry is the Elections page, which lists years instead of courts
+    return list(await asyncio.gather(*(
+        crawl_classification(fetcher, classification, is_elections=(index == total))
+        for index, classification in enumerate(classifications, start=1)
+    )))
+
+
+async def crawl_station_cases(fetcher, station_link):
+    """Fetch every judgment of a court or station concurrently"""
+    links = await getCaseLinks(fetcher, listing_url(station_link))
+    cases = await asyncio.gather(*(getCaseContent(fetcher, link) for link in links))
+    return [case for case in cases if case]
+
+
+async def crawl(base_url=None, with_cases=False, max_connections=ASYNC_MAX_CONNECTIONS,
+                per_host_limit=ASYNC_PER_HOST_LIMIT, adaptive=THROTTLE_ENABLED):
+    """Crawl the taxonomy and, optionally, every station's cases into one tree"""
+    async with AsyncFetcher(max_connections=max_connections, per_host_limit=per_host_limit,
+                            adaptive=adaptive) as fetcher:
+        taxonomy = await crawl_taxonomy(fetcher, base_url)
+        if with_cases:
+            stations = [station
+                        for classification in taxonomy
+                        for court in classification['courts']
+                        for station in (court.get('stations') or [court])
+                        if station.get('link')]
+            results = await asyncio.gather(*(crawl_station_cases(fetcher, station['link']) for station in stations))
+            for station, cases in zip(stations, results):
+                station['cases'] = cases
+        if fetcher.throttle:
+            logger.info(f"Throttle: {fetcher.throttle.stats()}")
+        return taxonomy
+
+
+async def crawl_constitution(base_url=None, max_connections=ASYNC_MAX_CONNECTIONS,
+                             per_host_limit=ASYNC_PER_HOST_LIMIT, adaptive=THROTTLE_ENABLED):
+    """Crawl the constitution into the tree scrape_constitution_data returns"""
+    async with AsyncFetcher(max_connections=max_connections, per_host_limit=per_host_limit,
+                            adaptive=adaptive) as fetcher:
+        return await get_constitution(fetcher, base_url)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Crawl Kenya Law case law with the asyncio engine")
+    parser.add_argument("--output", default="kenya_courts_data.json", help="where to write the crawled tree")
+    parser.add_argument("--base-url", default=BASE_URL, help="site to crawl, e.g. a local stub server")
+    parser.add_argument("--cases", action="store_true", help="also fetch every station's judgments")
+    parser.add_argument("--connections", type=int, default=ASYNC_MAX_CONNECTIONS)
+    parser.add_argument("--per-host", type=int, default=ASYNC_PER_HOST_LIMIT,
+                        help="most requests in flight per host; the adaptive limit stays at or below it")
+    parser.add_argument("--fixed-limit", action="store_true", default=not THROTTLE_ENABLED,
+                        help="keep --per-host requests in flight instead of adapting to the server")
+    parser.add_argument("--constitution", help="also crawl the constitution and write it here")
+    args = parser.parse_args()
+
+    if args.constitution:
+        constitution = asyncio.run(crawl_constitution(args.base_url, max_connections=args.connections,
+                                                      per_host_limit=args.per_host,
+                                                      adaptive=not args.fixed_limit))
+        if constitution is None:
+            logger.error("The constitution could not be read statically; run constitution.py to use the browser")
+        else:
+            with open(args.constitution, "w", encoding="utf-8") as f:
+                json.dump(constitution, f, indent=2, ensure_ascii=False)
+            logger.info(f"Wrote the constitution to {args.constitution}")
+
+    data = asyncio.run(crawl(args.base_url, with_cases=args.cases, max_connections=args.connections,
+                             per_host_limit=args.per_host, adaptive=not args.fixed_limit))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    logger.info(f"Wrote {len(data)} classifications to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
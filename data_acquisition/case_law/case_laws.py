@@ -1,14 +1,23 @@
+import argparse
 import logging
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
-from courts_and_tribunals.court_cases import scrape_court_data
+from data_acquisition import graph_diff, graph_queries, graph_upsert, neo4j_pool
+from data_acquisition.case_law.courts_and_tribunals.court_cases import scrape_court_data
+from data_acquisition.browser import managed_driver, wait_for_element, wait_for_elements, wait_until_ready
+from data_acquisition.fetcher import LazyDriver, create_session
+from data_acquisition.page_cache import PAGE_CACHE_DIR, configure_cache
+from data_acquisition.crawl_journal import CRAWL_JOURNAL, CrawlJournal
+from data_acquisition.search_index import SEARCH_INDEX_DIR, SearchIndex
+from data_acquisition.dedup import DEDUP_INDEX, NearDuplicateIndex
+from data_acquisition.corpus_store import CORPUS_DIR, CorpusStore
+from data_acquisition.throttle import THROTTLE_ENABLED, configure_throttle
+from data_acquisition.metrics import METRICS_FILE, METRICS_PORT, MetricsExporter, profile_run, record_error, timed
 
 # Setup logging
 logging.basicConfig(
@@ -24,21 +33,11 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 BASE_URL = os.getenv("BASE_URL")
 BASE_URL = os.getenv("BASE_URL")
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USER = os.getenv("NEO4J_USER")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+COURTS_DATA_FILE = os.getenv("COURTS_DATA_FILE", "kenya_courts_data.json")
 
 
-def initialize_driver():
-    """Initialize Chrome WebDriver with stability options"""
-    options = webdriver.ChromeOptions()
-    options.add_argument("--start-maximized")
-    options.add_argument("--disable-extensions")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    return webdriver.Chrome(options=options)
-
+@timed("get_court_classifications")
 def get_court_classifications(driver):
     """Get top-level court classifications"""
     driver.get(BASE_URL)
@@ -46,9 +45,7 @@ def get_court_classifications(driver):
     
     try:
         # Wait for dropdown to be present and interactable
-        dropdown = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.CLASS_NAME, 'dropdown-menu'))
-        )
+        dropdown = wait_for_element(driver, By.CLASS_NAME, 'dropdown-menu')
         
         # Find all dropdown items
         items = dropdown.find_elements(By.CLASS_NAME, 'dropdown-item')
@@ -72,17 +69,17 @@ def get_court_classifications(driver):
         return classifications
     except Exception as e:
         logger.error(f"Error getting classifications: {str(e)}")
+        record_error("get_court_classifications")
         return []
 
+@timed("get_courts")
 def get_courts(driver):
     """Scrape courts from current page"""
     courts = []
     
     try:
         # Wait for unordered lists
-        unordered_lists = WebDriverWait(driver, 20).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, "ul.list-unstyled"))
-        )
+        unordered_lists = wait_for_elements(driver, By.CSS_SELECTOR, "ul.list-unstyled")
         
         for ul in unordered_lists:
             list_items = ul.find_elements(By.TAG_NAME, 'li')
@@ -102,8 +99,10 @@ def get_courts(driver):
         return courts
     except Exception as e:
         logger.error(f"Error getting courts: {str(e)}")
+        record_error("get_courts")
         return []
 
+@timed("get_court_stations")
 def get_court_stations(driver, court_link):
     """Scrape court stations by navigating to the court's specific page"""
     court_stations = []
@@ -113,9 +112,7 @@ def get_court_stations(driver, court_link):
         driver.get(court_link)
         
         # Wait for page to load
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.TAG_NAME, 'body'))
-        )
+        wait_until_ready(driver)
         
         # Look for unordered lists with stations
         unordered_lists = driver.find_elements(By.CSS_SELECTOR, "ul.list-unstyled")
@@ -138,47 +135,145 @@ def get_court_stations(driver, court_link):
         return court_stations
     except Exception as e:
         logger.error(f"Error getting court stations for {court_link}: {str(e)}")
+        record_error("get_court_stations")
         return []
 
+@timed("get_elections")
 def getElections(driver):
     Elections =[]
     try:
-        element = WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ".pt-4.pb-5"))
-        )
+        element = wait_for_element(driver, By.CSS_SELECTOR, ".pt-4.pb-5")
         items = element.find_elements(By.TAG_NAME,'li')
         for item in items:
-            anchor = item.find_elements(By.TAG_NAME, 'a')
-            election_year=anchor.text.strip()
-            link= anchor.get_attribute('href')
-            if election_year:
-                Elections.append({
-                    'name':election_year,
-                    'link':link
-                })
+            for anchor in item.find_elements(By.TAG_NAME, 'a'):
+                election_year=anchor.text.strip()
+                link= anchor.get_attribute('href')
+                if election_year:
+                    Elections.append({
+                        'name':election_year,
+                        'link':link
+                    })
         return Elections
     except Exception as e:
         logger.error(f"Error getting court stations elections: {str(e)}")
+        record_error("get_elections")
+        return []
 
     
 
 
-def insert_data(data):
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    
-    with driver.session() as session:
-        case_law_query="""
-        CREATE (c:Segment {name: $name})
-        RETURN elementId(c) as node_id
-        """
-        law_result = session.run(
-                case_law_query,
-                name='Case Law'
-            )
-        law_id = law_result.single()['node_id']
-        length = len(data)
-        
-        for index, classification in enumerate(data, start=1):
+def load_courts_data(path=COURTS_DATA_FILE):
+    """Load a previously scraped classification/court/station tree"""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def station_frontier(data):
+    """Yield the stations to crawl from the classification/court/station tree.
+
+    Courts without stations are crawled directly, as insert_data does.
+    """
+    for classification in data:
+        for court in classification['courts']:
+            stations = court.get('stations') or [court]
+            for station in stations:
+                yield {
+                    'classification': classification['classification'],
+                    'court': court['name'],
+                    'name': station['name'],
+                    'link': station.get('link', ''),
+                }
+
+def crawl_stations(frontier, concurrency=CRAWL_CONCURRENCY, journal=None, search_index=None, dedup=None, corpus=None):
+    """Scrape stations in parallel on a pool of workers.
+
+    Each worker thread keeps one browser (started only if a page needs the
+    Selenium fallback) and one HTTP session for every station it handles.
+    Stations carrying a 'parent_id' are attached to that graph node.
+    """
+    local = threading.local()
+    drivers = []
+    drivers_lock = threading.Lock()
+
+    def crawl_station(station):
+        if not hasattr(local, 'driver'):
+            local.driver = LazyDriver(managed_driver)
+            local.session = create_session()
+            with drivers_lock:
+                drivers.append((local.driver, local.session))
+        return scrape_court_data(station.get('parent_id'), station['link'],
+                                 driver=local.driver, session=local.session, journal=journal,
+                                 search_index=search_index, dedup=dedup, corpus=corpus)
+
+    # Stations are pulled from the frontier only as workers free up, so the
+    # taxonomy can still be streaming in while the first stations are crawled
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    progress = {'queued': 0, 'done': 0}
+    progress_lock = threading.Lock()
+    results = {}
+
+    def report(future, station):
+        slots.release()
+        with progress_lock:
+            progress['done'] += 1
+            position = f"[{progress['done']}/{progress['queued']}]"
+        try:
+            count = future.result()
+            results[station['link']] = count
+            logger.info(f"{position} {station['name']}: {count} cases")
+        except Exception as station_error:
+            logger.error(f"{position} Error crawling {station['name']}: {station_error}")
+
+    logger.info(f"Crawling stations with {concurrency} workers")
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for station in frontier:
+                if not station['link']:
+                    continue
+                slots.acquire()
+                with progress_lock:
+                    progress['queued'] += 1
+                future = pool.submit(crawl_station, station)
+                future.add_done_callback(lambda f, station=station: report(f, station))
+    finally:
+        for driver, session in drivers:
+            driver.quit()
+            session.close()
+    return results
+
+def insert_taxonomy(data, journal=None):
+    """Write the Segment/Classification/Court/Station nodes, yielding each station to crawl once written.
+
+    data may be a generator, so stations of the first classification can be
+    crawled while later ones are still being scraped. With a crawl journal,
+    the nodes of each classification are recorded once written; a resumed
+    run crawls those classifications under the stored nodes and only
+    creates the ones an interrupted run never reached.
+    """
+    if graph_upsert.is_enabled():
+        yield from upsert_taxonomy(data, journal=journal)
+        return
+    parent_ids = journal.get_state('station_parent_ids', []) if journal else []
+    written = journal.get_state('taxonomy_nodes', {}) if journal else {}
+    written.setdefault('classifications', [])
+    if written['classifications']:
+        logger.info(f"Reusing the nodes of {len(written['classifications'])} classifications from the crawl journal")
+
+    with neo4j_pool.session() as session:
+        for classification in data:
+            if classification['classification'] in written['classifications']:
+                yield from _with_parent_ids(station_frontier([classification]), parent_ids)
+                continue
+            if written.get('segment') is None:
+                case_law_query="""
+                CREATE (c:Segment {name: $name})
+                RETURN elementId(c) as node_id
+                """
+                law_result = session.run(
+                        case_law_query,
+                        name='Case Law'
+                    )
+                written['segment'] = law_result.single()['node_id']
+            law_id = written['segment']
             
             # Create Classification node
             classification_query = """
@@ -208,8 +303,8 @@ def insert_data(data):
                     name=court['name']
                 )
                 court_id = court_result.single()['court_id']
-                if(len(court['stations']==0)):
-                    scrape_court_data(court_id,court['link'])
+                if len(court.get('stations') or []) == 0:
+                    parent_ids.append([court['name'], court['name'], court_id])
                 else:
                 
                     for station in court['stations']:
@@ -226,11 +321,57 @@ def insert_data(data):
                             link=station.get('link', '')  # Using get() in case link is missing
                         )
                         station_id=station_result.single()['station_id']
-                        scrape_court_data(station_id,station['link'])
+                        parent_ids.append([court['name'], station['name'], station_id])
+            
+            written['classifications'].append(classification['classification'])
+            if journal:
+                # Parent ids first: a classification is only marked written once its stations can be found
+                journal.set_state('station_parent_ids', parent_ids)
+                journal.set_state('taxonomy_nodes', written)
+            graph_queries.invalidate("taxonomy")
+            yield from _with_parent_ids(station_frontier([classification]), parent_ids)
+    if journal:
+        journal.set_state('taxonomy_written', True)
+
+def upsert_taxonomy(data, journal=None):
+    """insert_taxonomy with MERGE on names and links, so a rerun reuses the nodes already written"""
+    parent_ids = []
+    with neo4j_pool.session() as session:
+        law_id = graph_upsert.upsert_segment(session, 'Case Law')
+        for classification in data:
+            classification_id = graph_upsert.upsert_classification(session, law_id, classification['classification'])
+            parent_ids.extend(graph_upsert.upsert_courts(session, classification_id, classification['courts']))
+            if journal:
+                journal.set_state('station_parent_ids', parent_ids)
+            graph_queries.invalidate("taxonomy")
+            yield from _with_parent_ids(station_frontier([classification]), parent_ids)
+    if journal:
+        journal.set_state('taxonomy_written', True)
+
+def _with_parent_ids(frontier, parent_ids):
+    node_ids = {(court, name): node_id for court, name, node_id in parent_ids}
+    for station in frontier:
+        station['parent_id'] = node_ids.get((station['court'], station['name']))
+        yield station
+
+@timed("insert_data")
+def insert_data(data, concurrency=CRAWL_CONCURRENCY, journal=None, search_index=None, dedup=None, corpus=None):
+    if journal and journal.get_state('taxonomy_written'):
+        # An interrupted run already wrote the taxonomy nodes
+        parent_ids = journal.get_state('station_parent_ids', [])
+        logger.info(f"Reusing {len(parent_ids)} station nodes from the crawl journal")
+        frontier = _with_parent_ids(station_frontier(data), parent_ids)
+    else:
+        # Classifications an interrupted run wrote are reused, the rest created
+        frontier = insert_taxonomy(data, journal=journal)
     
-    driver.close()
-def main():
-    driver = initialize_driver()
+    # Stations are crawled in parallel as soon as their nodes are written
+    crawl_stations(frontier, concurrency=concurrency, journal=journal, search_index=search_index, dedup=dedup,
+                   corpus=corpus)
+    logger.info(f"Neo4j pool stats: {neo4j_pool.pool_stats()}")
+
+def scrape_taxonomy(driver, journal=None):
+    """Yield each classification with its courts and stations as soon as it is scraped"""
     full_results = []
     
     try:
@@ -270,6 +411,9 @@ def main():
                     }
                 
                     full_results.append(classification_result)
+                    if journal:
+                        journal.set_state('taxonomy', full_results)
+                    yield classification_result
                 
                 else:
                     elections = getElections(driver)
@@ -284,13 +428,77 @@ def main():
                 
             except Exception as classification_error:
                 logger.error(f"Error processing classification {classification['classification']}: {classification_error}")
-       
+        if journal:
+            journal.set_state('taxonomy_complete', True)
        
     except Exception as e:
         logger.error(f"Main execution error: {str(e)}")
+
+def main(taxonomy_file=None, concurrency=CRAWL_CONCURRENCY, journal=None, search_index=None, dedup=None, corpus=None):
+    taxonomy = None
+    if taxonomy_file:
+        # Skip the live taxonomy scrape and crawl stations from a saved tree
+        taxonomy = load_courts_data(taxonomy_file)
+    elif journal and journal.get_state('taxonomy_complete'):
+        taxonomy = journal.get_state('taxonomy')
+        logger.info("Resuming with the taxonomy saved in the crawl journal")
+    if taxonomy:
+        insert_data(taxonomy, concurrency=concurrency, journal=journal, search_index=search_index, dedup=dedup,
+                    corpus=corpus)
+        neo4j_pool.close_driver()
+        return
+
+    driver = managed_driver()
+    try:
+        # Classifications are written and their stations crawled while the rest are scraped
+        insert_data(scrape_taxonomy(driver, journal=journal), concurrency=concurrency, journal=journal,
+                    search_index=search_index, dedup=dedup, corpus=corpus)
     finally:
         driver.quit()
-        insert_data(full_results) 
+        neo4j_pool.close_driver()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape Kenya Law case law into Neo4j")
+    parser.add_argument("--taxonomy", help="crawl stations from a saved tree such as kenya_courts_data.json")
+    parser.add_argument("--workers", type=int, default=CRAWL_CONCURRENCY, help="number of parallel station workers")
+    parser.add_argument("--cache-dir", default=PAGE_CACHE_DIR, help="keep fetched pages in an on-disk cache")
+    parser.add_argument("--offline", action="store_true", help="serve pages only from the cache")
+    parser.add_argument("--journal", default=CRAWL_JOURNAL, help="SQLite crawl journal used to resume interrupted crawls")
+    parser.add_argument("--search-index", default=SEARCH_INDEX_DIR, help="index stored cases for BM25 search here")
+    parser.add_argument("--dedup-index", default=DEDUP_INDEX, help="detect near-duplicate cases, keeping signatures here")
+    parser.add_argument("--corpus-dir", default=CORPUS_DIR, help="also write stored cases to sharded corpus files here")
+    parser.add_argument("--metrics-file", default=METRICS_FILE, help="rewrite Prometheus metrics to this file during the run")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="serve Prometheus metrics on this port")
+    parser.add_argument("--profile", help="run under cProfile and save the stats here")
+    parser.add_argument("--upsert", action="store_true", default=graph_upsert.GRAPH_UPSERT,
+                        help="MERGE on court/station links and case citations so reruns add nothing twice")
+    parser.add_argument("--no-throttle", action="store_true", default=not THROTTLE_ENABLED,
+                        help="fetch at the full worker count without adaptive limits, retries or circuit breakers")
+    parser.add_argument("--refresh", action="store_true", default=graph_diff.GRAPH_REFRESH,
+                        help="with --upsert, diff re-scraped cases against the stored ones and write only the changes")
+    args = parser.parse_args()
+    if args.cache_dir:
+        configure_cache(args.cache_dir, offline=args.offline)
+    configure_throttle(not args.no_throttle)
+    if args.upsert:
+        graph_upsert.configure(True)
+        graph_upsert.ensure_schema()
+        graph_diff.configure(args.refresh)
+    journal = CrawlJournal(args.journal) if args.journal else None
+    search_index = SearchIndex(args.search_index) if args.search_index else None
+    dedup = NearDuplicateIndex(args.dedup_index) if args.dedup_index else None
+    corpus = CorpusStore(args.corpus_dir) if args.corpus_dir else None
+    exporter = MetricsExporter(port=args.metrics_port, path=args.metrics_file)
+    try:
+        with profile_run(args.profile):
+            main(taxonomy_file=args.taxonomy, concurrency=args.workers, journal=journal, search_index=search_index,
+                 dedup=dedup, corpus=corpus)
+    finally:
+        exporter.stop()
+        if corpus:
+            corpus.close()
+        if search_index:
+            search_index.close()
+        if dedup:
+            dedup.close()
+            logger.info(f"Near-duplicates: {dedup.stats()}")
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""Static (lxml) parsers for judgment listing and case pages.
+
+These mirror the Selenium helpers in court_cases.py and return the same
+structures, so the HTTP fast path and the browser fallback are interchangeable.
+"""
+import re
+from urllib.parse import parse_qs, urlparse
+
+from data_acquisition.fetcher import text_of
+from data_acquisition.metrics import timed
+
+NOT_FOUND_MARKER = "Not found (Error 404)"
+
+
+class StaticParseError(ValueError):
+    """Raised when a page lacks the markup needed for static parsing"""
+
+
+def _first(element, selector):
+    matches = element.cssselect(selector)
+    return matches[0] if matches else None
+
+
+def is_not_found(tree):
+    """True when the page carries the site's 404 marker"""
+    heading = _first(tree, ".mb-4")
+    return heading is not None and text_of(heading) == NOT_FOUND_MARKER
+
+
+def parse_case_links(tree):
+    """Return judgment links from the cell-title rows of a listing page"""
+    rows = tree.cssselect(".cell-title")
+    if not rows and not is_not_found(tree):
+        raise StaticParseError("listing page has no cell-title rows")
+    links = []
+    for row in rows:
+        anchor = _first(row, "a")
+        if anchor is not None and anchor.get("href"):
+            links.append(anchor.get("href"))
+    return links
+
+
+def parse_last_page(tree):
+    """Highest page number linked from the listing's pagination control, or None.
+
+    Page numbers are read from the ?page= query of each pagination link,
+    falling back to numeric link text.
+    """
+    last = None
+    for anchor in tree.cssselect(".pagination a"):
+        numbers = parse_qs(urlparse(anchor.get("href") or "").query).get("page", [])
+        text = text_of(anchor)
+        if not numbers and re.fullmatch(r"\d+", text):
+            numbers = [text]
+        for number in numbers:
+            if number.isdigit() and (last is None or int(number) > last):
+                last = int(number)
+    return last
+
+
+def parse_dl_key_value_pairs(dl_element):
+    """Static counterpart of get_dl_key_value_pairs"""
+    pairs = {}
+    for dt in dl_element.iter("dt"):
+        dd = dt.getnext()
+        while dd is not None and dd.tag != "dd":
+            dd = dd.getnext()
+        if dd is not None:
+            pairs[text_of(dt)] = text_of(dd)
+    return pairs
+
+
+def parse_header(header):
+    """Static counterpart of getHeader"""
+    fields = {
+        "title": "doc-title",
+        "neutral-citation": "neutral-citation",
+        "authority": "doc-authority",
+        "docket": "docket-number",
+        "date": "doc-date",
+        "note": "header-note",
+    }
+    result = {key: text_of(_first(header, f".{css_class}")) for key, css_class in fields.items()}
+
+    parties = _first(header, ".parties-listing")
+    if parties is not None:
+        for listing in parties.cssselect(".parties-listing"):
+            if listing is parties:
+                continue
+            items = listing.cssselect(".akn-div")
+            if items:
+                result[text_of(items[-1])] = text_of(items[0])
+    return result
+
+
+def parse_body(body):
+    """Static counterpart of getBody: paragraph number -> paragraph text"""
+    paragraphs = {}
+    for para in body.cssselect(".akn-paragraph"):
+        number = text_of(_first(para, ".akn-num, #akn-num"))
+        text = text_of(_first(para, ".akn-content, #akn-content"))
+        paragraphs[number] = text
+    return paragraphs
+
+
+@timed("parse_case")
+def parse_case(tree):
+    """Static counterpart of getCase, returning {"Header": ..., "Body": ...}"""
+    header = _first(tree, "#header")
+    body = _first(tree, "#judgmentBody")
+    if header is None or body is None:
+        raise StaticParseError("judgment page has no #header/#judgmentBody")
+    return {"Header": parse_header(header), "Body": parse_body(body)}
@@ -1,4 +1,3 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
@@ -8,9 +7,27 @@ import time
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.common.action_chains import ActionChains
 import os
+from urllib.parse import urljoin
 from dotenv import load_dotenv
-from neo4j import GraphDatabase
+from data_acquisition import graph_queries, graph_upsert, neo4j_pool
+from data_acquisition.graph_writer import write_tree
+from data_acquisition.pipeline import PIPELINE_BATCH_SIZE, run_pipeline
 import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from data_acquisition.browser import managed_driver
+from data_acquisition.dedup import DEDUP_MODE
+from data_acquisition.metrics import add_gauge, inc, record_error, timed
+from data_acquisition.fetcher import fetch_tree, is_offline, LazyDriver
+from data_acquisition.page_cache import OfflineCacheMiss
+from data_acquisition.case_law.courts_and_tribunals.case_parser import (
+    NOT_FOUND_MARKER,
+    StaticParseError,
+    is_not_found,
+    parse_case,
+    parse_case_links,
+    parse_last_page,
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,15 +35,192 @@ logger = logging.getLogger(__name__)
 
 # Get the BASE_URL from the environment variables
 BASE_URL = os.getenv("BASE_URL")
-NEO4J_URI = os.getenv("NEO4J_URI")
-NEO4J_USER = os.getenv("NEO4J_USER")
-NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
 global_section_index = 1
 supremeCourtUrl = "/judgments/KESC/SCK/?page=";
+# Listing pages fetched at once once the last page number is known
+LISTING_CONCURRENCY = int(os.getenv("LISTING_CONCURRENCY", "8"))
 
-def getCaseLinks(driver,url):
+def getCaseLinks(driver,url,session=None,journal=None):
+    """Collect judgment links over HTTP, handing over to the browser if a page can't be parsed statically.
+
+    With a crawl journal, pages already read are not fetched again and the
+    walk resumes at the first unread page index.
+    """
+    return list(iter_case_links(driver, url, session=session, journal=journal))
+
+def iter_case_links(driver,url,session=None,journal=None):
+    """Yield judgment links page by page, as getCaseLinks collects them.
+
+    Drives listing_walk with fetch_tree: several listing pages are fetched
+    in a thread pool, and pages that can't be read statically are handed to
+    the browser.
+    """
+    walk = listing_walk(url, journal=journal)
+    reply = None
+    try:
+        while True:
+            try:
+                step, value = walk.send(reply)
+            except StopIteration:
+                return
+            reply = None
+            if step == FETCH:
+                reply = fetch_listing_pages(url, value, session=session)
+            elif step == LINKS:
+                yield from value
+            else:
+                inc("browser_fallbacks_total")
+                yield from getCaseLinksWithDriver(driver, url, start_index=value, journal=journal)
+    finally:
+        walk.close()
+
+# Steps of a listing_walk: fetch these page indexes, new links, read the rest with the browser from an index
+FETCH, LINKS, BROWSER = "fetch", "links", "browser"
+
+def listing_walk(url, journal=None):
+    """The pagination of a listing without the fetching, shared by the threaded and asyncio crawlers.
+
+    Yields (LINKS, links) for new links, (BROWSER, index) when the rest of
+    the listing must be read with the browser, and (FETCH, indexes) for
+    listing pages to fetch. The crawler sends back one result per index, in
+    order: (status, tree), or the exception the fetch raised. The results may
+    arrive lazily, so links stream while later pages are still in flight.
+
+    The first unread page's pagination control gives the last page number,
+    and the remaining pages are then fetched together. Without a pagination
+    control, or if one of them can't be read, the pages are walked one at a
+    time until the 404 marker. With a crawl journal, pages already read are
+    not fetched again and the walk resumes at the first unread page index.
+    """
+    seen = set()
     index = 1
+    if journal:
+        index, links, complete = journal.listing_progress(url)
+        yield LINKS, _unseen(links, seen)
+        if complete:
+            return
+        if index > 1:
+            logger.info(f"Resuming {url} at page {index} with {len(links)} links")
+    result, = yield FETCH, [index]
+    if _listing_end(result):
+        if journal:
+            journal.mark_listing_complete(url)
+        return
+    page_links = _page_links(result, f"{url}{index}")
+    if page_links is None:
+        # Let the page-by-page walk decide how to handle the failure
+        yield from _walk_pages(url, index, journal, seen)
+        return
+    if journal:
+        journal.record_listing_page(url, index, page_links)
+    yield LINKS, _unseen(page_links, seen)
+
+    last_page = parse_last_page(result[1])
+    if last_page is None:
+        yield from _walk_pages(url, index + 1, journal, seen)
+        return
+    next_index = index + 1
+    if next_index <= last_page:
+        results = yield FETCH, list(range(next_index, last_page + 1))
+        try:
+            for result in results:
+                page_links = None if _listing_end(result) else _page_links(result, f"{url}{next_index}")
+                if page_links is None:
+                    break
+                if journal:
+                    journal.record_listing_page(url, next_index, page_links)
+                yield LINKS, _unseen(page_links, seen)
+                next_index += 1
+        finally:
+            if hasattr(results, "close"):
+                # Stop fetching the pages after the last one read
+                results.close()
+    if next_index > last_page:
+        if journal:
+            journal.mark_listing_complete(url)
+        return
+    logger.info(f"Concurrent listing fetch stopped at {url}{next_index}, walking the rest")
+    yield from _walk_pages(url, next_index, journal, seen)
+
+def _walk_pages(url, index, journal, seen):
+    """Walk ?page=index, index+1, ... until the 404 marker, handing over to the browser on failures"""
+    while True:
+        page_url = f"{url}{index}"
+        result, = yield FETCH, [index]
+        if isinstance(result, OfflineCacheMiss):
+            logger.info(f"Offline: {page_url} is not cached, stopping listing")
+            return
+        if _listing_end(result):
+            if journal:
+                journal.mark_listing_complete(url)
+            return
+        page_links = _page_links(result, page_url)
+        if page_links is None:
+            if is_offline():
+                logger.warning(f"Offline: could not parse {page_url}")
+                return
+            yield BROWSER, index
+            return
+        if journal:
+            journal.record_listing_page(url, index, page_links)
+        yield LINKS, _unseen(page_links, seen)
+        index += 1
+
+def _listing_end(result):
+    """Whether a fetched listing page is past the last page: a 404 or the site's 404 marker"""
+    return not isinstance(result, BaseException) and (result[0] == 404 or is_not_found(result[1]))
+
+def _page_links(result, page_url):
+    """The links of a fetched listing page, or None if it failed to fetch or parse"""
+    if isinstance(result, BaseException):
+        logger.info(f"Static listing fetch failed for {page_url}: {result}")
+        return None
+    status, tree = result
+    if status != 200:
+        logger.info(f"HTTP {status} for listing page {page_url}")
+        return None
+    try:
+        return parse_case_links(tree)
+    except StaticParseError as e:
+        logger.info(f"Could not parse listing page {page_url}: {e}")
+        return None
+
+def _unseen(links, seen):
+    """The links not yielded before; listings can repeat a case across pages"""
+    new = []
+    for link in links:
+        if link not in seen:
+            seen.add(link)
+            new.append(link)
+    return new
+
+def _fetch_listing_page(url, index, session):
+    try:
+        return fetch_tree(f"{url}{index}", session=session)
+    except (requests.RequestException, OfflineCacheMiss) as e:
+        return e
+
+def fetch_listing_pages(url, indexes, session=None, workers=LISTING_CONCURRENCY):
+    """Yield (status, tree), or the exception raised, for each listing page index in order.
+
+    Several pages are fetched concurrently; closing the generator cancels
+    the fetches not yet started.
+    """
+    if len(indexes) == 1:
+        yield _fetch_listing_page(url, indexes[0], session)
+        return
+    with ThreadPoolExecutor(max_workers=min(workers, len(indexes))) as pool:
+        futures = [pool.submit(_fetch_listing_page, url, index, session) for index in indexes]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+def getCaseLinksWithDriver(driver,url,start_index=1,journal=None):
+    index = start_index
     links =[]
     while True:
         driver.get(f"{url}{index}")
@@ -34,34 +228,80 @@ def getCaseLinks(driver,url):
         try:
             error404 = driver.find_element(By.CLASS_NAME, "mb-4").text 
             
-            if error404 !=  "Not found (Error 404)":
-                index += 1
+            if error404 !=  NOT_FOUND_MARKER:
                 rows =driver.find_elements(By.CLASS_NAME, "cell-title")
+                page_links = []
                 
                 for row in rows:
                     try:
                         a=row.find_element(By.TAG_NAME,"a")
                         link=a.get_attribute("href")
-                        links.append(link)
+                        page_links.append(link)
                     except:
                         pass
+                if journal:
+                    journal.record_listing_page(url, index, page_links)
+                links.extend(page_links)
+                index += 1
             else:
                 print("error",error404)
+                if journal:
+                    journal.mark_listing_complete(url)
                 break
         except Exception as e:
             print("exception", e)
+            break
     return links
 
-def getCaseContent(driver,link):
-    cases={}
+@timed("case_content")
+def getCaseContent(driver,link,session=None):
+    """Parse a judgment over HTTP, falling back to the browser when the page can't be parsed statically.
+
+    Missing judgments (a 404 or the site's 404 marker) and other client
+    errors return None; only parse failures, network errors and 429/5xx
+    responses go to the browser.
+    """
+    try:
+        status, tree = fetch_tree(link, session=session)
+        case = read_case_page(link, status, tree)
+        if case != BROWSER:
+            return case
+        logger.info(f"HTTP {status} for {link}, using browser")
+    except OfflineCacheMiss:
+        logger.info(f"Offline: {link} is not cached")
+        return None
+    except (requests.RequestException, StaticParseError) as e:
+        record_error("static_parse_case")
+        logger.info(f"Static parse failed for {link}, using browser: {e}")
+    if is_offline():
+        # The browser would go to the network
+        return None
+    inc("browser_fallbacks_total")
+    return getCaseContentWithDriver(driver, link)
+
+def read_case_page(link, status, tree):
+    """The case on a fetched judgment page, None to skip it, or BROWSER to retry it in the browser.
+
+    Raises StaticParseError for a page that can't be parsed statically.
+    """
+    if status == 404 or is_not_found(tree):
+        logger.info(f"No judgment at {link}")
+        return None
+    if status == 200:
+        return parse_case(tree)
+    if status != 429 and status < 500:
+        logger.warning(f"HTTP {status} for {link}, skipping")
+        return None
+    return BROWSER
+
+def getCaseContentWithDriver(driver,link):
     driver.get(link)
-    title = driver.find_element(By.TAG_NAME,"h1").text
-    dl=driver.find_elements(By.TAG_NAME,"dl")
-    # content = driver.find_element(By.CLASS_NAME,"akn-judgment")
-    for dl_item in dl:
-        pairs=get_dl_key_value_pairs(dl_item)
-        # print("content",pairs)
-    return
+    try:
+        with timed("browser_parse_case"):
+            return getCase(driver)
+    except Exception as e:
+        logger.error(f"Error getting case content for {link}: {e}")
+        return None
 
 def get_dl_key_value_pairs(dl_element):
     pairs = {}
@@ -87,141 +327,167 @@ def getCase(content):
     return case
 
 def getBody(body):
+    paragraphs={}
     paras =body.find_elements(By.CLASS_NAME,"akn-paragraph")
     for para in paras:
-        body=getPara(para)
-    return body
+        paragraphs.update(getPara(para))
+    return paragraphs
 
 def getPara(para):
     paragraph={}
-    text = para.find_element(By.ID,"akn-content").text
-    number = para.find_element(By.ID,"akn-num").text
+    text = para.find_element(By.CLASS_NAME,"akn-content").text
+    number = para.find_element(By.CLASS_NAME,"akn-num").text
     paragraph[f"{number}"] = text
     return paragraph
 
-def getHeader(header):
-    header ={}
-    title = header.find_element(By.CLASS_NAME,"doc-title").text
-    neutral_citation =header.find_element(By.CLASS_NAME,"neutral-citation").text
-    authority =header.find_element(By.CLASS_NAME,"doc-authority").text
-    docket =header.find_element(By.CLASS_NAME,"docket-number").text
-    date =header.find_element(By.CLASS_NAME,"doc-date").text
-    note =header.find_element(By.CLASS_NAME,"header-note").text
+def getHeader(header_element):
+    title = header_element.find_element(By.CLASS_NAME,"doc-title").text
+    neutral_citation =header_element.find_element(By.CLASS_NAME,"neutral-citation").text
+    authority =header_element.find_element(By.CLASS_NAME,"doc-authority").text
+    docket =header_element.find_element(By.CLASS_NAME,"docket-number").text
+    date =header_element.find_element(By.CLASS_NAME,"doc-date").text
+    note =header_element.find_element(By.CLASS_NAME,"header-note").text
     header= {"title":title,"neutral-citation":neutral_citation,"authority":authority,"docket":docket,"date":date,"note":note}
 
-    parties =header.find_element(By.CLASS_NAME,"parties-listing")
+    parties =header_element.find_element(By.CLASS_NAME,"parties-listing")
     listings =parties.find_elements(By.CLASS_NAME,"parties-listing")
     for listing in listings:
         items=listing.find_elements(By.CLASS_NAME,"akn-div")
         name = items[0].text
         role = items[len(items)-1].text
-        header ={f"{role}":name}
+        header[f"{role}"] = name
     return header
 
 def create_nodes_recursively(tx, data, parent_id=None, node_label="Node", node_name=None):
-    if parent_id is None:
-        primitive_props = {k: v for k, v in data.items()
-                           if isinstance(v, (str, int, float, bool)) or 
-                              (isinstance(v, list) and all(isinstance(item, (str, int, float, bool)) for item in v))}
-        result = tx.run(
-            "CREATE (n:Constitution) SET n += $props RETURN elementId(n) AS node_id", 
-            props=primitive_props
-        )
-        parent_id = result.single()["node_id"]
-    
-    for key, value in data.items():
-        if isinstance(value, dict):
-            child_props = {k: v for k, v in value.items()
-                           if isinstance(v, (str, int, float, bool)) or 
-                              (isinstance(v, list) and all(isinstance(x, (str, int, float, bool)) for x in v))}
-            # Inject the label into the query string.
-            query = "CREATE (n:" + node_label + " {name: $name}) SET n += $props RETURN elementId(n) AS node_id"
-            result = tx.run(query, name=key, props=child_props)
-            child_id = result.single()["node_id"]
-            tx.run(
-                "MATCH (p), (c) WHERE elementId(p) = $parent_id AND elementId(c) = $child_id "
-                "CREATE (p)-[:HAS_CHILD]->(c)",
-                parent_id=parent_id, child_id=child_id
-            )
-            create_nodes_recursively(tx, value, parent_id=child_id, node_label=node_label, node_name=key)
-        elif isinstance(value, list):
-            for item in value:
-                if isinstance(item, dict):
-                    child_props = {k: v for k, v in item.items()
-                                   if isinstance(v, (str, int, float, bool)) or 
-                                      (isinstance(v, list) and all(isinstance(x, (str, int, float, bool)) for x in v))}
-                    query = "CREATE (n:" + node_label + " {name: $name}) SET n += $props RETURN elementId(n) AS node_id"
-                    result = tx.run(query, name=key, props=child_props)
-                    child_id = result.single()["node_id"]
-                    tx.run(
-                        "MATCH (p), (c) WHERE elementId(p) = $parent_id AND elementId(c) = $child_id "
-                        "CREATE (p)-[:HAS_CHILD]->(c)",
-                        parent_id=parent_id, child_id=child_id
-                    )
-                    create_nodes_recursively(tx, item, parent_id=child_id, node_label=node_label, node_name=key)
-                else:
-                    tx.run(
-                        "MATCH (n) WHERE elementId(n) = $parent_id "
-                        "SET n[$key] = coalesce(n[$key], []) + $value",
-                        parent_id=parent_id, key=key, value=item
-                    )
-        else:
-            tx.run(
-                "MATCH (n) WHERE elementId(n) = $parent_id SET n[$key] = $value",
-                parent_id=parent_id, key=key, value=value
-            )
-    return parent_id
+    """Write a nested dict tree under parent_id (or a new Constitution root) using batched UNWIND statements"""
+    return write_tree(tx, data, parent_id=parent_id, node_label=node_label)
 
 def insert_hierarchy(data):
 
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    with driver.session() as session:
-        session.execute_write(create_nodes_recursively, data)
-    driver.close()
+    with neo4j_pool.session() as session:
+        return session.execute_write(create_nodes_recursively, data)
 
 def insert_with_parent(parent_id, data):
 
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    with driver.session() as session:
+    with neo4j_pool.session() as session:
         session.execute_write(create_nodes_recursively, data, parent_id=parent_id)
-    driver.close()
 
 
 
-def scrape_court_data(parent_id=None, url=None):
+def listing_url(url=None):
+    """Build the paginated listing URL for a court or station link"""
+    url = urljoin(BASE_URL, url or supremeCourtUrl)
+    if not url.endswith("?page="):
+        url = url + "?page="
+    return url
 
-    url = BASE_URL + url
-    driver = webdriver.Chrome()
-    try:
-        links = getCaseLinks(driver, url)
-        cases_data = []
-        
-        for link in links:
-            case_data = getCaseContent(driver, link)
-            if case_data:
-                cases_data.append(case_data)
-        
-        # Structure the data for Neo4j insertion
-       
+def iter_cases(driver, url, session=None, journal=None, skip=()):
+    """Yield (link, case) for every judgment of a listing as soon as it is parsed"""
+    for link in iter_case_links(driver, url, session=session, journal=journal):
+        if link in skip:
+            continue
+        case_data = getCaseContent(driver, link, session=session)
+        if case_data:
+            yield link, case_data
+
+@timed("scrape_station")
+def scrape_court_data(parent_id=None, url=None, driver=None, session=None, journal=None,
+                      batch_size=PIPELINE_BATCH_SIZE, search_index=None, dedup=None, corpus=None):
+    """Scrape every case of a court or station and return how many were stored.
+
+    Cases stream from the scraper to the graph writer through a bounded
+    queue and are written batch_size at a time, so memory stays flat and
+    the first cases reach Neo4j while the listing is still being read.
+
+    Pass a long-lived driver/session to reuse them across stations; otherwise
+    a browser is started on demand and quit when the station is done. With a
+    crawl journal, finished stations are skipped and cases stored by an
+    earlier, interrupted run are not fetched again. With a search index,
+    each stored case's paragraphs are added to it. With a near-duplicate
+    index, a case matching an earlier one is flagged with duplicate-of or,
+    in DEDUP_MODE "skip", left out of the graph and search index. With a
+    corpus store, each stored case is also appended to its shards; the
+    journal records a batch only once the corpus has it on disk.
+    """
+    url = listing_url(url)
+    if journal and journal.is_station_done(url):
+        logger.info(f"Skipping {url}: already stored")
+        return 0
+    owns_driver = driver is None
+    if owns_driver:
+        # Chrome is only started if a page has to fall back to Selenium
+        driver = LazyDriver(managed_driver)
+    stored_cases = journal.stored_case_links(url) if journal else set()
+    root = {"id": parent_id}
+
+    @timed("write_batch")
+    def write_batch(batch):
+        stored = _drop_duplicates(batch, dedup, url)
+        # Structure the data for Neo4j insertion: one child node per case
+        tree = {"case": [case_data for _, case_data in stored]}
         
+        if stored and not root["id"] and graph_upsert.is_enabled():
+            # Keyed on the listing, so a rerun attaches its cases to the same root
+            root["id"] = graph_upsert.insert_root(url)
         # Insert with parent connection if specified
-        if parent_id:
-            insert_with_parent(parent_id, cases_data)
-        else:
-            insert_hierarchy(cases_data)
-            
-        return cases_data
+        if stored and root["id"] and graph_upsert.is_enabled():
+            graph_upsert.insert_cases(root["id"], stored)
+        elif stored and root["id"]:
+            insert_with_parent(root["id"], tree)
+        elif stored:
+            root["id"] = insert_hierarchy(tree)
+        if stored:
+            graph_queries.invalidate("cases", f"node:{root['id']}")
+        inc("cases_stored_total", len(stored))
+        if search_index:
+            for link, case_data in stored:
+                search_index.add_case(link, case_data, station=url)
+        if corpus:
+            corpus.add_cases(stored, station=url)
+        # Journal last: a case recorded here is skipped on resume, so it must already be durable everywhere
+        if journal:
+            for link, case_data in batch:
+                journal.record_case(url, link, case_data)
+
+    add_gauge("active_stations", 1)
+    try:
+        count = run_pipeline(iter_cases(driver, url, session=session, journal=journal, skip=stored_cases),
+                             write_batch, batch_size=batch_size)
+        if journal:
+            if journal.listing_progress(url)[2]:
+                journal.mark_station_done(url, count + len(stored_cases))
+            else:
+                # The next run resumes the listing and skips the cases stored here
+                logger.warning(f"Listing for {url} did not finish; station left open")
+        return count
     finally:
-        driver.quit()
+        add_gauge("active_stations", -1)
+        if owns_driver:
+            driver.quit()
+
 
+def _drop_duplicates(batch, dedup, station):
+    """The cases of a batch to store, flagging or dropping near-duplicates of earlier cases"""
+    if dedup is None:
+        return batch
+    stored = []
+    for link, case_data in batch:
+        canonical, similarity = dedup.check_case(link, case_data, station=station)
+        if canonical is None:
+            stored.append((link, case_data))
+            continue
+        logger.info(f"{link} is a near-duplicate of {canonical} ({similarity:.2f})")
+        if DEDUP_MODE != "skip":
+            case_data.setdefault("Header", {})["duplicate-of"] = canonical
+            stored.append((link, case_data))
+    return stored
 
 
 def main():
     logging.basicConfig(filename='Kenya-Law-AI.log', level=logging.INFO)
-    logger.info('Getting contitutional data')
-    court_data = scrape_court_data()
-    logger.info('Storing constitutional data')
-    insert_hierarchy(court_data)
+    logger.info('Getting and storing court data')
+    # scrape_court_data stores the cases itself
+    scrape_court_data()
 
     
 
@@ -0,0 +1,67 @@
+"""Static (lxml) parsers for the classification, court and station pages.
+
+These follow the same selectors as the Selenium scrapers in case_laws.py.
+"""
+from data_acquisition.fetcher import text_of
+
+
+def parse_court_classifications(tree):
+    """Top-level court classifications from the home page dropdown"""
+    classifications = []
+    dropdowns = tree.cssselect(".dropdown-menu")
+    if not dropdowns:
+        return classifications
+    for item in dropdowns[0].cssselect(".dropdown-item"):
+        anchors = item.cssselect("a")
+        if not anchors:
+            continue
+        classification = text_of(anchors[0]).strip()
+        href = anchors[0].get("href")
+        if classification and href:
+            classifications.append({
+                'classification': classification,
+                'link': href
+            })
+    return classifications
+
+
+def _list_links(tree, keep_empty_links=False):
+    entries = []
+    for ul in tree.cssselect("ul.list-unstyled"):
+        for li in ul.iter("li"):
+            for anchor in li.iter("a"):
+                name = text_of(anchor).strip()
+                link = anchor.get("href")
+                if name and (link or keep_empty_links):
+                    entries.append({
+                        'name': name,
+                        'link': link or ''
+                    })
+    return entries
+
+
+def parse_courts(tree):
+    """Courts listed on a classification page"""
+    return _list_links(tree)
+
+
+def parse_court_stations(tree):
+    """Stations listed on a court page"""
+    return _list_links(tree, keep_empty_links=True)
+
+
+def parse_elections(tree):
+    """Election petition years listed on the Elections page"""
+    elections = []
+    containers = tree.cssselect(".pt-4.pb-5")
+    if not containers:
+        return elections
+    for item in containers[0].iter("li"):
+        for anchor in item.iter("a"):
+            election_year = text_of(anchor).strip()
+            if election_year:
+                elections.append({
+                    'name': election_year,
+                    'link': anchor.get("href")
+                })
+    return elections
@@ -0,0 +1,355 @@
+"""Split judgments and legislation into overlapping, retrieval-sized chunks.
+
+A judgment is a sequence of paragraphs (as getBody/parse_body return them)
+and a constitution or act section a sequence of subsections. Chunks are
+packed from whole paragraphs up to CHUNK_TOKENS tokens, and each chunk
+starts by repeating up to CHUNK_OVERLAP tokens from the end of the one
+before. A chunk never spans two judgments or two sections, and a
+paragraph is only cut when it is longer than the budget on its own.
+Each chunk carries the source's citation, court, station and date and
+the numbers of the paragraphs it covers.
+
+Packing works on cumulative token counts with numpy.searchsorted, so the
+cost is dominated by counting tokens. A ChunkStore keeps chunks in SQLite
+with a hash of each source, so re-running over a corpus only re-chunks
+judgments that are new or have changed. Chunks have the same shape as the
+units in documents.py, so SearchIndex.add and VectorIndex.add take them
+directly.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from data_acquisition.documents import parse_date, sections
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "512"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+CHUNK_STORE = os.getenv("CHUNK_STORE")
+# Sources re-chunked between SQLite commits
+CHUNK_COMMIT_EVERY = 500
+
+# Words and individual punctuation marks: close to what subword tokenizers count
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    return len(_TOKEN.findall(text))
+
+
+def _token_starts(text):
+    return [match.start() for match in _TOKEN.finditer(text)]
+
+
+def split_long(label, text, window):
+    """Cut a piece longer than window tokens into consecutive windows"""
+    starts = _token_starts(text)
+    pieces = []
+    for first in range(0, len(starts), window):
+        last = first + window
+        end = starts[last] if last < len(starts) else len(text)
+        pieces.append((label, text[starts[first]:end].strip(), min(window, len(starts) - first)))
+    return pieces
+
+
+def tail(text, tokens):
+    """The last tokens tokens of text"""
+    # Look at the end of the text first; tokens rarely average 16 characters
+    window = text[-tokens * 16:]
+    starts = _token_starts(window)
+    if len(starts) <= tokens and len(window) < len(text):
+        window = text
+        starts = _token_starts(window)
+    return window[starts[-tokens]:] if len(starts) > tokens else window
+
+
+def pack(counts, budget=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """[(start, end)] piece ranges: each fits the budget, each overlaps the last by up to overlap tokens"""
+    bounds = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+    spans = []
+    start = 0
+    while start < len(counts):
+        end = max(start + 1, int(np.searchsorted(bounds, bounds[start] + budget, side="right")) - 1)
+        spans.append((start, end))
+        if end >= len(counts):
+            break
+        repeat_from = int(np.searchsorted(bounds, bounds[end] - overlap, side="left"))
+        # Repeat no more than leaves room for the next piece, or the span would add nothing new
+        room = int(np.searchsorted(bounds, bounds[end + 1] - budget, side="left"))
+        start = max(min(max(repeat_from, room), end), start + 1)
+    return spans
+
+
+def chunk_pieces(pieces, base, budget=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Yield chunks of [(label, text)] pieces, each a copy of base with key, text and paragraphs.
+
+    Pieces are packed into budget - overlap tokens, leaving room to repeat
+    up to overlap tokens from the end of the previous chunk: its trailing
+    paragraphs if they fit, otherwise the tail of its last paragraph.
+    """
+    window = max(1, budget - overlap)
+    sized = []
+    for label, text in pieces:
+        text = text.strip()
+        if not text:
+            continue
+        tokens = count_tokens(text)
+        if tokens > window:
+            sized.extend(split_long(label, text, window))
+        else:
+            sized.append((label, text, tokens))
+    if not sized:
+        return
+    counts = np.fromiter((tokens for _, _, tokens in sized), dtype=np.int64, count=len(sized))
+    previous_end = 0
+    for number, (start, end) in enumerate(pack(counts, window, overlap)):
+        parts = sized[start:end]
+        tokens = int(counts[start:end].sum())
+        if number and overlap and start == previous_end:
+            # No whole paragraph fit in the overlap: carry the end of the last one
+            label, text, count = sized[start - 1]
+            carried = tail(text, overlap)
+            parts = [(label, carried, min(count, overlap))] + parts
+            tokens += min(count, overlap)
+        previous_end = end
+        labels = list(dict.fromkeys(label for label, _, _ in parts))
+        text = "\n\n".join(f"{label} {text}" if label else text for label, text, _ in parts)
+        yield dict(base, key=f"{base['source']}#chunk-{number}", text=text, paragraphs=labels, tokens=tokens)
+
+
+def chunk_case(link, case, station="", budget=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Chunks of one case dict ({"Header": ..., "Body": {number: text}})"""
+    header = case.get("Header") or {}
+    base = {
+        "kind": "case",
+        "source": link,
+        "court": header.get("authority", ""),
+        "station": station,
+        "date": parse_date(header.get("date", "")),
+        "citation": header.get("neutral-citation", ""),
+        "title": header.get("title", ""),
+    }
+    yield from chunk_pieces(list((case.get("Body") or {}).items()), base, budget, overlap)
+
+
+def _strings(value):
+    if isinstance(value, str):
+        if value.strip():
+            yield value
+    elif isinstance(value, dict):
+        for child in value.values():
+            yield from _strings(child)
+
+
+def _section_pieces(name, section):
+    """[(label, text)] for a section: its subsections, or the whole section if it has none"""
+    pieces = []
+    for key, child in (section.get("sub_sections") or {}).items():
+        if isinstance(child, dict):
+            label = f"{name}({child.get('number', '').strip('() ') or key.split()[-1]})"
+            pieces.append((label, "\n".join(_strings(child.get("sub_sections", child)))))
+    if not pieces:
+        pieces.append((name, "\n".join(_strings(section.get("Content", section)))))
+    title = section.get("title")
+    if title:
+        pieces[0] = (pieces[0][0], f"{title}\n{pieces[0][1]}")
+    return pieces
+
+
+def chunk_legislation(hierarchy, source="constitution", kind="constitution",
+                      budget=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Chunks of a constitution/act hierarchy; chunks stay within one section"""
+    title = (hierarchy.get("cover page") or {}).get("title", "")
+    for path, section in sections(hierarchy.get("content") or {}):
+        base = {"kind": kind, "source": f"{source}#{'/'.join(path)}", "court": "", "station": "",
+                "date": "", "citation": "", "title": title}
+        yield from chunk_pieces(_section_pieces(path[-1], section), base, budget, overlap)
+
+
+def content_hash(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _chunk_case_job(job):
+    link, case, station, digest, budget, overlap = job
+    return link, digest, list(chunk_case(link, case, station, budget, overlap))
+
+
+class ChunkStore:
+    """Chunks by source in SQLite; a source is re-chunked only when its content hash changes"""
+
+    def __init__(self, path=CHUNK_STORE, budget=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+        self.path = path
+        self.budget = budget
+        self.overlap = overlap
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            """
+        )
+        self._db.commit()
+        self._pending = 0
+        # Settings are part of the hash so changing them re-chunks everything
+        self._settings = f"{budget}:{overlap}"
+
+    def digest_if_changed(self, source, data):
+        """The content hash to store for source, or None if its chunks are up to date"""
+        digest = content_hash([self._settings, data])
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM sources WHERE source = ?", (source,)).fetchone()
+        return None if row and row[0] == digest else digest
+
+    def store_chunks(self, source, digest, chunks):
+        """Replace source's chunks"""
+        with self._lock:
+            self._db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._db.executemany("INSERT OR REPLACE INTO chunks (key, source, data) VALUES (?, ?, ?)",
+                                 [(chunk["key"], source, json.dumps(chunk, ensure_ascii=False)) for chunk in chunks])
+            self._db.execute("INSERT OR REPLACE INTO sources (source, content_hash, chunk_count) VALUES (?, ?, ?)",
+                             (source, digest, len(chunks)))
+            self._pending += 1
+            if self._pending >= CHUNK_COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+
+    def _replace(self, source, data, chunks):
+        """Store chunks for source unless data is unchanged; returns the new chunks or None"""
+        digest = self.digest_if_changed(source, data)
+        if digest is None:
+            return None
+        chunks = list(chunks())
+        self.store_chunks(source, digest, chunks)
+        return chunks
+
+    def add_cases(self, cases, workers=1):
+        """Chunk (link, case, station) items that are new or changed, on a process pool if workers > 1.
+
+        Returns the number of cases re-chunked.
+        """
+        def changed():
+            for link, case, station in cases:
+                digest = self.digest_if_changed(link, case)
+                if digest is not None:
+                    yield link, case, station, digest, self.budget, self.overlap
+
+        if workers <= 1:
+            jobs = map(_chunk_case_job, changed())
+            count = 0
+            for link, digest, chunks in jobs:
+                self.store_chunks(link, digest, chunks)
+                count += 1
+            return count
+        count = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for link, digest, chunks in pool.map(_chunk_case_job, changed(), chunksize=64):
+                self.store_chunks(link, digest, chunks)
+                count += 1
+        return count
+
+    def add_case(self, link, case, station=""):
+        return self._replace(link, case, lambda: chunk_case(link, case, station, self.budget, self.overlap))
+
+    def add_legislation(self, hierarchy, source="constitution", kind="constitution"):
+        return self._replace(source, hierarchy,
+                             lambda: chunk_legislation(hierarchy, source, kind, self.budget, self.overlap))
+
+    def iter_chunks(self, sources=None):
+        """Yield stored chunks, optionally only those of the given sources"""
+        if sources is not None:
+            for source in sources:
+                with self._lock:
+                    rows = self._db.execute("SELECT data FROM chunks WHERE source = ? ORDER BY rowid",
+                                            (source,)).fetchall()
+                for (data,) in rows:
+                    yield json.loads(data)
+            return
+        with self._lock:
+            rows = self._db.cursor().execute("SELECT data FROM chunks ORDER BY rowid")
+            batch = rows.fetchmany(1000)
+        while batch:
+            for (data,) in batch:
+                yield json.loads(data)
+            with self._lock:
+                batch = rows.fetchmany(1000)
+
+    def stats(self):
+        with self._lock:
+            sources, chunks = self._db.execute("SELECT COUNT(*), COALESCE(SUM(chunk_count), 0) FROM sources").fetchone()
+        return {"sources": sources, "chunks": chunks}
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        with self._lock:
+            self._db.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Chunk scraped judgments and legislation for retrieval")
+    parser.add_argument("--store", default=CHUNK_STORE, required=CHUNK_STORE is None, help="SQLite chunk store")
+    parser.add_argument("--journal", help="crawl journal holding the scraped cases")
+    parser.add_argument("--constitution-json", help="constitution tree saved as JSON")
+    parser.add_argument("--legislation-dir", help="directory of act hierarchies written by legislation.py")
+    parser.add_argument("--tokens", type=int, default=CHUNK_TOKENS, help="token budget per chunk")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP, help="tokens repeated between chunks")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes chunking cases")
+    parser.add_argument("--export", help="also write every chunk to this JSON-lines file")
+    args = parser.parse_args()
+
+    store = ChunkStore(args.store, budget=args.tokens, overlap=args.overlap)
+    changed = 0
+    if args.journal:
+        from data_acquisition.crawl_journal import CrawlJournal
+        journal = CrawlJournal(args.journal)
+        cases = ((case_url, data, station_url) for station_url, case_url, data in journal.iter_cases())
+        changed += store.add_cases(cases, workers=args.workers)
+        journal.close()
+    if args.constitution_json:
+        with open(args.constitution_json, encoding="utf-8") as f:
+            changed += store.add_legislation(json.load(f)) is not None
+    if args.legislation_dir:
+        for name in sorted(os.listdir(args.legislation_dir)):
+            if name.endswith(".json"):
+                with open(os.path.join(args.legislation_dir, name), encoding="utf-8") as f:
+                    hierarchy = json.load(f)
+                changed += store.add_legislation(hierarchy, source=hierarchy.get("source", name),
+                                                 kind="legislation") is not None
+    logger.info(f"Re-chunked {changed} sources; store holds {store.stats()}")
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as f:
+            for chunk in store.iter_chunks():
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Citation graph between judgments and precomputed authority scores.
+
+Judgment paragraphs are scanned with one compiled pattern for Kenyan
+neutral citations (``[2019] KECA 123 (KLR)``). Each citation is resolved
+against the neutral citations in the ingested cases' headers, and the
+resolved edges are written to Neo4j as CITES relationships between case
+nodes, in UNWIND batches.
+
+PageRank, HITS authority and citation counts are then computed over the
+whole graph with numpy (a handful of bincount passes per iteration) and
+stored on the case nodes as indexed properties, so "most cited cases on X"
+is an index lookup on pagerank or cited_by rather than a traversal.
+
+Case nodes are the 'case' nodes graph_writer creates; their Header child
+carries the neutral-citation property. Each one resolved is given the Case
+label graph_upsert uses, so the edge and score writes are seeks on the
+(:Case).citation index both modules create.
+"""
+import argparse
+import json
+import logging
+import re
+from collections import Counter
+
+import numpy as np
+from dotenv import load_dotenv
+
+from data_acquisition import graph_queries, neo4j_pool
+from data_acquisition.graph_writer import GRAPH_WRITE_BATCH_SIZE, _batches
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+PAGERANK_DAMPING = 0.85
+SCORE_ITERATIONS = 100
+SCORE_TOLERANCE = 1e-10
+
+CITATION_PATTERN = re.compile(r"\[\s*(\d{4})\s*\]\s*(KE[A-Z]{2,8})\s+(\d{1,6})(?:\s*\(\s*KLR\s*\))?")
+
+SCHEMA_QUERIES = [
+    "CREATE INDEX header_neutral_citation IF NOT EXISTS FOR (n:Node) ON (n.`neutral-citation`)",
+    # Same definition as graph_upsert's, so whichever runs first creates it
+    "CREATE INDEX case_citation IF NOT EXISTS FOR (n:Case) ON (n.citation)",
+    "CREATE INDEX case_pagerank IF NOT EXISTS FOR (n:Case) ON (n.pagerank)",
+    "CREATE INDEX case_cited_by IF NOT EXISTS FOR (n:Case) ON (n.cited_by)",
+]
+
+# Labels each case node Case with its canonical citation so the CITES batches can match on an index
+LABEL_CASES_QUERY = """
+UNWIND $rows AS row
+MATCH (c:Node {name: 'case'})-[:HAS_CHILD]->(:Node {name: 'Header', `neutral-citation`: row.header})
+SET c:Case, c.citation = row.citation
+"""
+
+CITES_QUERY = """
+UNWIND $rows AS row
+MATCH (a:Case {citation: row.source})
+MATCH (b:Case {citation: row.target})
+MERGE (a)-[r:CITES]->(b)
+SET r.count = row.count
+"""
+
+SCORES_QUERY = """
+UNWIND $rows AS row
+MATCH (c:Case {citation: row.citation})
+SET c.pagerank = row.pagerank, c.authority_score = row.authority, c.cited_by = row.cited_by
+"""
+
+
+def normalize_citation(text):
+    """Canonical '[YYYY] COURT N (KLR)' form of a neutral citation, or None"""
+    match = CITATION_PATTERN.search(text or "")
+    return canonical(match) if match else None
+
+
+def canonical(match):
+    year, court, number = match.groups()
+    return f"[{year}] {court} {int(number)} (KLR)"
+
+
+def extract_citations(text):
+    """Canonical neutral citations in a text, in order of appearance"""
+    return [canonical(match) for match in CITATION_PATTERN.finditer(text or "")]
+
+
+def case_citations(case):
+    """Counter of the citations in a case's body, excluding its own"""
+    own = normalize_citation((case.get("Header") or {}).get("neutral-citation"))
+    counts = Counter()
+    for text in (case.get("Body") or {}).values():
+        counts.update(extract_citations(text))
+    counts.pop(own, None)
+    return own, counts
+
+
+class CitationGraph:
+    """Cases by neutral citation and the citations between them"""
+
+    def __init__(self):
+        self.index = {}
+        self.citations = []
+        self.headers = {}
+        self.raw_edges = Counter()
+        self.unresolved = Counter()
+
+    def add_case(self, case):
+        own, counts = case_citations(case)
+        if own is None:
+            return
+        if own not in self.index:
+            self.index[own] = len(self.citations)
+            self.citations.append(own)
+            self.headers[own] = case["Header"]["neutral-citation"]
+        for target, count in counts.items():
+            self.raw_edges[(own, target)] += count
+
+    def edges(self):
+        """Resolved (source, target, count) edges; citations of cases not ingested are counted as unresolved"""
+        resolved = []
+        self.unresolved = Counter()
+        for (source, target), count in self.raw_edges.items():
+            if target in self.index:
+                resolved.append((source, target, count))
+            else:
+                self.unresolved[target] += count
+        return resolved
+
+    def scores(self, edges=None):
+        """{citation: {"pagerank", "authority", "cited_by"}} for every ingested case"""
+        edges = self.edges() if edges is None else edges
+        size = len(self.citations)
+        src = np.fromiter((self.index[s] for s, _, _ in edges), dtype=np.int64, count=len(edges))
+        dst = np.fromiter((self.index[t] for _, t, _ in edges), dtype=np.int64, count=len(edges))
+        pagerank = compute_pagerank(src, dst, size)
+        authority = compute_hits_authority(src, dst, size)
+        cited_by = np.bincount(dst, minlength=size)
+        return {
+            citation: {"pagerank": float(pagerank[i]), "authority": float(authority[i]), "cited_by": int(cited_by[i])}
+            for i, citation in enumerate(self.citations)
+        }
+
+
+def compute_pagerank(src, dst, size, damping=PAGERANK_DAMPING, iterations=SCORE_ITERATIONS, tol=SCORE_TOLERANCE):
+    """PageRank over an edge list (one edge per citing/cited pair), by power iteration"""
+    if size == 0:
+        return np.zeros(0)
+    out_degree = np.bincount(src, minlength=size).astype(np.float64)
+    dangling = out_degree == 0
+    rank = np.full(size, 1.0 / size)
+    share = np.zeros(size)
+    for _ in range(iterations):
+        np.divide(rank, out_degree, out=share, where=~dangling)
+        incoming = np.bincount(dst, weights=share[src], minlength=size)
+        updated = (1 - damping) / size + damping * (incoming + rank[dangling].sum() / size)
+        if np.abs(updated - rank).sum() < tol:
+            return updated
+        rank = updated
+    return rank
+
+
+def compute_hits_authority(src, dst, size, iterations=SCORE_ITERATIONS, tol=SCORE_TOLERANCE):
+    """HITS authority scores (cited by good hubs), normalised to sum to 1"""
+    if size == 0 or len(src) == 0:
+        return np.zeros(size)
+    authority = np.full(size, 1.0 / size)
+    for _ in range(iterations):
+        hub = np.bincount(src, weights=authority[dst], minlength=size)
+        updated = np.bincount(dst, weights=hub[src], minlength=size)
+        total = updated.sum()
+        if total == 0:
+            return updated
+        updated /= total
+        if np.abs(updated - authority).sum() < tol:
+            return updated
+        authority = updated
+    return authority
+
+
+def write_citation_graph(graph, batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """Create the indexes, CITES edges and score properties in Neo4j; returns (edges, cases) written"""
+    edges = graph.edges()
+    scores = graph.scores(edges)
+    with neo4j_pool.session() as session:
+        for query in SCHEMA_QUERIES:
+            session.run(query).consume()
+        label_rows = [{"header": header, "citation": citation} for citation, header in graph.headers.items()]
+        for batch in _batches(label_rows, batch_size):
+            session.execute_write(lambda tx, rows: tx.run(LABEL_CASES_QUERY, rows=rows).consume(), batch)
+        edge_rows = [{"source": s, "target": t, "count": c} for s, t, c in edges]
+        for batch in _batches(edge_rows, batch_size):
+            session.execute_write(lambda tx, rows: tx.run(CITES_QUERY, rows=rows).consume(), batch)
+        score_rows = [dict(citation=citation, **values) for citation, values in scores.items()]
+        for batch in _batches(score_rows, batch_size):
+            session.execute_write(lambda tx, rows: tx.run(SCORES_QUERY, rows=rows).consume(), batch)
+    # Case nodes gained a label and score properties, which children() and subtree() return
+    graph_queries.invalidate("scores", "cases")
+    logger.info(f"Wrote {len(edge_rows)} CITES edges and scores for {len(score_rows)} cases; "
+                f"{sum(graph.unresolved.values())} citations to {len(graph.unresolved)} cases not ingested")
+    return len(edge_rows), len(score_rows)
+
+
+def most_cited(limit=20, order_by="pagerank"):
+    """The highest-scoring cases by pagerank, authority_score or cited_by, from their indexed properties"""
+    if order_by not in ("pagerank", "authority_score", "cited_by"):
+        raise ValueError(f"Unknown score {order_by!r}")
+    query = (f"MATCH (c:Case) WHERE c.{order_by} IS NOT NULL "
+             f"RETURN c.citation AS citation, c.{order_by} AS score ORDER BY c.{order_by} DESC LIMIT $limit")
+    with neo4j_pool.session() as session:
+        return [record.data() for record in session.run(query, limit=limit)]
+
+
+def build_from_journal(journal):
+    graph = CitationGraph()
+    for _, _, case in journal.iter_cases():
+        graph.add_case(case)
+    return graph
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Extract the citation graph and compute authority scores")
+    parser.add_argument("--journal", required=True, help="crawl journal holding the scraped cases")
+    parser.add_argument("--output", help="write edges and scores as JSON instead of to Neo4j")
+    args = parser.parse_args()
+
+    from data_acquisition.crawl_journal import CrawlJournal
+    journal = CrawlJournal(args.journal)
+    graph = build_from_journal(journal)
+    journal.close()
+    if args.output:
+        edges = graph.edges()
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"edges": edges, "scores": graph.scores(edges),
+                       "unresolved": graph.unresolved.most_common()}, f, indent=2)
+        logger.info(f"{len(graph.citations)} cases, {len(edges)} resolved citation edges")
+    else:
+        write_citation_graph(graph)
+        neo4j_pool.close_driver()
+
+
+if __name__ == "__main__":
+    main()
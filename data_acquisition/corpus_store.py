@@ -0,0 +1,352 @@
+"""Sharded, compressed store of scraped judgments.
+
+Cases are buffered as they are scraped and written CORPUS_SHARD_ROWS at a
+time as one shard: gzip-compressed JSON lines, or, with pyarrow installed
+and CORPUS_FORMAT=parquet, a zstd Parquet file. Each row has a column per
+header field plus the full header and body as JSON strings. The rows of a
+shard are sorted by court and date before writing so the Parquet row
+groups carry tight min/max statistics.
+
+Buffered rows are also appended to pending.jsonl, which add_cases fsyncs
+before returning, so a crawl can record a case as done once add_cases has
+returned: after a crash the pending rows are reloaded into the buffer
+rather than lost. Each link is stored once; adding a link that is already
+in a shard or the buffer is a no-op, so re-exports don't duplicate rows.
+
+manifest.json lists every shard with its row count, courts, stations and
+date range, and the file holding its links. Reads filtered by court,
+station or date skip whole shards from the manifest alone; Parquet shards
+are then memory-mapped and only the row groups whose statistics can match
+are decoded. iter_cases yields
+(station, link, case) like CrawlJournal.iter_cases, so the index builders
+and graph loaders can read either.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from data_acquisition.documents import parse_date
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only the JSON lines format is available without pyarrow
+    pa = pq = None
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+CORPUS_DIR = os.getenv("CORPUS_DIR")
+CORPUS_FORMAT = os.getenv("CORPUS_FORMAT", "jsonl")
+CORPUS_SHARD_ROWS = int(os.getenv("CORPUS_SHARD_ROWS", "5000"))
+CORPUS_ROW_GROUP = int(os.getenv("CORPUS_ROW_GROUP", "500"))
+MANIFEST = "manifest.json"
+PENDING = "pending.jsonl"
+
+COLUMNS = ["link", "station", "court", "date", "citation", "title", "docket", "header", "body"]
+EXTENSIONS = {"jsonl": ".jsonl.gz", "parquet": ".parquet"}
+
+
+def case_row(link, case, station=""):
+    header = case.get("Header") or {}
+    return {
+        "link": link,
+        "station": station,
+        "court": header.get("authority", ""),
+        "date": parse_date(header.get("date", "")),
+        "citation": header.get("neutral-citation", ""),
+        "title": header.get("title", ""),
+        "docket": header.get("docket", ""),
+        "header": json.dumps(header, ensure_ascii=False),
+        "body": json.dumps(case.get("Body") or {}, ensure_ascii=False),
+    }
+
+
+def row_case(row):
+    """(station, link, case) for a stored row"""
+    return row["station"], row["link"], {"Header": json.loads(row["header"]), "Body": json.loads(row["body"])}
+
+
+def _matches(row, court, station, date_from, date_to):
+    return ((court is None or row["court"] == court)
+            and (station is None or row["station"] == station)
+            and (date_from is None or (row["date"] and row["date"] >= date_from))
+            and (date_to is None or (row["date"] and row["date"] <= date_to)))
+
+
+def _shard_may_match(shard, court, station, date_from, date_to):
+    if court is not None and court not in shard["courts"]:
+        return False
+    if station is not None and station not in shard["stations"]:
+        return False
+    if date_from is not None and (not shard["date_max"] or shard["date_max"] < date_from):
+        return False
+    if date_to is not None and (not shard["date_min"] or shard["date_min"] > date_to):
+        return False
+    return True
+
+
+def _read_parquet(path, court, station, date_from, date_to, columns):
+    """Memory-map a Parquet shard, decoding only the row groups whose statistics can match"""
+    if pq is None:
+        raise RuntimeError(f"Reading {path} needs pyarrow")
+    filters = [(name, "=", value) for name, value in (("court", court), ("station", station)) if value is not None]
+    if date_from is not None:
+        filters.append(("date", ">=", date_from))
+    if date_to is not None:
+        filters.append(("date", "<=", date_to))
+    return pq.read_table(path, columns=columns, filters=filters or None, memory_map=True)
+
+
+class CorpusStore:
+    def __init__(self, directory=CORPUS_DIR, format=CORPUS_FORMAT, shard_rows=CORPUS_SHARD_ROWS):
+        if format not in EXTENSIONS:
+            raise ValueError(f"Unknown corpus format {format!r}")
+        if format == "parquet" and pq is None:
+            raise RuntimeError("The parquet corpus format needs pyarrow")
+        self.directory = directory
+        self.format = format
+        self.shard_rows = shard_rows
+        self._lock = threading.Lock()
+        self._buffer = []
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = {"shards": []}
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        self._links = set()
+        for shard in self.manifest["shards"]:
+            self._links.update(self._shard_links(shard))
+        self._recover_pending()
+        self._pending = open(os.path.join(directory, PENDING), "a", encoding="utf-8")
+
+    def _shard_links(self, shard):
+        if "links" in shard:
+            with gzip.open(os.path.join(self.directory, shard["links"]), "rt", encoding="utf-8") as f:
+                return f.read().splitlines()
+        # Shards written before link files existed: read the link column
+        return [row["link"] for row in self._shard_rows(shard, columns=["link"])]
+
+    def _shard_rows(self, shard, court=None, station=None, date_from=None, date_to=None, columns=None):
+        path = os.path.join(self.directory, shard["file"])
+        if shard["format"] == "parquet":
+            for batch in self._parquet_batches(path, court, station, date_from, date_to, columns):
+                yield from batch
+        else:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for row in map(json.loads, f):
+                    if _matches(row, court, station, date_from, date_to):
+                        yield row
+
+    def _recover_pending(self):
+        """Buffer the rows a previous run added but never wrote to a shard"""
+        path = os.path.join(self.directory, PENDING)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # A row torn by the crash was never acknowledged to the caller
+                    break
+                if row["link"] not in self._links:
+                    self._links.add(row["link"])
+                    self._buffer.append(row)
+        # Rewrite without the rows already in shards or torn
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            for row in self._buffer:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(f"{path}.tmp", path)
+        if self._buffer:
+            logger.info(f"Recovered {len(self._buffer)} unsharded cases from {path}")
+
+    # Writing
+
+    def add_case(self, link, case, station=""):
+        """Buffer a case unless its link is already stored; returns whether it was added"""
+        with self._lock:
+            added = self._add(case_row(link, case, station))
+            self._pending.flush()
+            self._write_full_shard()
+        return added
+
+    def add_cases(self, cases, station=""):
+        """Buffer (link, case) pairs and fsync them to the pending file; returns how many were new.
+
+        Once this returns the cases survive a crash, so callers may record
+        them as done.
+        """
+        with self._lock:
+            added = sum(self._add(case_row(link, case, station)) for link, case in cases)
+            self._pending.flush()
+            os.fsync(self._pending.fileno())
+            self._write_full_shard()
+        return added
+
+    def _add(self, row):
+        if row["link"] in self._links:
+            return False
+        self._links.add(row["link"])
+        self._buffer.append(row)
+        self._pending.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return True
+
+    def _write_full_shard(self):
+        if len(self._buffer) >= self.shard_rows:
+            self._write_shard()
+
+    def flush(self):
+        with self._lock:
+            if self._buffer:
+                self._write_shard()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._pending.close()
+
+    def _write_shard(self):
+        rows = sorted(self._buffer, key=lambda row: (row["court"], row["date"]))
+        self._buffer = []
+        name = f"shard-{len(self.manifest['shards']):05d}{EXTENSIONS[self.format]}"
+        links_name = f"shard-{len(self.manifest['shards']):05d}.links.gz"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        if self.format == "parquet":
+            table = pa.Table.from_pylist(rows, schema=pa.schema([(column, pa.string()) for column in COLUMNS]))
+            pq.write_table(table, tmp_path, row_group_size=CORPUS_ROW_GROUP, compression="zstd")
+        else:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False))
+                    f.write("\n")
+        os.replace(tmp_path, path)
+        links_path = os.path.join(self.directory, links_name)
+        with gzip.open(f"{links_path}.tmp", "wt", encoding="utf-8") as f:
+            f.write("".join(row["link"] + "\n" for row in rows))
+        os.replace(f"{links_path}.tmp", links_path)
+        dates = [row["date"] for row in rows if row["date"]]
+        self.manifest["shards"].append({
+            "file": name,
+            "format": self.format,
+            "rows": len(rows),
+            "links": links_name,
+            "courts": sorted({row["court"] for row in rows}),
+            "stations": sorted({row["station"] for row in rows}),
+            "date_min": min(dates, default=""),
+            "date_max": max(dates, default=""),
+        })
+        self._write_manifest()
+        # Only now are the pending rows in a listed shard; a crash before this truncate
+        # leaves them pending, and they are skipped on reload as already stored
+        self._pending.truncate(0)
+        self._pending.seek(0)
+        logger.info(f"Wrote {len(rows)} cases to {name}")
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    # Reading
+
+    def shards(self, court=None, station=None, date_from=None, date_to=None):
+        """Manifest entries of the shards that can hold rows matching the filters"""
+        return [shard for shard in self.manifest["shards"]
+                if _shard_may_match(shard, court, station, date_from, date_to)]
+
+    def iter_batches(self, court=None, station=None, date_from=None, date_to=None, columns=None):
+        """Yield lists of matching row dicts, one per shard or Parquet record batch.
+
+        Dates are ISO strings. Only the requested columns are decoded from
+        Parquet shards; JSON lines rows carry every column.
+        """
+        for shard in self.shards(court, station, date_from, date_to):
+            if shard["format"] == "parquet":
+                path = os.path.join(self.directory, shard["file"])
+                yield from self._parquet_batches(path, court, station, date_from, date_to, columns)
+            else:
+                rows = list(self._shard_rows(shard, court, station, date_from, date_to))
+                if rows:
+                    yield rows
+
+    def _parquet_batches(self, path, court, station, date_from, date_to, columns):
+        for batch in _read_parquet(path, court, station, date_from, date_to, columns).to_batches():
+            if batch.num_rows:
+                yield batch.to_pylist()
+
+    def iter_arrow(self, court=None, station=None, date_from=None, date_to=None, columns=None):
+        """Yield pyarrow RecordBatches of the matching rows of the Parquet shards, without copying to Python"""
+        for shard in self.shards(court, station, date_from, date_to):
+            if shard["format"] == "parquet":
+                path = os.path.join(self.directory, shard["file"])
+                yield from _read_parquet(path, court, station, date_from, date_to, columns).to_batches()
+
+    def iter_rows(self, **filters):
+        for batch in self.iter_batches(**filters):
+            yield from batch
+
+    def iter_cases(self, **filters):
+        """Yield (station, link, case) for every stored case matching the filters"""
+        for row in self.iter_rows(**filters):
+            yield row_case(row)
+
+    def stats(self):
+        shards = self.manifest["shards"]
+        size = sum(os.path.getsize(os.path.join(self.directory, shard["file"])) for shard in shards)
+        return {"shards": len(shards), "cases": sum(shard["rows"] for shard in shards),
+                "buffered": len(self._buffer), "bytes": size}
+
+
+def export_journal(journal, store):
+    count = 0
+    for station_url, case_url, data in journal.iter_cases():
+        if data and store.add_case(case_url, data, station=station_url):
+            count += 1
+    store.flush()
+    return count
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Write or scan the sharded case corpus")
+    parser.add_argument("--corpus", default=CORPUS_DIR, required=CORPUS_DIR is None)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="copy the cases of a crawl journal into the corpus")
+    export.add_argument("--journal", required=True, help="crawl journal holding the scraped cases")
+    export.add_argument("--format", choices=sorted(EXTENSIONS), default=CORPUS_FORMAT)
+    export.add_argument("--shard-rows", type=int, default=CORPUS_SHARD_ROWS)
+    scan = commands.add_parser("scan", help="print the cases matching the filters as JSON lines")
+    scan.add_argument("--court")
+    scan.add_argument("--station")
+    scan.add_argument("--date-from", help="ISO date")
+    scan.add_argument("--date-to", help="ISO date")
+    scan.add_argument("--columns", nargs="+", choices=COLUMNS)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from data_acquisition.crawl_journal import CrawlJournal
+        journal = CrawlJournal(args.journal)
+        store = CorpusStore(args.corpus, format=args.format, shard_rows=args.shard_rows)
+        logger.info(f"Exported {export_journal(journal, store)} cases: {store.stats()}")
+        journal.close()
+    else:
+        store = CorpusStore(args.corpus)
+        for batch in store.iter_batches(court=args.court, station=args.station, date_from=args.date_from,
+                                        date_to=args.date_to, columns=args.columns):
+            for row in batch:
+                if args.columns:
+                    row = {column: row[column] for column in args.columns}
+                print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Durable SQLite journal of crawl progress.
+
+Records every listing page walked (with the links it yielded), every case
+written to the graph (with its data) and every station fully stored, so a
+crawl that crashes or is stopped can be rerun and resume where it left
+off: finished stations are skipped, stored cases are not fetched again and
+a listing restarts at the first page it had not read.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+CRAWL_JOURNAL = os.getenv("CRAWL_JOURNAL")
+
+
+class CrawlJournal:
+    def __init__(self, path=CRAWL_JOURNAL):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS listing_pages (
+                listing_url TEXT NOT NULL,
+                page_index INTEGER NOT NULL,
+                links TEXT NOT NULL,
+                done_at REAL NOT NULL,
+                PRIMARY KEY (listing_url, page_index)
+            );
+            CREATE TABLE IF NOT EXISTS listings (
+                listing_url TEXT PRIMARY KEY,
+                complete INTEGER NOT NULL DEFAULT 0,
+                done_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS cases (
+                case_url TEXT NOT NULL,
+                station_url TEXT NOT NULL,
+                data TEXT,
+                done_at REAL NOT NULL,
+                PRIMARY KEY (station_url, case_url)
+            );
+            CREATE TABLE IF NOT EXISTS stations (
+                station_url TEXT PRIMARY KEY,
+                case_count INTEGER NOT NULL,
+                done_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+        self._db.commit()
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            self._db.execute(query, params)
+            self._db.commit()
+
+    def _fetchall(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    # Listing pages
+
+    def record_listing_page(self, listing_url, page_index, links):
+        self._execute(
+            "INSERT OR REPLACE INTO listing_pages (listing_url, page_index, links, done_at) VALUES (?, ?, ?, ?)",
+            (listing_url, page_index, json.dumps(links), time.time())
+        )
+
+    def mark_listing_complete(self, listing_url):
+        self._execute(
+            "INSERT OR REPLACE INTO listings (listing_url, complete, done_at) VALUES (?, 1, ?)",
+            (listing_url, time.time())
+        )
+
+    def listing_progress(self, listing_url):
+        """Return (next page index, links read so far, whether the listing is complete)"""
+        rows = self._fetchall(
+            "SELECT page_index, links FROM listing_pages WHERE listing_url = ? ORDER BY page_index", (listing_url,)
+        )
+        links = []
+        next_index = 1
+        for page_index, page_links in rows:
+            if page_index != next_index:
+                # Only a contiguous run of pages can be trusted to resume from
+                break
+            links.extend(json.loads(page_links))
+            next_index += 1
+        complete = self._fetchall("SELECT complete FROM listings WHERE listing_url = ?", (listing_url,))
+        return next_index, links, bool(complete and complete[0][0])
+
+    # Cases
+
+    def record_case(self, station_url, case_url, data):
+        self._execute(
+            "INSERT OR REPLACE INTO cases (case_url, station_url, data, done_at) VALUES (?, ?, ?, ?)",
+            (case_url, station_url, json.dumps(data, ensure_ascii=False), time.time())
+        )
+
+    def stored_case_links(self, station_url):
+        """URLs of the cases already stored for a station"""
+        rows = self._fetchall("SELECT case_url FROM cases WHERE station_url = ?", (station_url,))
+        return {case_url for (case_url,) in rows}
+
+    def iter_cases(self):
+        """Yield (station_url, case_url, data) for every stored case"""
+        with self._lock:
+            cursor = self._db.cursor()
+            rows = cursor.execute("SELECT station_url, case_url, data FROM cases ORDER BY done_at")
+            batch = rows.fetchmany(500)
+        while batch:
+            for station_url, case_url, data in batch:
+                yield station_url, case_url, json.loads(data)
+            with self._lock:
+                batch = rows.fetchmany(500)
+
+    # Stations
+
+    def mark_station_done(self, station_url, case_count):
+        self._execute(
+            "INSERT OR REPLACE INTO stations (station_url, case_count, done_at) VALUES (?, ?, ?)",
+            (station_url, case_count, time.time())
+        )
+
+    def is_station_done(self, station_url):
+        return bool(self._fetchall("SELECT 1 FROM stations WHERE station_url = ?", (station_url,)))
+
+    # Arbitrary crawl state, e.g. the scraped taxonomy
+
+    def set_state(self, key, value):
+        self._execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def get_state(self, key, default=None):
+        rows = self._fetchall("SELECT value FROM state WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def stats(self):
+        counts = {}
+        for table in ("listing_pages", "listings", "cases", "stations"):
+            counts[table] = self._fetchall(f"SELECT COUNT(*) FROM {table}")[0][0]
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,259 @@
+"""Near-duplicate judgment detection with MinHash signatures and LSH banding.
+
+The same decision is often listed under several stations, or re-uploaded
+with small amendments. Each judgment's body is reduced to word shingles
+and a MinHash signature (DEDUP_NUM_PERM hashed minima), and the signature
+is cut into bands. Two judgments whose Jaccard similarity is near
+DEDUP_THRESHOLD share at least one band with high probability, so a new
+judgment is only compared with the few earlier ones in its bands' buckets
+instead of with the whole corpus.
+
+Matches are grouped into clusters under the first copy seen. At ingest a
+duplicate is either flagged (its Header gets a 'duplicate-of' property
+naming the first copy) or skipped, per DEDUP_MODE. The index is kept in
+memory and saved to DEDUP_INDEX as one .npz so later crawls keep
+detecting duplicates of cases stored earlier.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DEDUP_INDEX = os.getenv("DEDUP_INDEX")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))
+DEDUP_SHINGLE = int(os.getenv("DEDUP_SHINGLE", "5"))
+# "flag" writes duplicates with a duplicate-of property, "skip" leaves them out of the graph
+DEDUP_MODE = os.getenv("DEDUP_MODE", "flag")
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN = re.compile(r"\w+")
+# np.trapz was renamed np.trapezoid in numpy 2.0
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def lsh_params(threshold, num_perm):
+    """(bands, rows) minimising false positives below threshold plus false negatives above it"""
+    similarity = np.linspace(0, 1, 201)
+    below, above = similarity <= threshold, similarity >= threshold
+    best = None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        candidate = 1 - (1 - similarity ** rows) ** bands
+        error = _trapezoid(candidate[below], similarity[below]) + _trapezoid(1 - candidate[above], similarity[above])
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def case_text(case):
+    return "\n".join(text for text in (case.get("Body") or {}).values() if text)
+
+
+def shingles(text, size=DEDUP_SHINGLE):
+    """32-bit hashes of the distinct size-word shingles of text; none if text is shorter than one shingle"""
+    tokens = _TOKEN.findall((text or "").casefold())
+    if len(tokens) < size:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens))
+    # Polynomial rolling combination of each window, kept in 32 bits
+    combined = np.zeros(len(hashes) - size + 1, dtype=np.uint64)
+    for offset in range(size):
+        combined = (combined * np.uint64(1000003) + hashes[offset:offset + len(combined)]) & _MAX_HASH
+    return np.unique(combined)
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes (a*x + b) mod 2^61-1"""
+
+    def __init__(self, num_perm=DEDUP_NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, hashes):
+        if len(hashes) == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        # a < 2^31 and hashes < 2^32, so the product fits in 64 bits before the modulus
+        return (((self.a * hashes[None, :] + self.b) % _MERSENNE) & _MAX_HASH).min(axis=1)
+
+
+class NearDuplicateIndex:
+    """LSH index of judgment signatures; check() finds a new judgment's earlier near-duplicate"""
+
+    def __init__(self, path=DEDUP_INDEX, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM,
+                 shingle_size=DEDUP_SHINGLE):
+        self.path = path
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self._lock = threading.Lock()
+        self.keys = []
+        self.meta = []
+        self.canonical = []
+        self.similarity = []
+        self._positions = {}
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint64)
+        self._count = 0
+        self._buckets = [defaultdict(list) for _ in range(self.bands)]
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def signature(self, text):
+        return self.hasher.signature(shingles(text, self.shingle_size))
+
+    def check(self, key, text, **meta):
+        """Add a document and return (canonical key, estimated similarity), or (None, 0.0) if it is new.
+
+        A key already in the index returns its recorded result without being added again. Text
+        too short for one shingle (an empty Body) has no signature to compare and is not added.
+        """
+        hashes = shingles(text, self.shingle_size)
+        if len(hashes) == 0:
+            return None, 0.0
+        signature = self.hasher.signature(hashes)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            if key in self._positions:
+                position = self._positions[key]
+                return self.canonical[position], self.similarity[position]
+            candidates = set()
+            for bucket, band_key in zip(self._buckets, band_keys):
+                candidates.update(bucket.get(band_key, ()))
+            match, best = None, 0.0
+            if candidates:
+                rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+                estimates = (self._signatures[rows] == signature).mean(axis=1)
+                top = int(np.argmax(estimates))
+                if estimates[top] >= self.threshold:
+                    match, best = rows[top], float(estimates[top])
+            position = self._append(key, signature, meta)
+            for bucket, band_key in zip(self._buckets, band_keys):
+                bucket[band_key].append(position)
+            if match is None:
+                return None, 0.0
+            canonical = self.canonical[match] or self.keys[match]
+            self.canonical[position] = canonical
+            self.similarity[position] = best
+            return canonical, best
+
+    def check_case(self, link, case, station=""):
+        return self.check(link, case_text(case), station=station,
+                          citation=(case.get("Header") or {}).get("neutral-citation", ""))
+
+    def _append(self, key, signature, meta):
+        if self._count == len(self._signatures):
+            grown = np.zeros((max(1024, 2 * self._count), self.hasher.num_perm), dtype=np.uint64)
+            grown[:self._count] = self._signatures[:self._count]
+            self._signatures = grown
+        position = self._count
+        self._signatures[position] = signature
+        self._count += 1
+        self._positions[key] = position
+        self.keys.append(key)
+        self.meta.append(meta)
+        self.canonical.append(None)
+        self.similarity.append(0.0)
+        return position
+
+    def clusters(self):
+        """[{canonical, members: [{key, similarity, ...meta}]}] for every group of near-duplicates"""
+        with self._lock:
+            groups = defaultdict(list)
+            for position, canonical in enumerate(self.canonical):
+                if canonical is not None:
+                    groups[canonical].append(dict(self.meta[position], key=self.keys[position],
+                                                  similarity=round(self.similarity[position], 4)))
+            report = []
+            for canonical, members in groups.items():
+                first = self._positions[canonical]
+                report.append({"canonical": dict(self.meta[first], key=canonical), "members": members})
+        report.sort(key=lambda cluster: -len(cluster["members"]))
+        return report
+
+    def stats(self):
+        with self._lock:
+            duplicates = sum(canonical is not None for canonical in self.canonical)
+        return {"documents": self._count, "duplicates": duplicates, "threshold": self.threshold,
+                "bands": self.bands, "rows": self.rows}
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            state = {"keys": self.keys, "meta": self.meta, "canonical": self.canonical,
+                     "similarity": self.similarity, "threshold": self.threshold,
+                     "shingle_size": self.shingle_size}
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(tmp_path, signatures=self._signatures[:self._count], state=np.array(json.dumps(state)))
+        os.replace(tmp_path, path)
+
+    def _load(self, path):
+        with np.load(path) as data:
+            signatures = data["signatures"]
+            state = json.loads(str(data["state"]))
+        if signatures.shape[1] != self.hasher.num_perm:
+            raise ValueError(f"{path} holds {signatures.shape[1]}-permutation signatures, not {self.hasher.num_perm}")
+        if state["shingle_size"] != self.shingle_size:
+            raise ValueError(f"{path} holds signatures of {state['shingle_size']}-word shingles, not {self.shingle_size}")
+        if state["threshold"] != self.threshold:
+            raise ValueError(f"{path} holds duplicates found at threshold {state['threshold']}, not {self.threshold}")
+        self.keys, self.meta = state["keys"], state["meta"]
+        self.canonical, self.similarity = state["canonical"], state["similarity"]
+        self._signatures, self._count = signatures.copy(), len(signatures)
+        self._positions = {key: position for position, key in enumerate(self.keys)}
+        for position, signature in enumerate(self._signatures):
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+                bucket[band_key].append(position)
+        logger.info(f"Loaded {self._count} signatures from {path}")
+
+    def close(self):
+        self.save()
+
+
+def write_report(index, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"stats": index.stats(), "clusters": index.clusters()}, f, indent=2)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Find near-duplicate judgments in a crawl journal")
+    parser.add_argument("--journal", required=True, help="crawl journal holding the scraped cases")
+    parser.add_argument("--index", default=DEDUP_INDEX, help="save the signature index here")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD, help="minimum estimated Jaccard similarity")
+    parser.add_argument("--num-perm", type=int, default=DEDUP_NUM_PERM, help="MinHash signature length")
+    parser.add_argument("--report", default="duplicate_clusters.json", help="write the clusters found here")
+    args = parser.parse_args()
+
+    from data_acquisition.crawl_journal import CrawlJournal
+    journal = CrawlJournal(args.journal)
+    index = NearDuplicateIndex(args.index, threshold=args.threshold, num_perm=args.num_perm)
+    for station, link, case in journal.iter_cases():
+        if case:
+            index.check_case(link, case, station=station)
+    journal.close()
+    index.close()
+    write_report(index, args.report)
+    logger.info(f"{index.stats()}; clusters written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Flatten scraped judgments and legislation into searchable text units.
+
+A unit is one judgment paragraph (as getBody/parse_body return them) or
+one section of the constitution or an act, with the metadata the search
+indexes filter on: court, station, date, citation and title.
+"""
+from datetime import datetime
+
+DATE_FORMATS = ("%d %B %Y", "%d %b %Y", "%Y-%m-%d", "%d/%m/%Y", "%B %d, %Y")
+
+
+def parse_date(text):
+    """ISO date for a judgment's doc-date text, or "" if it can't be read"""
+    text = " ".join((text or "").split())
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return ""
+
+
+def case_documents(link, case, station=""):
+    """Yield one unit per paragraph of a case dict ({"Header": ..., "Body": ...})"""
+    header = case.get("Header") or {}
+    base = {
+        "kind": "case",
+        "source": link,
+        "court": header.get("authority", ""),
+        "station": station,
+        "date": parse_date(header.get("date", "")),
+        "citation": header.get("neutral-citation", ""),
+        "title": header.get("title", ""),
+    }
+    for number, text in (case.get("Body") or {}).items():
+        if text and text.strip():
+            yield dict(base, key=f"{link}#{number}", paragraph=number, text=text)
+
+
+def _strings(value):
+    if isinstance(value, str):
+        if value.strip():
+            yield value
+    elif isinstance(value, dict):
+        for child in value.values():
+            yield from _strings(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from _strings(child)
+
+
+def legislation_documents(hierarchy, source="constitution", kind="constitution"):
+    """Yield one unit per section of a constitution/act hierarchy from akn_parser"""
+    title = (hierarchy.get("cover page") or {}).get("title", "")
+    for path, section in sections(hierarchy.get("content") or {}):
+        yield {
+            "kind": kind,
+            "source": source,
+            "key": f"{source}#{'/'.join(path)}",
+            "paragraph": "/".join(path),
+            "court": "",
+            "station": "",
+            "date": "",
+            "citation": "",
+            "title": title,
+            "text": "\n".join(_strings(section)),
+        }
+
+
+def sections(node, path=()):
+    """(path, section) for every 'Section N' dict under node, in document order"""
+    for key, child in node.items():
+        if isinstance(child, dict):
+            if key.startswith("Section "):
+                yield path + (key,), child
+            else:
+                yield from sections(child, path + (key,))
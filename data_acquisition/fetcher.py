@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
+from dotenv import load_dotenv
+
+from data_acquisition.metrics import inc, timed
+from data_acquisition.page_cache import OfflineCacheMiss, get_cache
+from data_acquisition.throttle import classify_status, get_throttle
+
+# Load environment variables from .env file
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_URL = os.getenv("BASE_URL")
+FETCH_POOL_SIZE = int(os.getenv("FETCH_POOL_SIZE", "32"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30"))
+FETCH_USER_AGENT = os.getenv("FETCH_USER_AGENT", "Kenya-Law-AI/1.0")
+
+# 404s are cached too: they mark the end of a listing's pagination
+CACHEABLE_STATUSES = (200, 404)
+# Transient failures the throttle retries; anything else is raised at once
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size=FETCH_POOL_SIZE):
+    """Create an HTTP session with a keep-alive connection pool"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": FETCH_USER_AGENT})
+    return session
+
+
+def get_session():
+    """Return the process-wide HTTP session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def fetch_page(url, session=None, cache=None):
+    """Fetch a page over HTTP and return (status_code, html_text).
+
+    When a page cache is configured, cached pages are revalidated with
+    If-None-Match / If-Modified-Since and served on 304; in offline mode
+    only cached pages are returned and anything else raises OfflineCacheMiss.
+    Network requests go through the process-wide throttle, which limits
+    them per host and retries throttled or failed ones.
+    """
+    cache = cache or get_cache()
+    cached = cache.get(url) if cache else None
+    if cache and cache.offline:
+        if cached is None:
+            inc("fetch_cache_total", result="offline_miss")
+            raise OfflineCacheMiss(url)
+        inc("fetch_cache_total", result="hit")
+        return cached.status, cached.text
+    if cached and cached.is_fresh(cache.max_age):
+        inc("fetch_cache_total", result="hit")
+        return cached.status, cached.text
+
+    headers = {}
+    if cached:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    session = session or get_session()
+
+    def get():
+        with timed("fetch"):
+            return session.get(url, timeout=FETCH_TIMEOUT, headers=headers)
+
+    throttle = get_throttle()
+    if throttle:
+        response = throttle.call(url, get, classify=_classify_response, retry_on=RETRY_EXCEPTIONS)
+    else:
+        response = get()
+    inc("fetch_responses_total", status=response.status_code)
+    if cached and response.status_code == 304:
+        inc("fetch_cache_total", result="revalidated")
+        cache.touch(url)
+        return cached.status, cached.text
+    if cache and response.status_code in CACHEABLE_STATUSES:
+        cache.put(url, response.status_code, response.text,
+                  etag=response.headers.get("ETag"),
+                  last_modified=response.headers.get("Last-Modified"))
+    return response.status_code, response.text
+
+
+def _classify_response(response):
+    return classify_status(response.status_code, response.headers.get("Retry-After"))
+
+
+def is_offline():
+    """True when fetches are served from the page cache only"""
+    cache = get_cache()
+    return bool(cache and cache.offline)
+
+
+def parse_html(text, base_url=None):
+    """Parse an HTML document into an lxml tree with absolute links"""
+    with timed("parse_html"):
+        tree = lxml_html.fromstring(text)
+        if base_url:
+            tree.make_links_absolute(base_url)
+    return tree
+
+
+def fetch_tree(url, session=None):
+    """Fetch a page and return (status_code, lxml tree)"""
+    status, text = fetch_page(url, session=session)
+    return status, parse_html(text, base_url=url)
+
+
+_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+    "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "ol",
+    "p", "pre", "section", "table", "tr", "ul",
+}
+
+
+def _collect_text(element, parts):
+    if not isinstance(element.tag, str) or element.tag in ("script", "style"):
+        # Comments, scripts and styles carry no visible text
+        return
+    block = element.tag in _BLOCK_TAGS
+    if block:
+        parts.append("\n")
+    if element.text:
+        parts.append(element.text.replace("\n", " "))
+    for child in element:
+        _collect_text(child, parts)
+        if child.tail:
+            parts.append(child.tail.replace("\n", " "))
+    if block:
+        parts.append("\n")
+
+
+def text_of(element):
+    """Approximate Selenium's element.text for a static lxml element"""
+    if element is None:
+        return ""
+    parts = []
+    _collect_text(element, parts)
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+class LazyDriver:
+    """Stand-in for a WebDriver that only starts the browser when first used.
+
+    Lets the HTTP fast path run without paying for Chrome, while the Selenium
+    fallback code keeps calling driver.get / driver.find_element as before.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._driver = None
+
+    @property
+    def started(self):
+        return self._driver is not None
+
+    def __getattr__(self, name):
+        if self._driver is None:
+            logger.info("Starting browser for Selenium fallback")
+            self._driver = self._factory()
+        return getattr(self._driver, name)
+
+    def quit(self):
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
@@ -0,0 +1,292 @@
+"""Content hashes on graph nodes and incremental diffs of re-scraped trees.
+
+Every node written through with_hashes() carries three extra properties:
+
+- ``props_hash``: hash of the node's own properties
+- ``content_hash``: hash of props_hash and its children's content hashes
+  (a Merkle hash of the whole subtree)
+- ``child_key``: the node's name, plus ``#i`` for the i-th item of a list,
+  which identifies it among its siblings
+
+diff_trees() compares a freshly scraped tree with what is stored under an
+existing node, top down and one level at a time for all the trees at
+once. Subtrees whose content hash matches are never read further, so the
+reads and the resulting plan scale with what changed: property updates
+on changed nodes, new subtrees to create, removed subtrees to delete, and
+new content hashes for the changed nodes' ancestors. apply_plan() writes
+the plan in UNWIND batches.
+
+Trees written before hashes existed have no hashes and diff as changed
+everywhere the first time, which backfills them.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+
+from dotenv import load_dotenv
+
+from data_acquisition.graph_writer import GRAPH_WRITE_BATCH_SIZE, _batches, node_props, write_subtrees
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+GRAPH_REFRESH = os.getenv("GRAPH_REFRESH", "0") == "1"
+HASH_PROPS = ("props_hash", "content_hash", "child_key")
+
+_refresh = GRAPH_REFRESH
+
+
+def configure(enabled):
+    """Diff re-ingested trees against the stored ones instead of skipping them"""
+    global _refresh
+    _refresh = enabled
+
+
+def is_enabled():
+    return _refresh
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class HashedNode:
+    """A scraped dict node with its properties, hashes and children keyed by child_key"""
+
+    __slots__ = ("name", "child_key", "data", "props", "props_hash", "content_hash", "children")
+
+    def __init__(self, name, child_key, data):
+        self.name = name
+        self.child_key = child_key
+        self.data = data
+        self.props = node_props(data)
+        if name is not None:
+            self.props = dict({"name": name}, **self.props)
+        self.props_hash = _digest(json.dumps(self.props, sort_keys=True, ensure_ascii=False))
+        self.children = {}
+        for key, value in data.items():
+            if isinstance(value, dict):
+                self.children[key] = HashedNode(key, key, value)
+            elif isinstance(value, list):
+                items = [item for item in value if isinstance(item, dict)]
+                for index, item in enumerate(items):
+                    child_key = f"{key}#{index}"
+                    self.children[child_key] = HashedNode(key, child_key, item)
+        self.content_hash = _digest(self.props_hash + "".join(
+            f"|{key}={child.content_hash}" for key, child in self.children.items()))
+
+    def stored_props(self):
+        """Properties to store on the node, hashes included"""
+        return dict(self.props, props_hash=self.props_hash, content_hash=self.content_hash, child_key=self.child_key)
+
+    def hashed_data(self):
+        """The scraped dict with each descendant's hash properties added, for writing a new subtree"""
+        data = {key: value for key, value in self.data.items() if not isinstance(value, (dict, list))}
+        data.update(props_hash=self.props_hash, content_hash=self.content_hash, child_key=self.child_key)
+        lists = {}
+        for child in self.children.values():
+            if child.child_key == child.name:
+                data[child.name] = child.hashed_data()
+            else:
+                lists.setdefault(child.name, []).append(child.hashed_data())
+        for key, value in self.data.items():
+            if isinstance(value, list):
+                primitives = [item for item in value if not isinstance(item, dict)]
+                data[key] = primitives + lists.get(key, [])
+        return data
+
+
+def with_hashes(data):
+    """(root content hash, children) for writing a new tree under a root: the tree's children carry hashes"""
+    root = HashedNode(None, None, data)
+    hashed = root.hashed_data()
+    for key in HASH_PROPS:
+        hashed.pop(key, None)
+    return root.content_hash, hashed
+
+
+class DiffPlan:
+    def __init__(self):
+        self.updates = []      # {"id", "props"}: replace a changed node's properties
+        self.hashes = []       # {"id", "content_hash"}: a root whose subtree changed
+        self.creates = []      # (parent id, {name: hashed data}) subtrees to add
+        self.deletes = []      # ids of subtrees to remove
+        self.compared = 0
+        self.unchanged_roots = 0
+
+    def is_empty(self):
+        return not (self.updates or self.hashes or self.creates or self.deletes)
+
+    def summary(self):
+        return {"compared": self.compared, "unchanged_roots": self.unchanged_roots, "updated": len(self.updates),
+                "root_hashes": len(self.hashes), "created": len(self.creates), "deleted": len(self.deletes)}
+
+
+ROOT_HASHES_QUERY = """
+UNWIND $ids AS id
+MATCH (n) WHERE elementId(n) = id
+RETURN id, n.content_hash AS content_hash
+"""
+
+CHILDREN_QUERY = """
+UNWIND $ids AS id
+MATCH (p)-[:HAS_CHILD]->(c) WHERE elementId(p) = id
+RETURN id AS parent, elementId(c) AS id, c.name AS name, c.child_key AS child_key,
+       c.props_hash AS props_hash, c.content_hash AS content_hash
+ORDER BY parent, id
+"""
+
+
+def _creation_order(record):
+    """A node's numeric id, which ends its elementId ("4:<database id>:12"); ids grow as nodes are created"""
+    tail = re.search(r"\d+$", record["id"])
+    return int(tail.group()) if tail else 0
+
+
+def _stored_child_keys(records):
+    """child_key for each stored child; nodes written without hashes get name#i in list order.
+
+    A list's items are created in order, so creation order is list order.
+    CHILDREN_QUERY sorts by elementId string, which puts item 10 before 2.
+    """
+    counts = {}
+    names = {}
+    for record in records:
+        counts[record["name"]] = counts.get(record["name"], 0) + 1
+    for record in sorted(records, key=_creation_order):
+        if record["child_key"]:
+            yield record["child_key"], record
+            continue
+        index = names.get(record["name"], 0)
+        names[record["name"]] = index + 1
+        yield (record["name"] if counts[record["name"]] == 1 else f"{record['name']}#{index}"), record
+
+
+def diff_trees(tx, pairs, batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """Plan the writes that turn the trees stored under each (node id, scraped data) pair into the data"""
+    plan = DiffPlan()
+    roots = {node_id: HashedNode(None, None, data) for node_id, data in pairs}
+    frontier = []
+    for batch in _batches(list(roots), batch_size):
+        for record in tx.run(ROOT_HASHES_QUERY, ids=batch):
+            node = roots[record["id"]]
+            plan.compared += 1
+            if record["content_hash"] == node.content_hash:
+                plan.unchanged_roots += 1
+            else:
+                plan.hashes.append({"id": record["id"], "content_hash": node.content_hash})
+                frontier.append((record["id"], node))
+
+    while frontier:
+        stored = {}
+        for batch in _batches([node_id for node_id, _ in frontier], batch_size):
+            for record in tx.run(CHILDREN_QUERY, ids=batch):
+                stored.setdefault(record["parent"], []).append(record)
+        next_frontier = []
+        for node_id, node in frontier:
+            existing = dict(_stored_child_keys(stored.get(node_id, [])))
+            for child_key, child in node.children.items():
+                record = existing.pop(child_key, None)
+                single = existing.get(child.name)
+                if record is None and child_key == f"{child.name}#0" and single and not single["child_key"]:
+                    # A one-item list written without hashes is keyed like a single child
+                    record = existing.pop(child.name)
+                if record is None:
+                    plan.creates.append((node_id, child))
+                    continue
+                plan.compared += 1
+                if record["content_hash"] == child.content_hash:
+                    continue
+                plan.updates.append({"id": record["id"], "props": child.stored_props()})
+                next_frontier.append((record["id"], child))
+            plan.deletes.extend(record["id"] for record in existing.values())
+        frontier = next_frontier
+    return plan
+
+
+UPDATE_QUERY = """
+UNWIND $rows AS row
+MATCH (n) WHERE elementId(n) = row.id
+SET n = row.props
+"""
+
+ROOT_HASH_QUERY = """
+UNWIND $rows AS row
+MATCH (n) WHERE elementId(n) = row.id
+SET n.content_hash = row.content_hash
+"""
+
+DELETE_QUERY = """
+UNWIND $ids AS id
+MATCH (n) WHERE elementId(n) = id
+OPTIONAL MATCH (n)-[:HAS_CHILD*]->(d)
+WITH n, collect(DISTINCT d) AS descendants
+FOREACH (d IN descendants | DETACH DELETE d)
+DETACH DELETE n
+"""
+
+
+def apply_plan(tx, plan, batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """Write a DiffPlan; roots keep their other properties and only get a new content_hash"""
+    for batch in _batches(plan.deletes, batch_size):
+        tx.run(DELETE_QUERY, ids=batch).consume()
+    for batch in _batches(plan.updates, batch_size):
+        tx.run(UPDATE_QUERY, rows=batch).consume()
+    for batch in _batches(plan.hashes, batch_size):
+        tx.run(ROOT_HASH_QUERY, rows=batch).consume()
+    if plan.creates:
+        subtrees = []
+        for parent_id, child in plan.creates:
+            data = child.hashed_data()
+            subtrees.append((parent_id, {child.name: data}))
+        write_subtrees(tx, subtrees, batch_size=batch_size)
+    logger.info(f"Applied graph diff: {plan.summary()}")
+    return plan.summary()
+
+
+def refresh_trees(tx, pairs, batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """Diff and apply in one transaction; returns the plan summary"""
+    plan = diff_trees(tx, pairs, batch_size)
+    if plan.is_empty():
+        return plan.summary()
+    return apply_plan(tx, plan, batch_size)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Diff a re-scraped document against the stored graph")
+    parser.add_argument("hierarchy", help="constitution or act hierarchy saved as JSON")
+    parser.add_argument("--root-label", default="Constitution")
+    parser.add_argument("--key", help="root key (defaults to the source URI or cover page title, as graph_upsert stores it)")
+    parser.add_argument("--dry-run", action="store_true", help="print the plan without writing it")
+    args = parser.parse_args()
+
+    from data_acquisition import graph_queries, neo4j_pool
+    from data_acquisition.graph_upsert import document_key
+
+    with open(args.hierarchy, encoding="utf-8") as f:
+        data = json.load(f)
+    key = args.key or document_key(data)
+
+    def run(tx):
+        record = tx.run(f"MATCH (n:{args.root_label} {{key: $key}}) RETURN elementId(n) AS id", key=key).single()
+        if record is None:
+            raise SystemExit(f"No {args.root_label} with key {key!r}; store it with --upsert first")
+        plan = diff_trees(tx, [(record["id"], data)])
+        if args.dry_run:
+            return plan.summary()
+        return apply_plan(tx, plan)
+
+    with neo4j_pool.session() as session:
+        summary = session.execute_read(run) if args.dry_run else session.execute_write(run)
+    if not args.dry_run:
+        graph_queries.invalidate(args.root_label)
+    print(json.dumps(summary, indent=2))
+    neo4j_pool.close_driver()
+
+
+if __name__ == "__main__":
+    main()
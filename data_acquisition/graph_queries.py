@@ -0,0 +1,345 @@
+"""Prepared read queries over the legal graph with a TTL/LRU result cache.
+
+GraphQueries covers the common lookups (a constitution article or act
+section by number, the children or whole subtree of a node, a case by
+neutral citation, the cases of a court or station in a year, the most
+cited cases) so callers don't hand-write Cypher. Results are cached in
+memory for QUERY_CACHE_TTL seconds, at most QUERY_CACHE_SIZE entries,
+least recently used evicted first.
+
+Each cached result is tagged with the scopes it was read from: a node
+("node:<elementId>" for children and per-station case lists), a document
+root label ("Constitution", "Legislation"), "taxonomy", "cases" or "scores".
+Children and subtrees are also tagged with the scope of the tree they sit
+in, found from the root above the node: its label for a constitution or
+act, otherwise "cases" and "taxonomy". The writers call invalidate() with
+the scopes they touched once their transaction commits, and a result whose
+scopes were invalidated while it was being read is not cached.
+
+Queries run through a runner, a callable (cypher, params) -> list of
+record dicts. The default reads through neo4j_pool; any local stand-in
+with the same signature can replace it.
+
+Lookups are counted per key, so the hottest ones can be saved with
+save_hot_keys() and replayed by warmup() when a process starts.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+
+from dotenv import load_dotenv
+
+from data_acquisition.documents import parse_date
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "10000"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "600"))
+QUERY_WARMUP_FILE = os.getenv("QUERY_WARMUP_FILE")
+
+_caches = weakref.WeakSet()
+
+
+def invalidate(*scopes):
+    """Drop cached results read from any of scopes, in every cache in the process"""
+    for cache in list(_caches):
+        cache.invalidate(*scopes)
+
+
+class QueryCache:
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_scope = {}
+        self._scope_versions = Counter()
+        self.stats = Counter()
+        _caches.add(self)
+
+    def get(self, key):
+        """(True, value) for a live entry, else (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return False, None
+            value, scopes, expires = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return True, value
+
+    def versions(self, scopes):
+        with self._lock:
+            return tuple(self._scope_versions[scope] for scope in scopes)
+
+    def put(self, key, value, scopes, versions=None):
+        """Cache value unless one of its scopes was invalidated since versions were taken"""
+        with self._lock:
+            if versions is not None and versions != tuple(self._scope_versions[scope] for scope in scopes):
+                self.stats["stale_skipped"] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, scopes, time.monotonic() + self.ttl)
+            for scope in scopes:
+                self._by_scope.setdefault(scope, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def invalidate(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._scope_versions[scope] += 1
+                for key in self._by_scope.pop(scope, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.stats["invalidated"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+
+    def _remove(self, key):
+        _, scopes, _ = self._entries.pop(key)
+        for scope in scopes:
+            keys = self._by_scope.get(scope)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_scope[scope]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def neo4j_runner(cypher, params):
+    from data_acquisition import neo4j_pool
+
+    with neo4j_pool.session() as session:
+        return session.execute_read(lambda tx: [record.data() for record in tx.run(cypher, **params)])
+
+
+# Scopes a node's tree can belong to; see tree_scopes
+TREE_SCOPES = ("Constitution", "Legislation", "cases", "taxonomy")
+
+ROOT_LABELS_QUERY = """
+MATCH (r)-[:HAS_CHILD*0..]->(n) WHERE elementId(n) = $node_id AND NOT ()-[:HAS_CHILD]->(r)
+RETURN labels(r) AS labels
+"""
+
+CHILDREN_QUERY = """
+MATCH (n)-[:HAS_CHILD]->(c) WHERE elementId(n) = $node_id
+RETURN elementId(c) AS id, properties(c) AS props
+"""
+
+SUBTREE_QUERY = """
+MATCH (n) WHERE elementId(n) = $node_id
+OPTIONAL MATCH (n)-[:HAS_CHILD*0..]->(p)-[:HAS_CHILD]->(d)
+RETURN properties(n) AS root, elementId(p) AS parent, elementId(d) AS id, properties(d) AS props
+"""
+
+# The root label is formatted in so the match starts from that label (and its key constraint)
+DOCUMENT_SECTION_QUERY = """
+MATCH {root}-[:HAS_CHILD*]->(s:Node {{name: $name}})
+RETURN elementId(s) AS id
+"""
+
+# Cases are labelled Case by graph_upsert and citations.py; both set the indexed citation
+CASE_BY_CITATION_QUERY = """
+MATCH (c:Case)-[:HAS_CHILD]->(h:Node {name: 'Header'}) WHERE c.citation IN $citations
+RETURN elementId(c) AS id, properties(h) AS header
+"""
+
+STATIONS_QUERY = """
+MATCH (co:Court {name: $court})
+OPTIONAL MATCH (s:Station)-[:PART_OF]->(co)
+WITH co, collect(s) AS stations
+UNWIND CASE WHEN size(stations) = 0 THEN [co] ELSE stations END AS s
+WITH s WHERE $station IS NULL OR s.name = $station
+RETURN elementId(s) AS id, s.name AS name
+"""
+
+STATION_CASES_QUERY = """
+MATCH (s)-[:HAS_CHILD]->(c:Node {name: 'case'})-[:HAS_CHILD]->(h:Node {name: 'Header'})
+WHERE elementId(s) = $node_id
+RETURN elementId(c) AS id, h.title AS title, h.`neutral-citation` AS citation, h.date AS date,
+       h.authority AS court
+"""
+
+MOST_CITED_QUERY = """
+MATCH (c:Case) WHERE c.pagerank IS NOT NULL
+RETURN elementId(c) AS id, c.citation AS citation, c.pagerank AS pagerank, c.cited_by AS cited_by
+ORDER BY c.pagerank DESC LIMIT $limit
+"""
+
+
+def tree_scopes(root_labels):
+    """Invalidation scopes of a tree from its root's labels"""
+    for label in ("Constitution", "Legislation"):
+        if label in root_labels:
+            return (label,)
+    return ("cases", "taxonomy")
+
+
+def document_section_query(root_label, key=None):
+    if not root_label.isidentifier():
+        raise ValueError(f"Invalid root label {root_label!r}")
+    root = f"(r:{root_label} {{key: $key}})" if key is not None else f"(r:{root_label})"
+    return DOCUMENT_SECTION_QUERY.format(root=root)
+
+
+class GraphQueries:
+    def __init__(self, runner=None, cache=None):
+        self.runner = runner or neo4j_runner
+        self.cache = cache if cache is not None else QueryCache()
+        self.lookups = Counter()
+        self._lookups_lock = threading.Lock()
+
+    def _lookup(self, method, args):
+        key = (method, args)
+        with self._lookups_lock:
+            self.lookups[key] += 1
+        return key, self.cache.get(key)
+
+    def _cached(self, method, args, scopes, load):
+        key, (found, value) = self._lookup(method, args)
+        if found:
+            return value
+        versions = self.cache.versions(scopes)
+        value = load()
+        self.cache.put(key, value, scopes, versions)
+        return value
+
+    def _cached_in_tree(self, method, node_id, load):
+        """Like _cached for a read under node_id, tagged with the node and its tree's scopes"""
+        key, (found, value) = self._lookup(method, (node_id,))
+        if found:
+            return value
+        candidates = (f"node:{node_id}",) + TREE_SCOPES
+        versions = dict(zip(candidates, self.cache.versions(candidates)))
+        records = self._run(ROOT_LABELS_QUERY, node_id=node_id)
+        value = load()
+        scopes = (f"node:{node_id}",) + tree_scopes(records[0]["labels"] if records else [])
+        self.cache.put(key, value, scopes, tuple(versions[scope] for scope in scopes))
+        return value
+
+    def _run(self, cypher, **params):
+        return self.runner(cypher, params)
+
+    # Documents
+
+    def children(self, node_id):
+        """[{id, props}] of a node's HAS_CHILD children"""
+        return self._cached_in_tree("children", node_id, lambda: self._run(CHILDREN_QUERY, node_id=node_id))
+
+    def subtree(self, node_id):
+        """A node and everything beneath it as nested dicts: its properties plus a "children" list"""
+        def load():
+            records = self._run(SUBTREE_QUERY, node_id=node_id)
+            if not records:
+                return None
+            root = dict(records[0]["root"], id=node_id, children=[])
+            nodes = {node_id: root}
+            pending = [record for record in records if record["id"] is not None]
+            # Parents precede their children in path order, but not necessarily in the result
+            while pending:
+                remaining = []
+                for record in pending:
+                    parent = nodes.get(record["parent"])
+                    if parent is None:
+                        remaining.append(record)
+                        continue
+                    node = nodes.setdefault(record["id"], dict(record["props"], id=record["id"], children=[]))
+                    parent["children"].append(node)
+                if len(remaining) == len(pending):
+                    break
+                pending = remaining
+            return root
+        return self._cached_in_tree("subtree", node_id, load)
+
+    def section(self, number, root_label="Constitution", key=None):
+        """Subtree of "Section <number>" (the constitution's articles) of a document, or None"""
+        def load():
+            records = self._run(document_section_query(root_label, key), name=f"Section {number}", key=key)
+            return records[0]["id"] if records else None
+        node_id = self._cached("section", (str(number), root_label, key), (root_label,), load)
+        return self.subtree(node_id) if node_id else None
+
+    def article(self, number):
+        """A constitution article, e.g. article(47)"""
+        return self.section(number, "Constitution")
+
+    # Cases
+
+    def case_by_citation(self, citation):
+        """{id, header} of the case with a neutral citation, as written or in canonical form"""
+        from data_acquisition.citations import normalize_citation
+
+        citations = list(dict.fromkeys(filter(None, [citation, normalize_citation(citation)])))
+        records = self._cached("case_by_citation", (citation,), ("cases",),
+                               lambda: self._run(CASE_BY_CITATION_QUERY, citations=citations))
+        return records[0] if records else None
+
+    def stations(self, court, station=None):
+        """[{id, name}] of a court's stations (the court itself when it has none)"""
+        return self._cached("stations", (court, station), ("taxonomy",),
+                            lambda: self._run(STATIONS_QUERY, court=court, station=station))
+
+    def station_cases(self, node_id):
+        """[{id, title, citation, date, court, iso_date}] of the cases under a station or court node"""
+        def load():
+            return [dict(record, iso_date=parse_date(record["date"] or ""))
+                    for record in self._run(STATION_CASES_QUERY, node_id=node_id)]
+        return self._cached("station_cases", (node_id,), (f"node:{node_id}",), load)
+
+    def cases(self, court, station=None, year=None):
+        """Cases of a court, optionally at one station and in one year, e.g. cases("Court of Appeal", "Kisumu", 2023)"""
+        results = []
+        for record in self.stations(court, station):
+            for case in self.station_cases(record["id"]):
+                if year is None or case["iso_date"][:4] == str(year):
+                    results.append(dict(case, station=record["name"]))
+        return results
+
+    def most_cited(self, limit=20):
+        return self._cached("most_cited", (limit,), ("scores",), lambda: self._run(MOST_CITED_QUERY, limit=limit))
+
+    # Warmup
+
+    def hot_keys(self, limit=100):
+        with self._lookups_lock:
+            return [[method, list(args)] for (method, args), _ in self.lookups.most_common(limit)]
+
+    def save_hot_keys(self, path=QUERY_WARMUP_FILE, limit=100):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.hot_keys(limit), f, indent=2)
+
+    def warmup(self, keys=None, path=QUERY_WARMUP_FILE):
+        """Run each [method, args] lookup once so it is cached; keys default to those saved at path"""
+        if keys is None:
+            if not path or not os.path.exists(path):
+                return 0
+            with open(path, encoding="utf-8") as f:
+                keys = json.load(f)
+        warmed = 0
+        for method, args in keys:
+            try:
+                getattr(self, method)(*args)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Warmup of {method}{tuple(args)} failed: {e}")
+        logger.info(f"Warmed {warmed} of {len(keys)} query cache keys")
+        return warmed
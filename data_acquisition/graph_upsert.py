@@ -0,0 +1,252 @@
+"""Idempotent MERGE-based ingestion backed by uniqueness constraints.
+
+With upserts enabled (GRAPH_UPSERT=1, or configure(True) from a CLI
+flag) the taxonomy and judgment writers MERGE on natural keys instead of
+CREATE-ing fresh nodes, so rerunning a crawl finds what is already there
+and writes nothing new:
+
+- Segment and Classification by name
+- Court by link, Station by link (or court link and name when the
+  station has none)
+- Case by key: its neutral citation, or its link when it has none
+- Constitution / Legislation roots by key: the source URI an act was
+  ingested from, or the document title
+- the root of a station scraped without a parent node by its listing URL
+
+ensure_schema() creates the matching uniqueness constraints, whose
+backing indexes turn every MERGE and lookup into an index seek. A case
+that already exists keeps its stored Header/Body subtree; only new cases
+get one, written in shared UNWIND batches by write_subtrees, unless
+graph_diff refreshes are enabled: then existing cases and documents are
+diffed against the stored tree and only what changed is written. New
+trees are written with graph_diff's content hashes either way.
+"""
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from data_acquisition import graph_diff
+from data_acquisition.graph_writer import GRAPH_WRITE_BATCH_SIZE, _batches, write_subtrees
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+GRAPH_UPSERT = os.getenv("GRAPH_UPSERT", "0") == "1"
+
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT segment_name IF NOT EXISTS FOR (n:Segment) REQUIRE n.name IS UNIQUE",
+    "CREATE CONSTRAINT classification_name IF NOT EXISTS FOR (n:Classification) REQUIRE n.name IS UNIQUE",
+    "CREATE CONSTRAINT court_link IF NOT EXISTS FOR (n:Court) REQUIRE n.link IS UNIQUE",
+    "CREATE CONSTRAINT station_link IF NOT EXISTS FOR (n:Station) REQUIRE n.link IS UNIQUE",
+    "CREATE CONSTRAINT case_key IF NOT EXISTS FOR (n:Case) REQUIRE n.key IS UNIQUE",
+    "CREATE CONSTRAINT constitution_key IF NOT EXISTS FOR (n:Constitution) REQUIRE n.key IS UNIQUE",
+    "CREATE CONSTRAINT legislation_key IF NOT EXISTS FOR (n:Legislation) REQUIRE n.key IS UNIQUE",
+    "CREATE INDEX court_name IF NOT EXISTS FOR (n:Court) ON (n.name)",
+    "CREATE INDEX case_citation IF NOT EXISTS FOR (n:Case) ON (n.citation)",
+    "CREATE INDEX case_link IF NOT EXISTS FOR (n:Case) ON (n.link)",
+]
+
+_enabled = GRAPH_UPSERT
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def configure(enabled):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def ensure_schema():
+    """Create the constraints and indexes the MERGE keys rely on (once per process)"""
+    global _schema_ready
+    from data_acquisition import neo4j_pool
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with neo4j_pool.session() as session:
+            for statement in SCHEMA_STATEMENTS:
+                session.run(statement).consume()
+        _schema_ready = True
+    logger.info(f"Graph schema ready: {len(SCHEMA_STATEMENTS)} constraints and indexes")
+
+
+# Taxonomy
+
+def upsert_segment(session, name):
+    query = "MERGE (s:Segment {name: $name}) RETURN elementId(s) AS node_id"
+    return session.run(query, name=name).single()["node_id"]
+
+
+def upsert_classification(session, segment_id, name):
+    query = """
+    MATCH (S:Segment) WHERE elementId(S) = $segment_id
+    MERGE (c:Classification {name: $name})
+    MERGE (c)-[:BELONGS_TO]->(S)
+    RETURN elementId(c) AS node_id
+    """
+    return session.run(query, segment_id=segment_id, name=name).single()["node_id"]
+
+
+def station_key(court, station):
+    return station.get("link") or f"{court.get('link', '')}#{station['name']}"
+
+
+def upsert_courts(session, classification_id, courts, batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """MERGE a classification's courts and their stations; returns [court name, station name, node id] rows
+
+    Courts without stations are returned as their own station, as insert_taxonomy does.
+    """
+    court_query = """
+    MATCH (cl:Classification) WHERE elementId(cl) = $classification_id
+    UNWIND $rows AS row
+    MERGE (co:Court {link: row.link})
+    ON CREATE SET co.name = row.name
+    MERGE (co)-[:BELONGS_TO]->(cl)
+    RETURN row.link AS link, elementId(co) AS node_id
+    """
+    station_query = """
+    UNWIND $rows AS row
+    MATCH (co:Court) WHERE elementId(co) = row.court_id
+    MERGE (s:Station {link: row.key})
+    ON CREATE SET s.name = row.name
+    MERGE (s)-[:PART_OF]->(co)
+    RETURN row.court AS court, row.name AS name, elementId(s) AS node_id
+    """
+    court_ids = {}
+    court_rows = [{"link": court.get("link") or court["name"], "name": court["name"]} for court in courts]
+    for batch in _batches(court_rows, batch_size):
+        for record in session.run(court_query, classification_id=classification_id, rows=batch):
+            court_ids[record["link"]] = record["node_id"]
+
+    parent_ids = []
+    station_rows = []
+    for court in courts:
+        court_id = court_ids[court.get("link") or court["name"]]
+        stations = court.get("stations") or []
+        if not stations:
+            parent_ids.append([court["name"], court["name"], court_id])
+        for station in stations:
+            station_rows.append({"court_id": court_id, "court": court["name"], "name": station["name"],
+                                 "key": station_key(court, station)})
+    for batch in _batches(station_rows, batch_size):
+        for record in session.run(station_query, rows=batch):
+            parent_ids.append([record["court"], record["name"], record["node_id"]])
+    return parent_ids
+
+
+# Cases
+
+def case_key(link, case):
+    return (case.get("Header") or {}).get("neutral-citation") or link
+
+
+def upsert_cases(tx, parent_id, cases, batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """MERGE (link, case) pairs as Case nodes under parent_id, writing subtrees for new cases only.
+
+    With graph_diff refreshes enabled, existing cases are diffed against
+    their stored subtree instead of being left as they are. Returns the
+    number of cases that were new.
+    """
+    query = """
+    MATCH (p) WHERE elementId(p) = $parent_id
+    UNWIND $rows AS row
+    MERGE (c:Node:Case {key: row.key})
+    ON CREATE SET c.name = 'case', c.link = row.link, c.citation = row.citation, c.pending = true
+    MERGE (p)-[:HAS_CHILD]->(c)
+    WITH row, c, coalesce(c.pending, false) AS created
+    REMOVE c.pending
+    RETURN row.key AS key, elementId(c) AS node_id, created
+    """
+    rows = []
+    by_key = {}
+    for link, case in cases:
+        key = case_key(link, case)
+        if key in by_key:
+            continue
+        by_key[key] = case
+        rows.append({"key": key, "link": link, "citation": (case.get("Header") or {}).get("neutral-citation", "")})
+    new = []
+    existing = []
+    for batch in _batches(rows, batch_size):
+        for record in tx.run(query, parent_id=parent_id, rows=batch):
+            if record["created"]:
+                new.append((record["node_id"], by_key[record["key"]]))
+            else:
+                existing.append((record["node_id"], by_key[record["key"]]))
+    if new:
+        _write_hashed(tx, new, batch_size)
+    if existing and graph_diff.is_enabled():
+        graph_diff.refresh_trees(tx, existing, batch_size)
+    logger.info(f"Upserted {len(rows)} cases, {len(new)} new")
+    return len(new)
+
+
+def _write_hashed(tx, subtrees, batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """Write new trees under their roots with content hashes, and the hash of each whole tree on its root"""
+    hashed = []
+    rows = []
+    for node_id, data in subtrees:
+        content_hash, data = graph_diff.with_hashes(data)
+        hashed.append((node_id, data))
+        rows.append({"id": node_id, "content_hash": content_hash})
+    write_subtrees(tx, hashed, batch_size=batch_size)
+    for batch in _batches(rows, batch_size):
+        tx.run(graph_diff.ROOT_HASH_QUERY, rows=batch).consume()
+
+
+def insert_cases(parent_id, cases):
+    from data_acquisition import neo4j_pool
+
+    with neo4j_pool.session() as session:
+        return session.execute_write(upsert_cases, parent_id, cases)
+
+
+# Documents
+
+def document_key(data):
+    """An act's source URI when it has one, else its cover page title.
+
+    Titles are not unique across acts (or across expressions of one act),
+    so legislation is keyed on the AKN work URI it was ingested from.
+    """
+    return data.get("source") or (data.get("cover page") or {}).get("title") or ""
+
+
+def upsert_root(tx, key, root_label="Constitution"):
+    """MERGE a root node on key; returns the record's node_id and whether it was created"""
+    return tx.run(
+        f"MERGE (n:{root_label} {{key: $key}}) ON CREATE SET n.pending = true "
+        "WITH n, coalesce(n.pending, false) AS created REMOVE n.pending "
+        "RETURN elementId(n) AS node_id, created",
+        key=key,
+    ).single()
+
+
+def insert_root(key, root_label="Constitution"):
+    """The elementId of the root keyed on key, as insert_hierarchy's root but found again on a rerun"""
+    from data_acquisition import neo4j_pool
+
+    with neo4j_pool.session() as session:
+        return session.execute_write(upsert_root, key, root_label)["node_id"]
+
+
+def upsert_tree(tx, data, root_label="Constitution", key=None):
+    """MERGE a document root on key and write its tree only if the root is new; returns the root's elementId"""
+    key = key or document_key(data)
+    if not key:
+        raise ValueError("a document upsert needs a key, a source or a cover page title")
+    record = upsert_root(tx, key, root_label)
+    if record["created"]:
+        _write_hashed(tx, [(record["node_id"], data)])
+    elif graph_diff.is_enabled():
+        graph_diff.refresh_trees(tx, [(record["node_id"], data)])
+    else:
+        logger.info(f"{root_label} {key!r} already stored")
+    return record["node_id"]
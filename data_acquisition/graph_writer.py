@@ -0,0 +1,166 @@
+"""Batched Neo4j writer for the nested dict trees produced by the scrapers.
+
+The tree is flattened client-side into a list of nodes carrying temporary
+IDs and their parent's temporary ID. Nodes are then created level by level
+with one ``UNWIND $rows`` statement per batch, each statement also creating
+the HAS_CHILD edge from the already-written parent. The resulting graph is
+the same as the one the old per-node create_nodes_recursively produced,
+except that a child node's lists of primitives are stored once; the old
+writer set them as properties and then appended them again.
+"""
+import logging
+import os
+from collections import deque
+
+from dotenv import load_dotenv
+
+from data_acquisition.metrics import inc, timed
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+GRAPH_WRITE_BATCH_SIZE = int(os.getenv("GRAPH_WRITE_BATCH_SIZE", "1000"))
+
+# Temporary ID of the tree's root (a new root node, or the given parent)
+ROOT = 0
+
+
+def _is_primitive(value):
+    return isinstance(value, (str, int, float, bool))
+
+
+def node_props(data):
+    """Properties stored on a tree node: scalars and the primitive items of lists"""
+    props = {}
+    for key, value in data.items():
+        if _is_primitive(value):
+            props[key] = value
+        elif isinstance(value, list):
+            items = [item for item in value if _is_primitive(item)]
+            if items or not value:
+                props[key] = items
+    return props
+
+
+def flatten_tree(data, node_label="Node"):
+    """Flatten a nested dict into a breadth-first list of nodes.
+
+    Every dict value, and every dict inside a list value, becomes a child
+    node named after its key. Each node is a dict with keys tmp, parent,
+    depth, label and props; parent refers to another node's tmp or ROOT.
+    """
+    nodes = []
+    queue = deque([(ROOT, data, 0)])
+    next_id = ROOT + 1
+    while queue:
+        parent, value, depth = queue.popleft()
+        for key, child in value.items():
+            children = [child] if isinstance(child, dict) else child if isinstance(child, list) else []
+            for item in children:
+                if not isinstance(item, dict):
+                    continue
+                props = {"name": key}
+                props.update(node_props(item))
+                nodes.append({
+                    "tmp": next_id,
+                    "parent": parent,
+                    "depth": depth + 1,
+                    "label": node_label,
+                    "props": props,
+                })
+                queue.append((next_id, item, depth + 1))
+                next_id += 1
+    return nodes
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def _update_existing_node(tx, node_id, data):
+    """Set scalars and append list items on a node that already exists"""
+    props = node_props(data)
+    scalars = {key: value for key, value in props.items() if not isinstance(value, list)}
+    if scalars:
+        tx.run("MATCH (n) WHERE elementId(n) = $node_id SET n += $props", node_id=node_id, props=scalars)
+    for key, items in props.items():
+        if isinstance(items, list) and items:
+            tx.run(
+                "MATCH (n) WHERE elementId(n) = $node_id "
+                "SET n[$key] = coalesce(n[$key], []) + $items",
+                node_id=node_id, key=key, items=items
+            )
+
+
+def _write_nodes(tx, nodes, element_ids, batch_size):
+    """Create flattened nodes level by level; element_ids maps the roots' tmp ids to existing nodes"""
+    levels = {}
+    for node in nodes:
+        levels.setdefault((node["depth"], node["label"]), []).append(node)
+
+    for (depth, label), level in sorted(levels.items()):
+        query = (
+            "UNWIND $rows AS row "
+            "MATCH (p) WHERE elementId(p) = row.parent "
+            f"CREATE (p)-[:HAS_CHILD]->(n:{label}) "
+            "SET n = row.props "
+            "RETURN row.tmp AS tmp, elementId(n) AS node_id"
+        )
+        for batch in _batches(level, batch_size):
+            rows = [
+                {"tmp": node["tmp"], "parent": element_ids[node["parent"]], "props": node["props"]}
+                for node in batch
+            ]
+            for record in tx.run(query, rows=rows):
+                element_ids[record["tmp"]] = record["node_id"]
+
+    inc("graph_nodes_written_total", len(nodes))
+    inc("graph_edges_written_total", len(nodes))
+
+
+@timed("graph_write")
+def write_subtrees(tx, subtrees, node_label="Node", batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """Attach several trees beneath existing nodes in shared batches.
+
+    subtrees is a list of (parent elementId, data); each data's children
+    are created under its parent as write_tree would, but the statements
+    for all trees are batched together.
+    """
+    nodes = []
+    element_ids = {}
+    for number, (parent_id, data) in enumerate(subtrees):
+        root = ("root", number)
+        element_ids[root] = parent_id
+        offset = len(nodes)
+        for node in flatten_tree(data, node_label=node_label):
+            node["tmp"] += offset
+            node["parent"] = root if node["parent"] == ROOT else node["parent"] + offset
+            nodes.append(node)
+    _write_nodes(tx, nodes, element_ids, batch_size)
+    logger.info(f"Wrote {len(nodes)} nodes and {len(nodes)} HAS_CHILD edges under {len(subtrees)} parents")
+    return len(nodes)
+
+
+@timed("graph_write")
+def write_tree(tx, data, parent_id=None, node_label="Node", root_label="Constitution",
+               batch_size=GRAPH_WRITE_BATCH_SIZE):
+    """Write a nested dict tree in batched UNWIND statements and return the root's elementId.
+
+    Without parent_id a new root node labelled root_label is created from the
+    tree's top-level properties; otherwise those properties are merged onto
+    the existing parent and the tree is attached beneath it.
+    """
+    if parent_id is None:
+        result = tx.run(
+            f"CREATE (n:{root_label}) SET n += $props RETURN elementId(n) AS node_id",
+            props=node_props(data)
+        )
+        parent_id = result.single()["node_id"]
+    else:
+        _update_existing_node(tx, parent_id, data)
+
+    nodes = flatten_tree(data, node_label=node_label)
+    _write_nodes(tx, nodes, {ROOT: parent_id}, batch_size)
+    logger.info(f"Wrote {len(nodes)} nodes and {len(nodes)} HAS_CHILD edges")
+    return parent_id
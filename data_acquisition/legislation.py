@@ -0,0 +1,159 @@
+"""Bulk ingestion of Acts and statutory instruments in Akoma Ntoso markup.
+
+Generalises the constitution scraper to any number of documents: each
+source (an AKN work URI such as ``/akn/ke/act/2012/18`` or the path of a
+saved HTML page) is fetched and parsed on a process pool, so parsing scales
+with CPU cores. Parsed hierarchies are stored from the parent process
+through insert_hierarchy, one document at a time as they complete, and
+every document's fetch/parse timings and failures are reported.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+from dotenv import load_dotenv
+
+from data_acquisition.akn_parser import parse_act
+from data_acquisition.fetcher import fetch_page, parse_html
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BASE_URL = os.getenv("BASE_URL")
+LEGISLATION_WORKERS = int(os.getenv("LEGISLATION_WORKERS", str(os.cpu_count() or 1)))
+LEGISLATION_ROOT_LABEL = "Legislation"
+
+
+def _is_local(source):
+    return os.path.exists(source)
+
+
+def parse_document(source):
+    """Fetch (or read) and parse one document; runs in a worker process.
+
+    Always returns a result dict so one bad document can't stop the batch.
+    """
+    result = {"source": source, "hierarchy": None, "error": None, "fetch_ms": 0.0, "parse_ms": 0.0}
+    try:
+        started = time.perf_counter()
+        if _is_local(source):
+            with open(source, encoding="utf-8") as f:
+                html = f.read()
+            url = None
+        else:
+            url = urljoin(BASE_URL, source)
+            status, html = fetch_page(url)
+            if status != 200:
+                raise ValueError(f"HTTP {status} for {url}")
+        fetched = time.perf_counter()
+        hierarchy = parse_act(parse_html(html, base_url=url))
+        hierarchy["source"] = source
+        result["hierarchy"] = hierarchy
+        result["fetch_ms"] = (fetched - started) * 1000
+        result["parse_ms"] = (time.perf_counter() - fetched) * 1000
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def ingest_corpus(sources, store=None, workers=LEGISLATION_WORKERS):
+    """Parse sources on a process pool and pass each hierarchy to store as it completes.
+
+    store defaults to insert_hierarchy with a Legislation root. Returns a
+    report with per-document timings and failures.
+    """
+    if store is None:
+        from data_acquisition.constitution import insert_hierarchy
+
+        def store(hierarchy):
+            # Titles repeat across acts and expressions; the AKN URI doesn't
+            insert_hierarchy(hierarchy, root_label=LEGISLATION_ROOT_LABEL, key=hierarchy["source"])
+
+    started = time.perf_counter()
+    documents = []
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(parse_document, source) for source in sources]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            entry = {key: result[key] for key in ("source", "fetch_ms", "parse_ms", "error")}
+            if result["error"] is None:
+                store_started = time.perf_counter()
+                try:
+                    store(result["hierarchy"])
+                except Exception as e:
+                    entry["error"] = f"store failed: {type(e).__name__}: {e}"
+                entry["store_ms"] = (time.perf_counter() - store_started) * 1000
+            if entry["error"]:
+                failures.append(entry)
+                logger.error(f"[{done}/{len(futures)}] {entry['source']}: {entry['error']}")
+            else:
+                logger.info(f"[{done}/{len(futures)}] {entry['source']}: fetch {entry['fetch_ms']:.0f} ms, "
+                            f"parse {entry['parse_ms']:.0f} ms, store {entry['store_ms']:.0f} ms")
+            documents.append(entry)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "documents": len(documents),
+        "succeeded": len(documents) - len(failures),
+        "failed": len(failures),
+        "workers": workers,
+        "elapsed_s": elapsed,
+        "documents_per_s": len(documents) / elapsed if elapsed else 0.0,
+        "failures": failures,
+        "timings": documents,
+    }
+    logger.info(f"Ingested {report['succeeded']}/{report['documents']} documents in {elapsed:.1f}s "
+                f"({report['documents_per_s']:.1f} docs/s, {workers} workers)")
+    return report
+
+
+def read_sources(path):
+    """One AKN work URI or file path per line; blank lines and # comments are skipped"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Ingest Acts and statutory instruments in Akoma Ntoso markup")
+    parser.add_argument("sources", nargs="*", help="AKN work URIs or saved HTML files")
+    parser.add_argument("--list", help="file with one source per line")
+    parser.add_argument("--workers", type=int, default=LEGISLATION_WORKERS)
+    parser.add_argument("--output-dir", help="write each hierarchy as JSON here instead of storing it in Neo4j")
+    parser.add_argument("--report", help="write the timing/failure report as JSON")
+    parser.add_argument("--upsert", action="store_true", help="MERGE acts on their source URI so reruns skip stored acts")
+    parser.add_argument("--refresh", action="store_true",
+                        help="with --upsert, diff stored acts against the fetched ones and write only the changes")
+    args = parser.parse_args()
+    if args.upsert and not args.output_dir:
+        from data_acquisition import graph_diff, graph_upsert
+        graph_upsert.configure(True)
+        graph_upsert.ensure_schema()
+        graph_diff.configure(args.refresh)
+
+    sources = list(args.sources)
+    if args.list:
+        sources += read_sources(args.list)
+
+    store = None
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+        def store(hierarchy):
+            name = hierarchy["source"].strip("/").replace("/", "_") or "document"
+            with open(os.path.join(args.output_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(hierarchy, f, indent=2, ensure_ascii=False)
+
+    report = ingest_corpus(sources, store=store, workers=args.workers)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Process-wide metrics for the scrapers and ingestion pipeline.
+
+Stages are timed with ``timed("stage")`` (a context manager or decorator),
+which records a latency histogram and counts the exceptions that escape
+it. Counters and gauges cover the rest: HTTP statuses and cache outcomes,
+nodes and edges written, cases stored, pipeline queue depth and swallowed
+errors. Everything lives in one registry and is rendered in the
+Prometheus text exposition format, either served over HTTP on
+METRICS_PORT or rewritten to METRICS_FILE every METRICS_INTERVAL seconds
+(for node_exporter's textfile collector or a plain look at a run).
+
+profile_run() wraps a whole run in cProfile when METRICS_PROFILE names an
+output file. cProfile only sees the thread that starts it, so profile a
+run with one worker to see inside the station crawls.
+"""
+import bisect
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+METRICS_PROFILE = os.getenv("METRICS_PROFILE")
+METRICS_PREFIX = "kenya_law_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "stage_seconds": "Time spent in each pipeline stage",
+    "stage_errors_total": "Exceptions raised or handled in each pipeline stage",
+    "fetch_responses_total": "HTTP responses by status code",
+    "fetch_cache_total": "Page cache outcomes",
+    "graph_nodes_written_total": "Nodes created in Neo4j",
+    "graph_edges_written_total": "Relationships created in Neo4j",
+    "cases_stored_total": "Judgments handed to the graph writer",
+    "browser_fallbacks_total": "Pages that had to be loaded in the browser",
+    "browser_pages_total": "Page loads in the managed browser",
+    "pipeline_queue_depth": "Items waiting between the scraper and the graph writer",
+    "pipeline_items_total": "Items passed through the scraper/writer pipeline",
+    "active_stations": "Stations being crawled",
+    "throttle_limit": "Adaptive concurrency limit per host",
+    "throttle_backoffs_total": "Multiplicative decreases of a host's concurrency limit",
+    "throttle_retries_total": "Fetches retried after a failure or throttled response",
+    "circuit_state": "Per-host circuit breaker state (0 closed, 1 half-open, 2 open)",
+    "circuit_opened_total": "Times a host's circuit breaker opened",
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{name}="{str(value)}"'.replace("\n", " ") for name, value in pairs)
+    return "{" + inner + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value, buckets):
+        self.counts[bisect.bisect_left(buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def add_gauge(self, name, amount, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value, self.buckets)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def render(self):
+        """The registry in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({name for name, _ in metrics}):
+                    lines += _header(name, kind)
+                    for (metric, key), value in sorted(metrics.items()):
+                        if metric == name:
+                            lines.append(f"{METRICS_PREFIX}{name}{_format_labels(key)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines += _header(name, "histogram")
+                for (metric, key), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{METRICS_PREFIX}{name}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{METRICS_PREFIX}{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Per-stage call counts and times, and write rates since the registry was created"""
+        elapsed = max(time.time() - self.started, 1e-9)
+        with self._lock:
+            stages = {
+                dict(key).get("stage"): {"calls": h.count, "seconds": round(h.sum, 3),
+                                         "mean_ms": round(1000 * h.sum / h.count, 2) if h.count else 0.0}
+                for (name, key), h in self._histograms.items() if name == "stage_seconds"
+            }
+            counters = {name: 0 for name, _ in self._counters}
+            for (name, _), value in self._counters.items():
+                counters[name] += value
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "stages": stages,
+            "nodes_per_s": round(counters.get("graph_nodes_written_total", 0) / elapsed, 1),
+            "edges_per_s": round(counters.get("graph_edges_written_total", 0) / elapsed, 1),
+            "cases_per_s": round(counters.get("cases_stored_total", 0) / elapsed, 2),
+            "errors": counters.get("stage_errors_total", 0),
+        }
+
+
+def _header(name, kind):
+    lines = []
+    if name in HELP:
+        lines.append(f"# HELP {METRICS_PREFIX}{name} {HELP[name]}")
+    lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+    return lines
+
+
+REGISTRY = Registry()
+
+
+def inc(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, **labels)
+
+
+def set_gauge(name, value, **labels):
+    REGISTRY.set_gauge(name, value, **labels)
+
+
+def add_gauge(name, amount, **labels):
+    REGISTRY.add_gauge(name, amount, **labels)
+
+
+def record_error(stage):
+    """Count an error a stage handled itself instead of raising"""
+    REGISTRY.inc("stage_errors_total", stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    """Time a block or function as stage, counting exceptions that escape it"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record_error(stage)
+        raise
+    finally:
+        REGISTRY.observe("stage_seconds", time.perf_counter() - start, stage=stage)
+
+
+# Exposition
+
+def write_metrics(path=METRICS_FILE, registry=REGISTRY):
+    """Atomically rewrite path with the current metrics"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter:
+    """Serves /metrics on port and/or rewrites a metrics file every interval seconds until stopped"""
+
+    def __init__(self, port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+        self._threads = []
+        if port:
+            self.server = ThreadingHTTPServer(("", port), _MetricsHandler)
+            self._threads.append(threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True))
+            logger.info(f"Serving metrics on http://localhost:{self.server.server_address[1]}/metrics")
+        if path:
+            self._threads.append(threading.Thread(target=self._write_loop, name="metrics-file", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                write_metrics(self.path)
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {self.path}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.path:
+            write_metrics(self.path)
+        logger.info(f"Run metrics: {REGISTRY.summary()}")
+
+
+@contextmanager
+def profile_run(path=METRICS_PROFILE, top=25):
+    """Run the block under cProfile, saving the stats to path and logging the top functions"""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+        logger.info(f"Profile saved to {path}\n{report.getvalue()}")
@@ -0,0 +1,104 @@
+"""Process-wide Neo4j driver shared by every read and write path.
+
+The driver is created lazily on first use and keeps its own pool of bolt
+connections, so stations, constitution writes and queries reuse already
+authenticated connections instead of opening a new driver each time.
+"""
+import atexit
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+NEO4J_URI = os.getenv("NEO4J_URI")
+NEO4J_USER = os.getenv("NEO4J_USER")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "60"))
+# Idle connections older than this are pinged before being handed out
+NEO4J_LIVENESS_CHECK_TIMEOUT = float(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", "30"))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+
+_driver = None
+_lock = threading.Lock()
+_stats = {"active_sessions": 0, "peak_sessions": 0, "sessions_opened": 0}
+
+
+def get_driver():
+    """Return the shared driver, creating and verifying it on first use"""
+    global _driver
+    if _driver is None:
+        with _lock:
+            if _driver is None:
+                driver = GraphDatabase.driver(
+                    NEO4J_URI,
+                    auth=(NEO4J_USER, NEO4J_PASSWORD),
+                    max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+                    connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+                    liveness_check_timeout=NEO4J_LIVENESS_CHECK_TIMEOUT,
+                    max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME,
+                )
+                driver.verify_connectivity()
+                logger.info(f"Connected to Neo4j at {NEO4J_URI} (pool size {NEO4J_MAX_POOL_SIZE})")
+                _driver = driver
+    return _driver
+
+
+@contextmanager
+def session(**kwargs):
+    """Open a session on the shared driver, counting open sessions"""
+    with _lock:
+        _stats["active_sessions"] += 1
+        _stats["sessions_opened"] += 1
+        _stats["peak_sessions"] = max(_stats["peak_sessions"], _stats["active_sessions"])
+    try:
+        with get_driver().session(**kwargs) as neo4j_session:
+            yield neo4j_session
+    finally:
+        with _lock:
+            _stats["active_sessions"] -= 1
+
+
+def health_check():
+    """True if the database is reachable through the shared driver"""
+    try:
+        get_driver().verify_connectivity()
+        return True
+    except Exception as e:
+        logger.error(f"Neo4j health check failed: {e}")
+        return False
+
+
+def pool_stats():
+    """Open session counts against the configured pool size, for sizing parallel ingestion.
+
+    These count sessions opened through session(), not the driver's bolt
+    connections: a session holds at most one connection at a time, so the
+    session figures are an upper bound on how much of the pool is in use.
+    """
+    with _lock:
+        stats = dict(_stats)
+    stats["max_pool_size"] = NEO4J_MAX_POOL_SIZE
+    stats["session_utilisation"] = stats["active_sessions"] / NEO4J_MAX_POOL_SIZE
+    stats["peak_session_utilisation"] = stats["peak_sessions"] / NEO4J_MAX_POOL_SIZE
+    return stats
+
+
+def close_driver():
+    """Close the shared driver and all pooled connections"""
+    global _driver
+    with _lock:
+        driver, _driver = _driver, None
+    if driver is not None:
+        driver.close()
+        logger.info(f"Closed Neo4j driver; pool stats: {pool_stats()}")
+
+
+# Registered once: close_driver() closes whichever driver is current at exit
+atexit.register(close_driver)
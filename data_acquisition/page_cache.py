@@ -0,0 +1,234 @@
+"""Persistent on-disk cache of fetched HTML pages.
+
+Pages are stored gzip-compressed under the SHA-256 of their content, so
+identical pages fetched from different URLs share one file. A small SQLite
+index maps each URL to its content hash, HTTP status, validators (ETag and
+Last-Modified) and access times. When the stored bytes exceed the size
+limit, the least recently used URLs are dropped and unreferenced blobs
+deleted.
+
+In offline mode the fetch layer serves only what is cached, so parsers can
+be re-run over the whole corpus without touching the network.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR")
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+# Entries younger than this are served without revalidation
+PAGE_CACHE_MAX_AGE = float(os.getenv("PAGE_CACHE_MAX_AGE", "0"))
+PAGE_CACHE_OFFLINE = os.getenv("PAGE_CACHE_OFFLINE", "0") == "1"
+EVICT_BATCH = 64
+
+
+class OfflineCacheMiss(LookupError):
+    """Raised in offline mode when a URL has never been cached"""
+
+
+class CachedPage:
+    def __init__(self, url, status, text, content_hash, etag, last_modified, fetched_at):
+        self.url = url
+        self.status = status
+        self.text = text
+        self.content_hash = content_hash
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, max_age):
+        return max_age > 0 and time.time() - self.fetched_at < max_age
+
+
+class PageCache:
+    """Content-addressed, size-bounded LRU cache of raw HTML keyed by URL"""
+
+    def __init__(self, directory, max_bytes=PAGE_CACHE_MAX_BYTES, max_age=PAGE_CACHE_MAX_AGE,
+                 offline=PAGE_CACHE_OFFLINE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.offline = offline
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " status INTEGER NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " size INTEGER NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_hash ON pages (content_hash)")
+        self._db.commit()
+        # Bytes of distinct referenced blobs, kept up to date by put, delete and evict
+        self._total = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)"
+        ).fetchone()[0]
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.directory, "blobs", content_hash[:2], content_hash + ".html.gz")
+
+    def get(self, url):
+        """Return the CachedPage for url, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, content_hash, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        status, content_hash, etag, last_modified, fetched_at = row
+        try:
+            with gzip.open(self._blob_path(content_hash), "rt", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            logger.warning(f"Cache blob missing for {url}, dropping entry")
+            self.delete(url)
+            return None
+        return CachedPage(url, status, text, content_hash, etag, last_modified, fetched_at)
+
+    def put(self, url, status, text, etag=None, last_modified=None):
+        """Store a fetched page and evict old entries if over the size limit"""
+        data = text.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        compressed = gzip.compress(data)
+        path = self._blob_path(content_hash)
+        now = time.time()
+        # The blob and its row are written under one lock, so an eviction
+        # can't remove a blob between its write and the row pointing to it
+        with self._lock:
+            stored = self._db.execute(
+                "SELECT size FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone()
+            if stored is None or not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+            if stored is None:
+                size = len(compressed)
+                self._total += size
+            else:
+                size = stored[0]
+            previous = self._db.execute("SELECT content_hash, size FROM pages WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, status, content_hash, etag, last_modified, size, fetched_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, status, content_hash, etag, last_modified, size, now, now)
+            )
+            if previous and previous[0] != content_hash:
+                self._delete_blob_if_unreferenced(*previous)
+            self._db.commit()
+            over = self._total > self.max_bytes
+        if over:
+            self.evict()
+        return content_hash
+
+    def touch(self, url):
+        """Mark a cached page as revalidated (HTTP 304)"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self._db.commit()
+
+    def delete(self, url):
+        with self._lock:
+            row = self._db.execute("SELECT content_hash, size FROM pages WHERE url = ?", (url,)).fetchone()
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            if row:
+                self._delete_blob_if_unreferenced(*row)
+            self._db.commit()
+
+    def _delete_blob_if_unreferenced(self, content_hash, size):
+        """Remove a blob no row points to any more; called with the lock held"""
+        referenced = self._db.execute(
+            "SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+        if referenced:
+            return False
+        try:
+            os.remove(self._blob_path(content_hash))
+        except FileNotFoundError:
+            pass
+        self._total -= size
+        return True
+
+    def total_bytes(self):
+        """Bytes used by distinct blobs on disk"""
+        with self._lock:
+            return self._total
+
+    def evict(self):
+        """Drop least recently used URLs until the cache fits in max_bytes"""
+        evicted = 0
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return 0
+            while self._total > self.max_bytes:
+                # Oldest first, a few at a time: a full cache evicts about one page per put
+                rows = self._db.execute(
+                    "SELECT url, content_hash, size FROM pages ORDER BY accessed_at LIMIT ?", (EVICT_BATCH,)
+                ).fetchall()
+                if not rows:
+                    break
+                for url, content_hash, size in rows:
+                    if self._total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                    self._delete_blob_if_unreferenced(content_hash, size)
+                    evicted += 1
+            self._db.commit()
+            total = self._total
+        logger.info(f"Evicted {evicted} pages from cache, {total} bytes remain")
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            pages, blobs = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT content_hash) FROM pages").fetchone()
+        return {"pages": pages, "blobs": blobs, "bytes": self.total_bytes(), "max_bytes": self.max_bytes}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, or None if PAGE_CACHE_DIR is not set"""
+    global _cache
+    if _cache is None and PAGE_CACHE_DIR:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PageCache(PAGE_CACHE_DIR)
+    return _cache
+
+
+def configure_cache(directory, max_bytes=PAGE_CACHE_MAX_BYTES, max_age=PAGE_CACHE_MAX_AGE, offline=PAGE_CACHE_OFFLINE):
+    """Use a page cache at directory for all fetches in this process (None disables it)"""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = PageCache(directory, max_bytes=max_bytes, max_age=max_age, offline=offline) if directory else None
+    return _cache
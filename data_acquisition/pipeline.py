@@ -0,0 +1,116 @@
+"""Producer/consumer plumbing between the scrapers and the graph writer.
+
+A producer iterable (typically a scraper generator) runs on its own thread
+and feeds a bounded queue; the calling thread drains the queue in
+fixed-size batches and hands each batch to a writer. When the writer falls
+behind, the queue fills and the producer blocks, so memory use is bounded
+by the queue size plus one batch no matter how many items flow through.
+A partial batch is written once its oldest item has waited
+PIPELINE_FLUSH_INTERVAL seconds, so a slow producer doesn't hold finished
+items back.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from data_acquisition.metrics import add_gauge, inc, record_error
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "50"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "200"))
+PIPELINE_FLUSH_INTERVAL = float(os.getenv("PIPELINE_FLUSH_INTERVAL", "10"))
+
+_DONE = object()
+
+
+class _ProducerFailed:
+    def __init__(self, error):
+        self.error = error
+
+
+def run_pipeline(items, write_batch, batch_size=PIPELINE_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE,
+                 flush_interval=PIPELINE_FLUSH_INTERVAL):
+    """Stream items from a producer iterable into write_batch in batches of batch_size.
+
+    Returns the number of items written. An exception raised by the
+    producer is re-raised here once the batches before it are written.
+    When the writer fails, the producer stops after its current item and
+    this waits for it, so resources the producer uses (such as a browser)
+    can be released safely afterwards.
+    """
+    buffer = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(value):
+        """Queue value unless the consumer has stopped; False once it has"""
+        while not stop.is_set():
+            try:
+                buffer.put(value, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+                add_gauge("pipeline_queue_depth", 1)
+            put(_DONE)
+        except BaseException as e:
+            put(_ProducerFailed(e))
+
+    producer = threading.Thread(target=produce, name="pipeline-producer", daemon=True)
+    producer.start()
+
+    written = 0
+    batch = []
+    deadline = None
+    try:
+        while True:
+            try:
+                item = buffer.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                # The oldest item in the batch has waited flush_interval
+                write_batch(batch)
+                written += len(batch)
+                batch = []
+                deadline = None
+                continue
+            if item is _DONE:
+                break
+            if isinstance(item, _ProducerFailed):
+                record_error("pipeline_producer")
+                if batch:
+                    write_batch(batch)
+                    written += len(batch)
+                    batch = []
+                raise item.error
+            add_gauge("pipeline_queue_depth", -1)
+            inc("pipeline_items_total")
+            batch.append(item)
+            if deadline is None and flush_interval:
+                deadline = time.monotonic() + flush_interval
+            if len(batch) >= batch_size:
+                write_batch(batch)
+                written += len(batch)
+                batch = []
+                deadline = None
+        if batch:
+            write_batch(batch)
+            written += len(batch)
+    finally:
+        # Unblock the producer if the writer failed, and let it finish its current item
+        stop.set()
+        producer.join(timeout=5)
+        if producer.is_alive():
+            logger.info("Waiting for the pipeline producer to finish its current item")
+            producer.join()
+    return written
@@ -0,0 +1,554 @@
+"""On-disk BM25 full-text index over judgment paragraphs and legislation sections.
+
+The index is a directory of immutable segments plus a manifest. Each
+segment holds:
+
+- ``lexicon.json.gz``: term -> [df, postings offset, postings length,
+  positions offset, positions length]
+- ``postings.bin``: per term, varint doc-id deltas followed by varint term
+  frequencies
+- ``positions.bin``: per term and document, varint position deltas, read
+  only for phrase queries
+- ``docs.npz``: per-document length, court/station codes and date ordinal,
+  used for BM25 length normalisation and filters
+- ``store.bin``: each document's text and metadata as zlib-compressed JSON,
+  for showing hits and for merges
+
+Postings are decoded with numpy, so scoring a term costs a few vector
+operations however many documents contain it. New documents are buffered
+and written as a new segment on flush; re-adding a key tombstones the old
+copy, and re-adding a case or act tombstones every unit of its previous
+version first, so paragraphs or sections it no longer has don't linger.
+Once there are more than SEARCH_MAX_SEGMENTS segments the smallest are
+merged.
+"""
+import argparse
+import gzip
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import threading
+import zlib
+from datetime import date
+
+import numpy as np
+from dotenv import load_dotenv
+
+from data_acquisition.documents import case_documents, legislation_documents
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR")
+SEARCH_FLUSH_DOCS = int(os.getenv("SEARCH_FLUSH_DOCS", "20000"))
+SEARCH_MAX_SEGMENTS = int(os.getenv("SEARCH_MAX_SEGMENTS", "8"))
+SEARCH_MERGE_FACTOR = int(os.getenv("SEARCH_MERGE_FACTOR", "4"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+_PHRASE = re.compile(r'"([^"]+)"')
+MANIFEST = "manifest.json"
+
+
+def tokenize(text):
+    return [token.casefold() for token in _TOKEN.findall(text or "")]
+
+
+def encode_varints(values):
+    """LEB128-encode non-negative integers into bytes"""
+    remaining = np.asarray(values, dtype=np.uint64)
+    if not len(remaining):
+        return b""
+    sizes = np.ones(len(remaining), dtype=np.int64)
+    shifted = remaining >> np.uint64(7)
+    while shifted.any():
+        sizes += shifted > 0
+        shifted >>= np.uint64(7)
+    starts = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    remaining = remaining.copy()
+    for byte in range(int(sizes.max())):
+        live = sizes > byte
+        continuation = (sizes[live] > byte + 1).astype(np.uint8) << 7
+        out[starts[live] + byte] = (remaining[live] & np.uint64(0x7F)).astype(np.uint8) | continuation
+        remaining[live] >>= np.uint64(7)
+    return out.tobytes()
+
+
+def decode_varints(buffer):
+    """Decode LEB128 bytes into a uint64 array"""
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    if len(ends) == len(data):
+        # Every value fits in one byte, as most deltas and frequencies do
+        return data.astype(np.uint64)
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    sizes = ends - starts + 1
+    low = (data & 0x7F).astype(np.uint64)
+    values = low[starts]
+    for byte in range(1, int(sizes.max())):
+        longer = np.flatnonzero(sizes > byte)
+        values[longer] |= low[starts[longer] + byte] << np.uint64(7 * byte)
+    return values
+
+
+def source_of(key):
+    """The case link or act source a unit key (``<source>#<unit>``) belongs to"""
+    return key.partition("#")[0]
+
+
+def date_ordinal(iso):
+    return date.fromisoformat(iso).toordinal() if iso else 0
+
+
+def parse_query(query):
+    """Split a query into (all terms, [phrase term lists]); quoted text is a phrase"""
+    phrases = [tokenize(phrase) for phrase in _PHRASE.findall(query)]
+    phrases = [phrase for phrase in phrases if len(phrase) > 1]
+    return tokenize(query), phrases
+
+
+def _write_json(path, value, compress=False):
+    tmp_path = path + ".tmp"
+    opener = gzip.open if compress else open
+    with opener(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def write_segment(path, documents):
+    """Write documents (dicts with key, text and metadata) as a segment directory"""
+    os.makedirs(path)
+    terms = {}
+    lengths = []
+    courts, stations = {}, {}
+    court_codes, station_codes, dates, offsets = [], [], [], [0]
+    with open(os.path.join(path, "store.bin"), "wb") as store:
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize(document["text"])
+            lengths.append(len(tokens))
+            positions = {}
+            for position, token in enumerate(tokens):
+                positions.setdefault(token, []).append(position)
+            for token, token_positions in positions.items():
+                terms.setdefault(token, []).append((doc_id, token_positions))
+            court_codes.append(courts.setdefault(document.get("court", "").casefold(), len(courts)))
+            station_codes.append(stations.setdefault(document.get("station", ""), len(stations)))
+            dates.append(date_ordinal(document.get("date", "")))
+            store.write(zlib.compress(json.dumps(document, ensure_ascii=False).encode("utf-8")))
+            offsets.append(store.tell())
+
+    lexicon = {}
+    with open(os.path.join(path, "postings.bin"), "wb") as postings, \
+            open(os.path.join(path, "positions.bin"), "wb") as positions_file:
+        for term in sorted(terms):
+            entries = terms[term]
+            doc_ids = np.fromiter((doc_id for doc_id, _ in entries), dtype=np.uint64, count=len(entries))
+            deltas = np.diff(doc_ids, prepend=np.uint64(0))
+            frequencies = [len(token_positions) for _, token_positions in entries]
+            block = encode_varints(np.concatenate([deltas, np.asarray(frequencies, dtype=np.uint64)]))
+            position_deltas = []
+            for _, token_positions in entries:
+                position_deltas.append(token_positions[0])
+                position_deltas.extend(b - a for a, b in zip(token_positions, token_positions[1:]))
+            position_block = encode_varints(position_deltas)
+            lexicon[term] = [len(entries), postings.tell(), len(block), positions_file.tell(), len(position_block)]
+            postings.write(block)
+            positions_file.write(position_block)
+
+    np.savez(os.path.join(path, "docs.npz"),
+             lengths=np.asarray(lengths, dtype=np.int32),
+             courts=np.asarray(court_codes, dtype=np.int32),
+             stations=np.asarray(station_codes, dtype=np.int32),
+             dates=np.asarray(dates, dtype=np.int32),
+             offsets=np.asarray(offsets, dtype=np.int64))
+    _write_json(os.path.join(path, "lexicon.json.gz"), lexicon, compress=True)
+    _write_json(os.path.join(path, "fields.json"), {
+        "courts": list(courts), "stations": list(stations), "keys": [d["key"] for d in documents]
+    })
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class Segment:
+    """Read side of one segment directory"""
+
+    def __init__(self, path, name):
+        self.name = name
+        self.path = path
+        with gzip.open(os.path.join(path, "lexicon.json.gz"), "rt", encoding="utf-8") as f:
+            self.lexicon = json.load(f)
+        with open(os.path.join(path, "fields.json"), encoding="utf-8") as f:
+            fields = json.load(f)
+        self.keys = fields["keys"]
+        self.court_codes = {court: code for code, court in enumerate(fields["courts"])}
+        self.station_codes = {station: code for code, station in enumerate(fields["stations"])}
+        docs = np.load(os.path.join(path, "docs.npz"))
+        self.lengths = docs["lengths"]
+        self.courts = docs["courts"]
+        self.stations = docs["stations"]
+        self.dates = docs["dates"]
+        self.offsets = docs["offsets"]
+        self.deleted = np.zeros(len(self.keys), dtype=bool)
+        self._postings = _map(os.path.join(path, "postings.bin"))
+        self._positions = _map(os.path.join(path, "positions.bin"))
+        self._store = _map(os.path.join(path, "store.bin"))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def postings(self, term):
+        """(doc ids, term frequencies) for a term, or None if it doesn't occur"""
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return None
+        df, offset, length = entry[0], entry[1], entry[2]
+        values = decode_varints(self._postings[offset:offset + length])
+        return np.cumsum(values[:df]).astype(np.int64), values[df:].astype(np.int64)
+
+    def positions(self, term):
+        """(doc id, position) arrays with one entry per occurrence of a term"""
+        doc_ids, frequencies = self.postings(term)
+        entry = self.lexicon[term]
+        deltas = decode_varints(self._positions[entry[3]:entry[3] + entry[4]]).astype(np.int64)
+        totals = np.cumsum(deltas)
+        starts = np.cumsum(frequencies) - frequencies
+        # Undo the delta coding within each document's run of positions
+        positions = totals - np.repeat(totals[starts] - deltas[starts], frequencies)
+        return np.repeat(doc_ids, frequencies), positions
+
+    def document(self, doc_id):
+        start, end = int(self.offsets[doc_id]), int(self.offsets[doc_id + 1])
+        return json.loads(zlib.decompress(self._store[start:end]).decode("utf-8"))
+
+    def live_documents(self):
+        for doc_id in range(len(self)):
+            if not self.deleted[doc_id]:
+                yield self.document(doc_id)
+
+    def filter_mask(self, doc_ids, court=None, station=None, date_from=None, date_to=None):
+        mask = ~self.deleted[doc_ids]
+        if court is not None:
+            code = self.court_codes.get(court.casefold(), -1)
+            mask &= self.courts[doc_ids] == code
+        if station is not None:
+            code = self.station_codes.get(station, -1)
+            mask &= self.stations[doc_ids] == code
+        if date_from is not None:
+            mask &= self.dates[doc_ids] >= date_ordinal(date_from)
+        if date_to is not None:
+            dates = self.dates[doc_ids]
+            mask &= (dates > 0) & (dates <= date_ordinal(date_to))
+        return mask
+
+    def close(self):
+        for mapped in (self._postings, self._positions, self._store):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+
+def _phrase_matches(segment, phrase, candidates):
+    """Candidates (sorted doc ids) in which the phrase's terms occur consecutively"""
+    for term in phrase:
+        found = segment.postings(term)
+        if found is None:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.intersect1d(candidates, found[0], assume_unique=True)
+    starts = None
+    for offset, term in enumerate(phrase):
+        doc_ids, positions = segment.positions(term)
+        keep = np.isin(doc_ids, candidates) & (positions >= offset)
+        # One key per (document, position the phrase would start at)
+        keys = (doc_ids[keep] << 32) | (positions[keep] - offset)
+        starts = keys if starts is None else np.intersect1d(starts, keys)
+        if not len(starts):
+            break
+    return np.unique(starts >> 32)
+
+
+class SearchIndex:
+    """Segmented BM25 index; documents are searchable once flushed"""
+
+    def __init__(self, directory=SEARCH_INDEX_DIR, flush_docs=SEARCH_FLUSH_DOCS,
+                 max_segments=SEARCH_MAX_SEGMENTS):
+        self.directory = directory
+        self.flush_docs = flush_docs
+        self.max_segments = max_segments
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._buffer = {}
+        manifest_path = os.path.join(directory, MANIFEST)
+        manifest = {"next_segment": 1, "segments": [], "deleted": {}}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        self._next_segment = manifest["next_segment"]
+        self.segments = []
+        self._locations = {}
+        # Live and buffered keys by source, so a source's old units can be tombstoned together
+        self._source_keys = {}
+        self._unsaved_tombstones = False
+        for name in manifest["segments"]:
+            segment = Segment(os.path.join(directory, name), name)
+            segment.deleted[manifest["deleted"].get(name, [])] = True
+            self._add_segment(segment)
+
+    def _add_segment(self, segment):
+        for doc_id, key in enumerate(segment.keys):
+            if segment.deleted[doc_id]:
+                continue
+            previous = self._locations.get(key)
+            if previous:
+                previous[0].deleted[previous[1]] = True
+            self._locations[key] = (segment, doc_id)
+            self._source_keys.setdefault(source_of(key), set()).add(key)
+        self.segments.append(segment)
+
+    def _save_manifest(self):
+        self._unsaved_tombstones = False
+        _write_json(os.path.join(self.directory, MANIFEST), {
+            "next_segment": self._next_segment,
+            "segments": [segment.name for segment in self.segments],
+            "deleted": {segment.name: np.flatnonzero(segment.deleted).tolist() for segment in self.segments},
+        })
+
+    # Writing
+
+    def add(self, documents):
+        """Buffer documents for indexing; a document replaces any earlier one with its key"""
+        with self._lock:
+            for document in documents:
+                self._buffer[document["key"]] = document
+                self._source_keys.setdefault(source_of(document["key"]), set()).add(document["key"])
+            if len(self._buffer) >= self.flush_docs:
+                self.flush()
+
+    def add_case(self, link, case, station=""):
+        """Index a case, replacing every paragraph of any earlier version"""
+        with self._lock:
+            self._drop_source(link)
+            self.add(case_documents(link, case, station=station))
+
+    def add_legislation(self, hierarchy, source="constitution", kind="constitution"):
+        """Index an act, replacing every section of any earlier version"""
+        with self._lock:
+            self._drop_source(source)
+            self.add(legislation_documents(hierarchy, source=source, kind=kind))
+
+    def delete(self, key):
+        with self._lock:
+            self._buffer.pop(key, None)
+            self._source_keys.get(source_of(key), set()).discard(key)
+            location = self._locations.pop(key, None)
+            if location:
+                location[0].deleted[location[1]] = True
+                self._save_manifest()
+
+    def delete_source(self, source):
+        """Remove every unit of a case or act"""
+        with self._lock:
+            if self._drop_source(source):
+                self._save_manifest()
+
+    def _drop_source(self, source):
+        """Tombstone a source's units; the manifest is saved by the caller or the next flush"""
+        tombstoned = 0
+        for key in self._source_keys.pop(source, ()):
+            self._buffer.pop(key, None)
+            location = self._locations.pop(key, None)
+            if location:
+                location[0].deleted[location[1]] = True
+                tombstoned += 1
+        self._unsaved_tombstones |= tombstoned > 0
+        return tombstoned
+
+    def _write_segment(self, documents):
+        name = f"seg_{self._next_segment:06d}"
+        self._next_segment += 1
+        write_segment(os.path.join(self.directory, name), documents)
+        return Segment(os.path.join(self.directory, name), name)
+
+    def flush(self):
+        """Write buffered documents as a new segment, merging small segments if there are too many"""
+        with self._lock:
+            if not self._buffer:
+                if self._unsaved_tombstones:
+                    self._save_manifest()
+                return
+            documents = list(self._buffer.values())
+            self._buffer = {}
+            self._add_segment(self._write_segment(documents))
+            self._save_manifest()
+            logger.info(f"Flushed {len(documents)} documents to {self.segments[-1].name}")
+            if len(self.segments) > self.max_segments:
+                self.merge(SEARCH_MERGE_FACTOR)
+
+    def merge(self, count=None):
+        """Merge the count smallest segments (all of them by default) into one"""
+        with self._lock:
+            smallest = sorted(self.segments, key=lambda segment: int((~segment.deleted).sum()))
+            chosen = smallest[:count] if count else smallest
+            if len(chosen) < 2:
+                return
+            documents = [document for segment in chosen for document in segment.live_documents()]
+            merged = self._write_segment(documents)
+            chosen_names = {segment.name for segment in chosen}
+            self.segments = [segment for segment in self.segments if segment.name not in chosen_names]
+            for doc_id, key in enumerate(merged.keys):
+                self._locations[key] = (merged, doc_id)
+            self.segments.append(merged)
+            self._save_manifest()
+            for segment in chosen:
+                segment.close()
+                shutil.rmtree(segment.path, ignore_errors=True)
+            logger.info(f"Merged {len(chosen)} segments into {merged.name} ({len(documents)} documents)")
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            for segment in self.segments:
+                segment.close()
+
+    # Searching
+
+    def stats(self):
+        with self._lock:
+            documents = sum(int((~segment.deleted).sum()) for segment in self.segments)
+            tokens = sum(int(segment.lengths[~segment.deleted].sum()) for segment in self.segments)
+            return {"segments": len(self.segments), "documents": documents, "tokens": tokens,
+                    "buffered": len(self._buffer)}
+
+    def search(self, query, k=10, court=None, station=None, date_from=None, date_to=None):
+        """Top k documents for query by BM25, as dicts with a 'score'.
+
+        Quoted parts of the query must match as phrases. court (case
+        insensitive), station and ISO date bounds restrict the results.
+        """
+        terms, phrases = parse_query(query)
+        if not terms:
+            return []
+        with self._lock:
+            segments = list(self.segments)
+        stats = self.stats()
+        if not stats["documents"]:
+            return []
+        average_length = stats["tokens"] / stats["documents"]
+        unique_terms = list(dict.fromkeys(terms))
+        idf = {}
+        for term in unique_terms:
+            df = sum(segment.lexicon[term][0] for segment in segments if term in segment.lexicon)
+            idf[term] = np.log(1 + (stats["documents"] - df + 0.5) / (df + 0.5))
+
+        hits = []
+        for segment in segments:
+            # Dense accumulators: a term lists each document at most once
+            scores = np.zeros(len(segment), dtype=np.float32)
+            matched = np.zeros(len(segment), dtype=bool)
+            for term in unique_terms:
+                found = segment.postings(term)
+                if found is None:
+                    continue
+                doc_ids, frequencies = found
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths[doc_ids] / average_length)
+                scores[doc_ids] += idf[term] * frequencies * (BM25_K1 + 1) / (frequencies + norm)
+                matched[doc_ids] = True
+            doc_ids = np.flatnonzero(matched)
+            if not len(doc_ids):
+                continue
+            scores = scores[doc_ids]
+            keep = segment.filter_mask(doc_ids, court, station, date_from, date_to)
+            doc_ids, scores = doc_ids[keep], scores[keep]
+            for phrase in phrases:
+                matched = _phrase_matches(segment, phrase, doc_ids)
+                keep = np.isin(doc_ids, matched, assume_unique=True)
+                doc_ids, scores = doc_ids[keep], scores[keep]
+            if len(doc_ids) > k:
+                top = np.argpartition(-scores, k)[:k]
+                doc_ids, scores = doc_ids[top], scores[top]
+            hits.extend((float(score), segment, int(doc_id)) for doc_id, score in zip(doc_ids, scores))
+
+        hits.sort(key=lambda hit: -hit[0])
+        return [dict(segment.document(doc_id), score=score) for score, segment, doc_id in hits[:k]]
+
+
+def build_from_journal(index, journal):
+    """Index every case recorded in a crawl journal (or a CorpusStore, which iterates the same way)"""
+    count = 0
+    for station_url, case_url, data in journal.iter_cases():
+        index.add_case(case_url, data, station=station_url)
+        count += 1
+    return count
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Build or query the BM25 search index")
+    parser.add_argument("--index", default=SEARCH_INDEX_DIR, required=SEARCH_INDEX_DIR is None)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index cases from a crawl journal and legislation JSON files")
+    build.add_argument("--journal", help="crawl journal holding the scraped cases")
+    build.add_argument("--corpus", help="corpus store holding the scraped cases (see corpus_store.py)")
+    build.add_argument("--constitution-json", help="constitution tree saved as JSON")
+    build.add_argument("--legislation-dir", help="directory of act hierarchies written by legislation.py")
+    build.add_argument("--chunks", help="also index every chunk in this chunk store (see chunking.py)")
+    build.add_argument("--merge", action="store_true", help="merge everything into one segment afterwards")
+    search = commands.add_parser("search", help="run a query")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=10)
+    search.add_argument("--court")
+    search.add_argument("--station")
+    search.add_argument("--from", dest="date_from")
+    search.add_argument("--to", dest="date_to")
+    args = parser.parse_args()
+
+    index = SearchIndex(args.index)
+    try:
+        if args.command == "build":
+            if args.journal:
+                from data_acquisition.crawl_journal import CrawlJournal
+                journal = CrawlJournal(args.journal)
+                logger.info(f"Indexed {build_from_journal(index, journal)} cases from {args.journal}")
+                journal.close()
+            if args.corpus:
+                from data_acquisition.corpus_store import CorpusStore
+                logger.info(f"Indexed {build_from_journal(index, CorpusStore(args.corpus))} cases from {args.corpus}")
+            if args.constitution_json:
+                with open(args.constitution_json, encoding="utf-8") as f:
+                    index.add_legislation(json.load(f))
+            if args.legislation_dir:
+                for name in sorted(os.listdir(args.legislation_dir)):
+                    if name.endswith(".json"):
+                        with open(os.path.join(args.legislation_dir, name), encoding="utf-8") as f:
+                            hierarchy = json.load(f)
+                        index.add_legislation(hierarchy, source=hierarchy.get("source", name), kind="legislation")
+            if args.chunks:
+                from data_acquisition.chunking import ChunkStore
+                store = ChunkStore(args.chunks)
+                index.add(store.iter_chunks())
+                store.close()
+            index.flush()
+            if args.merge:
+                index.merge()
+            logger.info(f"Index stats: {index.stats()}")
+        else:
+            for hit in index.search(args.query, k=args.k, court=args.court, station=args.station,
+                                    date_from=args.date_from, date_to=args.date_to):
+                print(f"{hit['score']:.3f}  {hit.get('citation') or hit.get('title')}  {hit['key']}")
+                print(f"    {hit['text'][:200]}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
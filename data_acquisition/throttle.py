@@ -0,0 +1,425 @@
+"""Adaptive per-host concurrency, jittered retries and circuit breakers for page fetches.
+
+Every fetch to a host goes through that host's AIMD limit: while
+responses come back healthy and faster than THROTTLE_LATENCY_TARGET the
+limit grows by about one request per round trip (additive increase, and
+only while the limit is actually in use), and a throttled or failed
+response (429, 5xx, a connection error or timeout) or a slow one
+multiplies it by THROTTLE_BACKOFF (multiplicative decrease). A burst of
+failures from requests that were already in flight counts as one
+decrease, so the limit settles just under the rate the site sustains
+instead of collapsing to the minimum. The worker counts (CRAWL_CONCURRENCY,
+LISTING_CONCURRENCY, ASYNC_PER_HOST_LIMIT) become ceilings; requests
+beyond the current limit wait for a slot.
+
+Failed requests are retried up to THROTTLE_RETRIES times after a full
+jitter backoff (a random delay up to THROTTLE_RETRY_BASE * 2^attempt,
+capped at THROTTLE_RETRY_CAP), or after the server's Retry-After.
+
+After BREAKER_THRESHOLD consecutive failures a host's circuit opens;
+like the backoff, a burst of failures already in flight counts once, so
+a single overload doesn't trip it. Requests to an open host wait
+BREAKER_COOLDOWN seconds, then a single probe goes through and closes the
+circuit if it succeeds or reopens it if not. A request that has waited on
+an open circuit for BREAKER_MAX_WAIT seconds raises CircuitOpenError, so a
+host that stays down fails the station (to be resumed later) rather than
+sending it to the browser fallback.
+
+Throttle serves threads and AsyncThrottle an event loop; both keep the
+same per-host state. The process-wide Throttle used by fetch_page and the
+managed browser is configured with configure_throttle(), as the page
+cache is.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from dotenv import load_dotenv
+
+from data_acquisition.metrics import inc, set_gauge
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "1") == "1"
+THROTTLE_INITIAL = float(os.getenv("THROTTLE_INITIAL", "4"))
+THROTTLE_MIN = float(os.getenv("THROTTLE_MIN", "1"))
+THROTTLE_MAX = float(os.getenv("THROTTLE_MAX", "32"))
+THROTTLE_BACKOFF = float(os.getenv("THROTTLE_BACKOFF", "0.5"))
+THROTTLE_LATENCY_TARGET = float(os.getenv("THROTTLE_LATENCY_TARGET", "5"))
+THROTTLE_RETRIES = int(os.getenv("THROTTLE_RETRIES", "3"))
+THROTTLE_RETRY_BASE = float(os.getenv("THROTTLE_RETRY_BASE", "0.5"))
+THROTTLE_RETRY_CAP = float(os.getenv("THROTTLE_RETRY_CAP", "30"))
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+BREAKER_MAX_WAIT = float(os.getenv("BREAKER_MAX_WAIT", "300"))
+
+# Responses that mean the server is throttling or struggling; worth retrying later
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(ConnectionError):
+    """A host's circuit stayed open for longer than the caller was prepared to wait"""
+
+
+def retry_after_seconds(value):
+    """Seconds asked for by a Retry-After header (delta-seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_status(status, retry_after=None):
+    """(failed, retry_after seconds) for an HTTP status; 404s are answers, not failures"""
+    if status in RETRY_STATUSES:
+        return True, retry_after_seconds(retry_after)
+    return False, None
+
+
+def backoff_delay(attempt, base=THROTTLE_RETRY_BASE, cap=THROTTLE_RETRY_CAP, retry_after=None):
+    """Full jitter delay before retry attempt (0-based); a Retry-After is honoured plus a little jitter"""
+    if retry_after is not None:
+        return min(cap, retry_after + random.uniform(0, base))
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AIMDLimit:
+    """A concurrency limit that grows additively on healthy responses and shrinks multiplicatively on failures"""
+
+    def __init__(self, initial=THROTTLE_INITIAL, minimum=THROTTLE_MIN, maximum=THROTTLE_MAX,
+                 backoff=THROTTLE_BACKOFF, latency_target=THROTTLE_LATENCY_TARGET):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.limit = min(maximum, max(minimum, initial))
+        # Bumped on every decrease; failures of requests admitted before it don't decrease again
+        self.epoch = 0
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def slots(self):
+        return max(1, int(self.limit))
+
+    def on_success(self, latency, epoch, saturated):
+        if latency is not None and latency > self.latency_target:
+            return self.on_failure(epoch)
+        if saturated and self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.increases += 1
+        return False
+
+    def on_failure(self, epoch):
+        """Back off once per epoch; True when the limit was decreased"""
+        if epoch != self.epoch:
+            return False
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        self.epoch += 1
+        self.decreases += 1
+        return True
+
+
+class CircuitBreaker:
+    """Opens after threshold consecutive failures, then lets one probe through after cooldown"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def wait_time(self, now):
+        """Seconds to wait before a request may go (0 when it may go now); claims the probe when half-open"""
+        if self.state == CLOSED:
+            return 0.0
+        if self.state == OPEN:
+            remaining = self.opened_at + self.cooldown - now
+            if remaining > 0:
+                return remaining
+            self.state = HALF_OPEN
+            self.probing = False
+        if self.probing:
+            # The probe's release wakes the waiters
+            return self.cooldown
+        self.probing = True
+        return 0.0
+
+    def on_success(self):
+        self.failures = 0
+        self.probing = False
+        changed = self.state != CLOSED
+        self.state = CLOSED
+        return changed
+
+    def on_failure(self, now, counts=True):
+        """True when this failure opened the circuit; a failed probe always reopens it"""
+        self.probing = False
+        if counts:
+            self.failures += 1
+        if self.state == HALF_OPEN or (counts and self.state == CLOSED and self.threshold
+                                       and self.failures >= self.threshold):
+            self.state = OPEN
+            self.opened_at = now
+            return True
+        return False
+
+
+class HostState:
+    def __init__(self, host, limit, breaker):
+        self.host = host
+        self.limit = limit
+        self.breaker = breaker
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+
+
+class _ThrottleBase:
+    def __init__(self, initial=THROTTLE_INITIAL, minimum=THROTTLE_MIN, maximum=THROTTLE_MAX,
+                 backoff=THROTTLE_BACKOFF, latency_target=THROTTLE_LATENCY_TARGET, retries=THROTTLE_RETRIES,
+                 retry_base=THROTTLE_RETRY_BASE, retry_cap=THROTTLE_RETRY_CAP, breaker_threshold=BREAKER_THRESHOLD,
+                 breaker_cooldown=BREAKER_COOLDOWN, breaker_max_wait=BREAKER_MAX_WAIT):
+        self.limit_options = {"initial": initial, "minimum": minimum, "maximum": maximum, "backoff": backoff,
+                              "latency_target": latency_target}
+        self.breaker_options = {"threshold": breaker_threshold, "cooldown": breaker_cooldown}
+        self.retries = retries
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.breaker_max_wait = breaker_max_wait
+        self._hosts = {}
+
+    def host(self, url):
+        """The state of url's host, created on first use"""
+        host = urlsplit(url).netloc or url
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts.setdefault(
+                host, HostState(host, AIMDLimit(**self.limit_options), CircuitBreaker(**self.breaker_options)))
+            set_gauge("throttle_limit", state.limit.limit, host=host)
+        return state
+
+    def _try_admit(self, state, now):
+        """(ticket, wait): a ticket when the request may go, else seconds to wait (None: until a release)"""
+        if state.in_flight >= state.limit.slots:
+            return None, None
+        wait = state.breaker.wait_time(now)
+        if wait > 0:
+            return None, wait
+        state.in_flight += 1
+        state.requests += 1
+        return (state.limit.epoch, state.in_flight >= state.limit.slots), None
+
+    def _settle(self, state, ticket, latency, failed, now):
+        """Release a slot and feed the outcome (True, False or None for no signal) to the limit and breaker"""
+        state.in_flight -= 1
+        if failed is None:
+            if state.breaker.state == HALF_OPEN:
+                state.breaker.probing = False
+            return
+        epoch, saturated = ticket
+        if failed:
+            state.failures += 1
+            decreased = state.limit.on_failure(epoch)
+            if state.breaker.on_failure(now, counts=decreased):
+                inc("circuit_opened_total", host=state.host)
+                logger.warning(f"Circuit for {state.host} opened after {state.breaker.failures} failures, "
+                               f"pausing {state.breaker.cooldown:g}s")
+        else:
+            decreased = state.limit.on_success(latency, epoch, saturated)
+            if state.breaker.on_success():
+                logger.info(f"Circuit for {state.host} closed")
+        if decreased:
+            inc("throttle_backoffs_total", host=state.host)
+        set_gauge("throttle_limit", state.limit.limit, host=state.host)
+        set_gauge("circuit_state", _STATE_VALUES[state.breaker.state], host=state.host)
+
+    def _outcome(self, result, classify):
+        if classify is None:
+            return False, None
+        return classify(result)
+
+    def _retry_delay(self, state, attempt, reason, retry_after=None):
+        state.retries += 1
+        inc("throttle_retries_total", host=state.host, reason=reason)
+        return backoff_delay(attempt, self.retry_base, self.retry_cap, retry_after)
+
+    def _wait_budget(self, state, waited_since, now):
+        """Seconds a request held back by an open circuit may still wait"""
+        remaining = waited_since + self.breaker_max_wait - now
+        if remaining <= 0:
+            raise CircuitOpenError(f"circuit for {state.host} open for over {self.breaker_max_wait:g}s")
+        return remaining
+
+    def stats(self):
+        return {state.host: {"limit": round(state.limit.limit, 2), "in_flight": state.in_flight,
+                             "requests": state.requests, "failures": state.failures, "retries": state.retries,
+                             "backoffs": state.limit.decreases, "circuit": state.breaker.state}
+                for state in list(self._hosts.values())}
+
+
+class Throttle(_ThrottleBase):
+    """Per-host AIMD limits, retries and circuit breakers shared by threads"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._changed = threading.Condition()
+
+    def host(self, url):
+        with self._changed:
+            return super().host(url)
+
+    def _acquire(self, state):
+        waited_since = None
+        with self._changed:
+            while True:
+                now = time.monotonic()
+                ticket, wait = self._try_admit(state, now)
+                if ticket is not None:
+                    return ticket
+                if wait is not None:
+                    waited_since = waited_since or now
+                    wait = min(wait, self._wait_budget(state, waited_since, now))
+                self._changed.wait(wait)
+
+    def _release(self, state, ticket, latency, failed):
+        with self._changed:
+            self._settle(state, ticket, latency, failed, time.monotonic())
+            self._changed.notify_all()
+
+    def call(self, url, request, classify=None, retry_on=(), track_latency=True):
+        """Run request() for url under its host's limit, retrying failures after a jittered backoff.
+
+        classify(result) returns (failed, retry_after seconds or None);
+        exceptions in retry_on count as failures. The last failed result is
+        returned, or the last exception raised, once the retries run out.
+        """
+        state = self.host(url)
+        for attempt in range(self.retries + 1):
+            ticket = self._acquire(state)
+            start = time.monotonic()
+            try:
+                result = request()
+            except retry_on as e:
+                self._release(state, ticket, None, True)
+                if attempt == self.retries:
+                    raise
+                delay = self._retry_delay(state, attempt, type(e).__name__)
+                logger.info(f"{type(e).__name__} for {url}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self._release(state, ticket, None, None)
+                raise
+            failed, retry_after = self._outcome(result, classify)
+            self._release(state, ticket, time.monotonic() - start if track_latency else None, failed)
+            if not failed or attempt == self.retries:
+                return result
+            delay = self._retry_delay(state, attempt, "status", retry_after)
+            logger.info(f"Throttled or failed response for {url}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+class AsyncThrottle(_ThrottleBase):
+    """Per-host AIMD limits, retries and circuit breakers for coroutines on one event loop"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._changed = None
+
+    def _condition(self):
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def _acquire(self, state):
+        waited_since = None
+        changed = self._condition()
+        async with changed:
+            while True:
+                now = time.monotonic()
+                ticket, wait = self._try_admit(state, now)
+                if ticket is not None:
+                    return ticket
+                if wait is not None:
+                    waited_since = waited_since or now
+                    wait = min(wait, self._wait_budget(state, waited_since, now))
+                try:
+                    await asyncio.wait_for(changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self, state, ticket, latency, failed):
+        changed = self._condition()
+        async with changed:
+            self._settle(state, ticket, latency, failed, time.monotonic())
+            changed.notify_all()
+
+    async def call(self, url, request, classify=None, retry_on=(), track_latency=True):
+        """Await request() for url under its host's limit; see Throttle.call"""
+        state = self.host(url)
+        for attempt in range(self.retries + 1):
+            ticket = await self._acquire(state)
+            start = time.monotonic()
+            try:
+                result = await request()
+            except retry_on as e:
+                await self._release(state, ticket, None, True)
+                if attempt == self.retries:
+                    raise
+                delay = self._retry_delay(state, attempt, type(e).__name__)
+                logger.info(f"{type(e).__name__} for {url}, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                await self._release(state, ticket, None, None)
+                raise
+            failed, retry_after = self._outcome(result, classify)
+            await self._release(state, ticket, time.monotonic() - start if track_latency else None, failed)
+            if not failed or attempt == self.retries:
+                return result
+            delay = self._retry_delay(state, attempt, "status", retry_after)
+            logger.info(f"Throttled or failed response for {url}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+_throttle = None
+_throttle_configured = False
+_throttle_lock = threading.Lock()
+
+
+def get_throttle():
+    """The process-wide Throttle, or None when throttling is disabled"""
+    global _throttle, _throttle_configured
+    if not _throttle_configured:
+        with _throttle_lock:
+            if not _throttle_configured:
+                _throttle = Throttle() if THROTTLE_ENABLED else None
+                _throttle_configured = True
+    return _throttle
+
+
+def configure_throttle(enabled=True, **options):
+    """Use a fresh Throttle with options for all fetches in this process (enabled=False disables it)"""
+    global _throttle, _throttle_configured
+    with _throttle_lock:
+        _throttle = Throttle(**options) if enabled else None
+        _throttle_configured = True
+    return _throttle
@@ -0,0 +1,506 @@
+"""Embedding store and approximate nearest-neighbour search for retrieval.
+
+Judgment paragraphs and legislation sections (the units documents.py
+produces from getCaseContent and scrape_constitution_data output) are
+embedded in batches by a pluggable embedder and appended to a
+memory-mapped float32 matrix. Vectors are L2-normalised, so inner product
+is cosine similarity.
+
+The ANN index is an inverted file (IVF): spherical k-means centroids, with
+each vector listed under its nearest centroid. A query scores the
+centroids, scans the nprobe closest lists and ranks their members exactly.
+By default there are sqrt(rows) lists and a query scans a quarter of
+them, which keeps recall@10 near 0.9 even on text with little cluster
+structure.
+Vectors added after the last build are scanned in full until the next
+build. evaluate() reports recall@k and latency against exact search.
+
+Layout of an index directory:
+
+- ``vectors.f32``: one row of dim float32s per unit
+- ``records.jsonl``: each unit's key and metadata, one line per row
+- ``texts.bin`` / ``text_offsets.i64``: zlib-compressed unit texts
+- ``ivf.npz``: centroids and the CSR lists, once built
+- ``manifest.json``: embedder, dim, deleted rows, rows covered by the IVF
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+from dotenv import load_dotenv
+
+from data_acquisition.documents import case_documents, legislation_documents
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR")
+VECTOR_EMBEDDER = os.getenv("VECTOR_EMBEDDER", "hashing")
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "384"))
+VECTOR_BATCH_SIZE = int(os.getenv("VECTOR_BATCH_SIZE", "1024"))
+# Lists scanned per query; 0 scans VECTOR_PROBE_FRACTION of them, whatever their number
+VECTOR_NPROBE = int(os.getenv("VECTOR_NPROBE", "0"))
+VECTOR_PROBE_FRACTION = float(os.getenv("VECTOR_PROBE_FRACTION", "0.25"))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 100000
+# Query rows are scored in blocks of this many to bound memory
+SCORE_BLOCK = 65536
+# Initial capacity of the per-row filter arrays, which double as rows are added
+MIN_ROW_CAPACITY = 1024
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """Dependency-free embedder: signed feature hashing of words and word pairs.
+
+    Captures lexical overlap only, but needs no model download and embeds
+    hundreds of thousands of paragraphs a minute on one core.
+    """
+
+    def __init__(self, dim=VECTOR_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        words = [word.casefold() for word in _TOKEN.findall(text or "")]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(zlib.crc32(feature.encode("utf-8")) for feature in features)
+        hashes = np.asarray(hashes, dtype=np.int64)
+        cells = np.asarray(rows, dtype=np.int64) * self.dim + (hashes >> 1) % self.dim
+        signs = np.where(hashes & 1, 1.0, -1.0)
+        vectors = np.bincount(cells, weights=signs, minlength=len(texts) * self.dim)
+        vectors = vectors.reshape(len(texts), self.dim).astype(np.float32)
+        # Sublinear term weighting, then unit length
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        return normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a sentence-transformers model (optional dependency)"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=64, convert_to_numpy=True)
+        return normalize(vectors.astype(np.float32))
+
+
+def get_embedder(spec=VECTOR_EMBEDDER):
+    """Embedder from a spec: 'hashing', 'hashing-<dim>' or 'sentence-transformers:<model>'"""
+    if spec.startswith("sentence-transformers:"):
+        return SentenceTransformerEmbedder(spec.split(":", 1)[1])
+    if spec.startswith("hashing"):
+        _, _, dim = spec.partition("-")
+        return HashingEmbedder(int(dim) if dim else VECTOR_DIM)
+    raise ValueError(f"Unknown embedder {spec!r}")
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _date_ordinal(iso):
+    return date.fromisoformat(iso).toordinal() if iso else 0
+
+
+def kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means centroids of unit vectors"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = np.flatnonzero(np.linalg.norm(sums, axis=1) == 0)
+        # Reseed empty clusters with random points
+        sums[empty] = vectors[rng.choice(len(vectors), size=len(empty), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign(vectors, centroids):
+    """Index of the nearest centroid for each vector"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SCORE_BLOCK):
+        block = np.asarray(vectors[start:start + SCORE_BLOCK])
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _top_k(rows, scores, k):
+    if len(scores) > k:
+        top = np.argpartition(-scores, k)[:k]
+        rows, scores = rows[top], scores[top]
+    order = np.argsort(-scores)
+    return rows[order], scores[order]
+
+
+class VectorIndex:
+    def __init__(self, directory=VECTOR_INDEX_DIR, embedder=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        manifest = self._read_manifest()
+        if embedder is None:
+            embedder = get_embedder(manifest["embedder"] if manifest else VECTOR_EMBEDDER)
+        elif manifest and manifest["embedder"] != embedder.name:
+            raise ValueError(f"{directory} holds {manifest['embedder']} vectors, not {embedder.name}")
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.ivf_rows = manifest["ivf_rows"] if manifest else 0
+        self.keys = {}
+        self.records = []
+        self._columns = {name: np.zeros(0, dtype=dtype) for name, dtype in
+                         (("courts", np.int32), ("stations", np.int32), ("kinds", np.int32),
+                          ("dates", np.int32), ("deleted", bool))}
+        self._court_codes, self._station_codes, self._kind_codes = {}, {}, {}
+        rows = manifest["rows"] if manifest else 0
+        if rows:
+            with open(self._path("records.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    self._remember(json.loads(line))
+                    if len(self.records) == rows:
+                        break
+        self._truncate(rows)
+        self._columns["deleted"][manifest["deleted"] if manifest else []] = True
+        self._open_matrices()
+        self.centroids, self.list_offsets, self.list_rows = None, None, None
+        if self.ivf_rows and os.path.exists(self._path("ivf.npz")):
+            ivf = np.load(self._path("ivf.npz"))
+            self.centroids, self.list_offsets, self.list_rows = ivf["centroids"], ivf["offsets"], ivf["rows"]
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_manifest(self):
+        path = self._path("manifest.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        tmp_path = self._path("manifest.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"embedder": self.embedder.name, "dim": self.dim, "rows": len(self.records),
+                       "ivf_rows": self.ivf_rows, "deleted": np.flatnonzero(self.deleted).tolist()}, f)
+        os.replace(tmp_path, self._path("manifest.json"))
+
+    def _reserve(self, rows):
+        """Make room for rows more records in the filter arrays, doubling their capacity when full"""
+        needed = len(self.records) + rows
+        capacity = len(self._columns["deleted"])
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, MIN_ROW_CAPACITY)
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            self._columns[name] = grown
+
+    def _remember(self, record):
+        """Track a record's key and filter fields; returns the row it replaces, if any"""
+        self._reserve(1)
+        row = len(self.records)
+        previous = self.keys.get(record["key"])
+        self.keys[record["key"]] = row
+        self.records.append(record)
+        columns = self._columns
+        columns["courts"][row] = self._court_codes.setdefault(record.get("court", "").casefold(),
+                                                              len(self._court_codes))
+        columns["stations"][row] = self._station_codes.setdefault(record.get("station", ""), len(self._station_codes))
+        columns["kinds"][row] = self._kind_codes.setdefault(record.get("kind", ""), len(self._kind_codes))
+        columns["dates"][row] = _date_ordinal(record.get("date", ""))
+        if previous is not None:
+            columns["deleted"][previous] = True
+        return previous
+
+    def _truncate(self, rows):
+        """Drop anything an interrupted append wrote past the last saved manifest"""
+        text_end = int(np.fromfile(self._path("text_offsets.i64"), dtype=np.int64, count=rows + 1)[-1]) if rows else 0
+        record_end = 0
+        if rows:
+            with open(self._path("records.jsonl"), "rb") as f:
+                for _ in range(rows):
+                    record_end += len(f.readline())
+        for name, size in (("vectors.f32", rows * self.dim * 4), ("text_offsets.i64", (rows + 1) * 8 if rows else 0),
+                           ("texts.bin", text_end), ("records.jsonl", record_end)):
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                logger.warning(f"Truncating {path} to {size} bytes left by an interrupted write")
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _open_matrices(self):
+        rows = len(self.records)
+        self.vectors = (np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dim))
+                        if rows else np.zeros((0, self.dim), dtype=np.float32))
+        self.text_offsets = (np.memmap(self._path("text_offsets.i64"), dtype=np.int64, mode="r", shape=(rows + 1,))
+                             if rows else np.zeros(1, dtype=np.int64))
+        # Views over the first rows of the filter arrays: no copy, whatever their capacity
+        self.courts = self._columns["courts"][:rows]
+        self.stations = self._columns["stations"][:rows]
+        self.kinds = self._columns["kinds"][:rows]
+        self.dates = self._columns["dates"][:rows]
+        self.deleted = self._columns["deleted"][:rows]
+
+    # Writing
+
+    def add(self, documents, batch_size=VECTOR_BATCH_SIZE):
+        """Embed and append documents in batches; a document replaces any earlier one with its key.
+
+        Pass a whole corpus as one iterable: each call ends with a manifest
+        write, so adding a few documents at a time is far slower.
+        """
+        added = 0
+        batch = []
+        try:
+            for document in documents:
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    added += self._append(batch)
+                    batch = []
+            if batch:
+                added += self._append(batch)
+        finally:
+            if added:
+                with self._lock:
+                    self._save_manifest()
+        return added
+
+    def _append(self, documents):
+        vectors = self.embedder.embed([document["text"] for document in documents]).astype(np.float32)
+        with self._lock:
+            offsets_path = self._path("text_offsets.i64")
+            if not os.path.exists(offsets_path) or os.path.getsize(offsets_path) == 0:
+                np.zeros(1, dtype=np.int64).tofile(offsets_path)
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            offsets = []
+            with open(self._path("texts.bin"), "ab") as f:
+                for document in documents:
+                    f.write(zlib.compress(document["text"].encode("utf-8")))
+                    offsets.append(f.tell())
+            with open(offsets_path, "ab") as f:
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+            with open(self._path("records.jsonl"), "a", encoding="utf-8") as f:
+                for document in documents:
+                    record = {key: value for key, value in document.items() if key != "text"}
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            for document in documents:
+                self._remember({key: value for key, value in document.items() if key != "text"})
+            self._open_matrices()
+        return len(documents)
+
+    def add_case(self, link, case, station=""):
+        return self.add(case_documents(link, case, station=station))
+
+    def add_legislation(self, hierarchy, source="constitution", kind="constitution"):
+        return self.add(legislation_documents(hierarchy, source=source, kind=kind))
+
+    def build_ann(self, lists=None, seed=0):
+        """(Re)build the IVF over every stored vector; lists defaults to sqrt(rows)"""
+        with self._lock:
+            rows = len(self.records)
+            if rows == 0:
+                return
+            lists = min(rows, lists or max(1, int(np.sqrt(rows))))
+            started = time.perf_counter()
+            sample = self.vectors
+            if rows > KMEANS_SAMPLE:
+                picked = np.sort(np.random.default_rng(seed).choice(rows, size=KMEANS_SAMPLE, replace=False))
+                sample = self.vectors[picked]
+            centroids = kmeans(np.asarray(sample), lists, seed=seed)
+            assignments = assign(self.vectors, centroids)
+            order = np.argsort(assignments, kind="stable").astype(np.int64)
+            offsets = np.zeros(lists + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum(np.bincount(assignments, minlength=lists))
+            np.savez(self._path("ivf.npz"), centroids=centroids, offsets=offsets, rows=order)
+            self.centroids, self.list_offsets, self.list_rows = centroids, offsets, order
+            self.ivf_rows = rows
+            self._save_manifest()
+            logger.info(f"Built IVF with {lists} lists over {rows} vectors in {time.perf_counter() - started:.1f}s")
+
+    # Searching
+
+    def text(self, row):
+        start, end = int(self.text_offsets[row]), int(self.text_offsets[row + 1])
+        with open(self._path("texts.bin"), "rb") as f:
+            f.seek(start)
+            return zlib.decompress(f.read(end - start)).decode("utf-8")
+
+    def _filter(self, rows, court=None, station=None, date_from=None, date_to=None, kind=None):
+        mask = ~self.deleted[rows]
+        if court is not None:
+            mask &= self.courts[rows] == self._court_codes.get(court.casefold(), -1)
+        if station is not None:
+            mask &= self.stations[rows] == self._station_codes.get(station, -1)
+        if date_from is not None:
+            mask &= self.dates[rows] >= _date_ordinal(date_from)
+        if date_to is not None:
+            mask &= (self.dates[rows] > 0) & (self.dates[rows] <= _date_ordinal(date_to))
+        if kind is not None:
+            mask &= self.kinds[rows] == self._kind_codes.get(kind, -1)
+        return rows[mask]
+
+    def _score(self, query, rows):
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), SCORE_BLOCK):
+            block = rows[start:start + SCORE_BLOCK]
+            scores[start:start + len(block)] = self.vectors[block] @ query
+        return scores
+
+    def probes(self, nprobe=VECTOR_NPROBE):
+        """Lists to scan per query: nprobe, or VECTOR_PROBE_FRACTION of the lists if nprobe is 0"""
+        lists = len(self.centroids)
+        return min(lists, nprobe or max(1, int(np.ceil(VECTOR_PROBE_FRACTION * lists))))
+
+    def candidate_rows(self, query, nprobe=VECTOR_NPROBE):
+        """Rows in the nprobe lists closest to the query, plus rows added since the IVF was built"""
+        nprobe = self.probes(nprobe)
+        closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        lists = [self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in closest]
+        lists.append(np.arange(self.ivf_rows, len(self.records), dtype=np.int64))
+        return np.sort(np.concatenate(lists))
+
+    def search_vector(self, query, k=10, exact=False, nprobe=VECTOR_NPROBE, **filters):
+        """(rows, scores) of the k nearest stored vectors to a unit query vector"""
+        if self.centroids is None or exact:
+            rows = np.arange(len(self.records), dtype=np.int64)
+        else:
+            rows = self.candidate_rows(query, nprobe)
+        rows = self._filter(rows, **filters)
+        return _top_k(rows, self._score(query, rows), k)
+
+    def search(self, text, k=10, exact=False, nprobe=VECTOR_NPROBE, **filters):
+        """Top k units for a text query, as record dicts with 'text' and 'score'.
+
+        Filters: court (case insensitive), station, date_from/date_to (ISO)
+        and kind ('case', 'constitution', 'legislation').
+        """
+        if not self.records:
+            return []
+        query = self.embedder.embed([text])[0]
+        rows, scores = self.search_vector(query, k=k, exact=exact, nprobe=nprobe, **filters)
+        return [dict(self.records[row], text=self.text(row), score=float(score))
+                for row, score in zip(rows.tolist(), scores.tolist())]
+
+    def evaluate(self, queries=200, k=10, nprobe=VECTOR_NPROBE, seed=0):
+        """Recall@k and latency of IVF search against exact search.
+
+        Queries are stored vectors picked at random, with the vector itself
+        excluded from both result lists.
+        """
+        live = np.flatnonzero(~self.deleted)
+        picked = np.random.default_rng(seed).choice(live, size=min(queries, len(live)), replace=False)
+        recalls, ann_ms, exact_ms = [], [], []
+        for row in picked:
+            query = np.asarray(self.vectors[row])
+            started = time.perf_counter()
+            exact_rows, _ = self.search_vector(query, k=k + 1, exact=True)
+            exact_ms.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            ann_rows, _ = self.search_vector(query, k=k + 1, nprobe=nprobe)
+            ann_ms.append((time.perf_counter() - started) * 1000)
+            expected = set(exact_rows.tolist()) - {int(row)}
+            found = set(ann_rows.tolist()) - {int(row)}
+            recalls.append(len(expected & found) / max(1, len(expected)))
+        return {
+            "vectors": int(len(live)),
+            "queries": len(picked),
+            "k": k,
+            "nprobe": 0 if self.centroids is None else self.probes(nprobe),
+            "lists": 0 if self.centroids is None else len(self.centroids),
+            "recall": float(np.mean(recalls)),
+            "ann_ms_mean": float(np.mean(ann_ms)),
+            "ann_ms_p95": float(np.percentile(ann_ms, 95)),
+            "exact_ms_mean": float(np.mean(exact_ms)),
+            "exact_ms_p95": float(np.percentile(exact_ms, 95)),
+        }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Build, query or evaluate the vector index")
+    parser.add_argument("--index", default=VECTOR_INDEX_DIR, required=VECTOR_INDEX_DIR is None)
+    parser.add_argument("--embedder", default=None, help="'hashing[-dim]' or 'sentence-transformers:<model>'")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="embed cases and legislation, then build the IVF")
+    build.add_argument("--journal", help="crawl journal holding the scraped cases")
+    build.add_argument("--constitution-json", help="constitution tree saved as JSON")
+    build.add_argument("--legislation-dir", help="directory of act hierarchies written by legislation.py")
+    build.add_argument("--chunks", help="also index every chunk in this chunk store (see chunking.py)")
+    build.add_argument("--lists", type=int, help="number of IVF lists")
+    search = commands.add_parser("search", help="run a query")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=10)
+    search.add_argument("--nprobe", type=int, default=VECTOR_NPROBE, help="lists to scan (0: a fraction of them)")
+    search.add_argument("--court")
+    search.add_argument("--station")
+    search.add_argument("--from", dest="date_from")
+    search.add_argument("--to", dest="date_to")
+    search.add_argument("--kind")
+    evaluate = commands.add_parser("evaluate", help="recall and latency of IVF against exact search")
+    evaluate.add_argument("--queries", type=int, default=200)
+    evaluate.add_argument("-k", type=int, default=10)
+    evaluate.add_argument("--nprobe", type=int, default=VECTOR_NPROBE, help="lists to scan (0: a fraction of them)")
+    args = parser.parse_args()
+
+    index = VectorIndex(args.index, embedder=get_embedder(args.embedder) if args.embedder else None)
+    if args.command == "build":
+        started = time.perf_counter()
+        if args.journal:
+            from data_acquisition.crawl_journal import CrawlJournal
+            journal = CrawlJournal(args.journal)
+            # One add() over the whole journal, so rows are appended in full batches
+            index.add(document for station_url, case_url, data in journal.iter_cases()
+                      for document in case_documents(case_url, data, station=station_url))
+            journal.close()
+        if args.constitution_json:
+            with open(args.constitution_json, encoding="utf-8") as f:
+                index.add_legislation(json.load(f))
+        if args.legislation_dir:
+            for name in sorted(os.listdir(args.legislation_dir)):
+                if name.endswith(".json"):
+                    with open(os.path.join(args.legislation_dir, name), encoding="utf-8") as f:
+                        hierarchy = json.load(f)
+                    index.add_legislation(hierarchy, source=hierarchy.get("source", name), kind="legislation")
+        if args.chunks:
+            from data_acquisition.chunking import ChunkStore
+            store = ChunkStore(args.chunks)
+            index.add(store.iter_chunks())
+            store.close()
+        logger.info(f"Embedded {len(index.records)} units in {time.perf_counter() - started:.1f}s")
+        index.build_ann(lists=args.lists)
+    elif args.command == "search":
+        filters = {name: getattr(args, name) for name in ("court", "station", "date_from", "date_to", "kind")
+                   if getattr(args, name) is not None}
+        for hit in index.search(args.query, k=args.k, nprobe=args.nprobe, **filters):
+            print(f"{hit['score']:.3f}  {hit.get('citation') or hit.get('title')}  {hit['key']}")
+            print(f"    {hit['text'][:200]}")
+    else:
+        print(json.dumps(index.evaluate(queries=args.queries, k=args.k, nprobe=args.nprobe), indent=2))
+
+
+if __name__ == "__main__":
+    main()
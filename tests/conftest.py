@@ -0,0 +1,48 @@
+import pytest
+
+from benchmarks.fixtures import FixtureServer, LISTING_PATH, generate
+from data_acquisition.page_cache import configure_cache
+from data_acquisition.throttle import configure_throttle
+
+@pytest.fixture(scope="session")
+def fixture_cases():
+    """How many judgments the fixture site lists"""
+    return 25
+
+
+@pytest.fixture(scope="session")
+def fixture_dir(tmp_path_factory, fixture_cases):
+    directory = tmp_path_factory.mktemp("fixtures")
+    generate(str(directory), cases=fixture_cases, paragraphs=3, chapters=2, sections=3)
+    return str(directory)
+
+
+@pytest.fixture(scope="session")
+def site(fixture_dir):
+    with FixtureServer(fixture_dir) as server:
+        yield server
+
+
+@pytest.fixture
+def listing_url(site):
+    return f"{site.base_url}{LISTING_PATH}?page="
+
+
+@pytest.fixture
+def make_case():
+    """A factory of small parsed cases: make_case(number, paragraphs=3, court=..., topic=...)"""
+    def make(number=1, paragraphs=3, court="Benchmark Court", topic="land tenure and succession"):
+        return {
+            "Header": {"authority": court, "neutral-citation": f"[2020] KEBENCH {number} (KLR)", "date": "1 March 2020"},
+            "Body": {str(p): f"case {number} paragraph {p} on {topic}" for p in range(1, paragraphs + 1)},
+        }
+    return make
+
+
+@pytest.fixture(autouse=True)
+def direct_fetches():
+    """Fetch straight from the fixture servers: no page cache, no throttle unless a test sets one up"""
+    configure_cache(None)
+    configure_throttle(False)
+    yield
+    configure_throttle(False)
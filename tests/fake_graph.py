@@ -0,0 +1,211 @@
+"""An in-memory stand-in for the Neo4j transactions run by graph_writer, graph_upsert and graph_diff.
+
+Each statement those modules send is recognised by its shape and applied
+to a dict of nodes and a list of edges. Element ids are strings ("n1",
+"n2", ...) so, as in Neo4j, sorting them does not give creation order.
+"""
+import contextlib
+import re
+
+
+class Result:
+    def __init__(self, records=()):
+        self.records = list(records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def single(self):
+        return self.records[0] if self.records else None
+
+    def consume(self):
+        return None
+
+
+class FakeGraph:
+    def __init__(self):
+        self.nodes = {}
+        self.edges = []
+        self.statements = []
+        self._next = 0
+
+    # Graph operations
+
+    def create(self, labels, props=None):
+        self._next += 1
+        node_id = f"n{self._next}"
+        self.nodes[node_id] = {"labels": set(labels), "props": dict(props or {})}
+        return node_id
+
+    def merge(self, labels, **keys):
+        """(node id, created) of the node with labels and keys, creating it if there is none"""
+        for node_id, node in self.nodes.items():
+            if set(labels) <= node["labels"] and all(node["props"].get(k) == v for k, v in keys.items()):
+                return node_id, False
+        return self.create(labels, keys), True
+
+    def relate(self, start, rel_type, end, merge=False):
+        if merge and (start, rel_type, end) in self.edges:
+            return
+        self.edges.append((start, rel_type, end))
+
+    def children(self, node_id):
+        return [end for start, rel_type, end in self.edges if start == node_id and rel_type == "HAS_CHILD"]
+
+    def delete(self, node_id):
+        for child in self.children(node_id):
+            self.delete(child)
+        self.nodes.pop(node_id, None)
+        self.edges = [edge for edge in self.edges if node_id not in (edge[0], edge[2])]
+
+    def labelled(self, label):
+        return [node_id for node_id, node in self.nodes.items() if label in node["labels"]]
+
+    def tree(self, node_id):
+        """(labels, props, [child trees]) below node_id, children in creation order, for comparing shapes"""
+        node = self.nodes[node_id]
+        return (sorted(node["labels"]), node["props"], [self.tree(child) for child in self.children(node_id)])
+
+    def counts(self):
+        return len(self.nodes), len(self.edges)
+
+    # Statements
+
+    def run(self, query, **params):
+        query = " ".join(query.split())
+        self.statements.append(query)
+        for pattern, handler in self.HANDLERS:
+            match = re.search(pattern, query)
+            if match:
+                return Result(handler(self, match, **params))
+        raise NotImplementedError(f"FakeGraph does not understand: {query}")
+
+    def _segment(self, match, name):
+        return [{"node_id": self.merge(["Segment"], name=name)[0]}]
+
+    def _classification(self, match, segment_id, name):
+        node_id, _ = self.merge(["Classification"], name=name)
+        self.relate(node_id, "BELONGS_TO", segment_id, merge=True)
+        return [{"node_id": node_id}]
+
+    def _courts(self, match, classification_id, rows):
+        records = []
+        for row in rows:
+            node_id, created = self.merge(["Court"], link=row["link"])
+            if created:
+                self.nodes[node_id]["props"]["name"] = row["name"]
+            self.relate(node_id, "BELONGS_TO", classification_id, merge=True)
+            records.append({"link": row["link"], "node_id": node_id})
+        return records
+
+    def _stations(self, match, rows):
+        records = []
+        for row in rows:
+            node_id, created = self.merge(["Station"], link=row["key"])
+            if created:
+                self.nodes[node_id]["props"]["name"] = row["name"]
+            self.relate(node_id, "PART_OF", row["court_id"], merge=True)
+            records.append({"court": row["court"], "name": row["name"], "node_id": node_id})
+        return records
+
+    def _cases(self, match, parent_id, rows):
+        records = []
+        for row in rows:
+            node_id, created = self.merge(["Node", "Case"], key=row["key"])
+            if created:
+                self.nodes[node_id]["props"].update(name="case", link=row["link"], citation=row["citation"])
+            self.relate(parent_id, "HAS_CHILD", node_id, merge=True)
+            records.append({"key": row["key"], "node_id": node_id, "created": created})
+        return records
+
+    def _root_merge(self, match, key):
+        node_id, created = self.merge([match.group(1)], key=key)
+        return [{"node_id": node_id, "created": created}]
+
+    def _root_create(self, match, props):
+        return [{"node_id": self.create([match.group(1)], props)}]
+
+    def _child_create(self, match, rows):
+        records = []
+        for row in rows:
+            node_id = self.create([match.group(1)], row["props"])
+            self.relate(row["parent"], "HAS_CHILD", node_id)
+            records.append({"tmp": row["tmp"], "node_id": node_id})
+        return records
+
+    def _set_props(self, match, node_id, props):
+        self.nodes[node_id]["props"].update(props)
+        return []
+
+    def _append_items(self, match, node_id, key, items):
+        props = self.nodes[node_id]["props"]
+        props[key] = list(props.get(key) or []) + list(items)
+        return []
+
+    def _root_hashes(self, match, rows):
+        for row in rows:
+            self.nodes[row["id"]]["props"]["content_hash"] = row["content_hash"]
+        return []
+
+    def _read_root_hashes(self, match, ids):
+        return [{"id": node_id, "content_hash": self.nodes[node_id]["props"].get("content_hash")}
+                for node_id in ids if node_id in self.nodes]
+
+    def _read_children(self, match, ids):
+        records = []
+        for parent in ids:
+            for child in self.children(parent):
+                props = self.nodes[child]["props"]
+                records.append({"parent": parent, "id": child, "name": props.get("name"),
+                                "child_key": props.get("child_key"), "props_hash": props.get("props_hash"),
+                                "content_hash": props.get("content_hash")})
+        # ORDER BY parent, id: element id strings, not creation order
+        return sorted(records, key=lambda record: (record["parent"], record["id"]))
+
+    def _replace_props(self, match, rows):
+        for row in rows:
+            self.nodes[row["id"]]["props"] = dict(row["props"])
+        return []
+
+    def _delete(self, match, ids):
+        for node_id in ids:
+            self.delete(node_id)
+        return []
+
+    HANDLERS = [
+        (r"MERGE \(s:Segment \{name: \$name\}\)", _segment),
+        (r"MERGE \(c:Classification \{name: \$name\}\)", _classification),
+        (r"MERGE \(co:Court \{link: row\.link\}\)", _courts),
+        (r"MERGE \(s:Station \{link: row\.key\}\)", _stations),
+        (r"MERGE \(c:Node:Case \{key: row\.key\}\)", _cases),
+        (r"MERGE \(n:(\w+) \{key: \$key\}\)", _root_merge),
+        (r"^CREATE \(n:(\w+)\) SET n \+= \$props", _root_create),
+        (r"CREATE \(p\)-\[:HAS_CHILD\]->\(n:(\w+)\) SET n = row\.props", _child_create),
+        (r"WHERE elementId\(n\) = \$node_id SET n \+= \$props", _set_props),
+        (r"SET n\[\$key\] = coalesce", _append_items),
+        (r"SET n\.content_hash = row\.content_hash", _root_hashes),
+        (r"RETURN id, n\.content_hash", _read_root_hashes),
+        (r"MATCH \(p\)-\[:HAS_CHILD\]->\(c\) WHERE elementId\(p\) = id", _read_children),
+        (r"WHERE elementId\(n\) = row\.id SET n = row\.props", _replace_props),
+        (r"DETACH DELETE n", _delete),
+    ]
+
+
+class FakeSession:
+    """Runs statements and transaction functions against a FakeGraph, like a neo4j session"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, query, **params):
+        return self.graph.run(query, **params)
+
+    def execute_write(self, work, *args, **kwargs):
+        return work(self.graph, *args, **kwargs)
+
+    execute_read = execute_write
+
+
+def session_factory(graph):
+    """A stand-in for neo4j_pool.session that opens FakeSessions on graph"""
+    return lambda **kwargs: contextlib.nullcontext(FakeSession(graph))
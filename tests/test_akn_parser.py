@@ -0,0 +1,116 @@
+import os
+
+import pytest
+
+from data_acquisition.akn_parser import AknParseError, parse_act, parse_constitution_file, parse_constitution_html
+from data_acquisition.fetcher import parse_html
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "constitution.html")
+
+# What the Selenium getCoverPage/getChapter walk returned for the saved page
+EXPECTED = {
+    "cover page": {
+        "title": "The Constitution of Kenya, 2010",
+        "publication_info": "Published in Kenya Gazette Supplement No. 55",
+        "assent_date": "Assented to on 27 August 2010",
+        "commencement_date": "Commenced on 27 August 2010",
+        "preamble": [
+            "We, the people of Kenya—",
+            "ACKNOWLEDGING the supremacy of the Almighty God of all creation:",
+            "HONOURING those who heroically struggled to bring freedom and justice to our land:",
+        ],
+    },
+    "content": {
+        "CHAPTER ONE": {
+            "title": "Chapter ONE – SOVEREIGNTY OF THE PEOPLE AND SUPREMACY OF THIS CONSTITUTION",
+            "sections": {
+                "Section 1": {
+                    "title": "1. Sovereignty of the people",
+                    "sub_sections": {
+                        "Subsection 1": {
+                            "number": "(1)",
+                            "sub_sections": {
+                                "point": "All sovereign power belongs to the people of Kenya and shall be "
+                                         "exercised only in accordance with this Constitution."
+                            },
+                        },
+                        "Subsection 2": {
+                            "number": "(2)",
+                            "sub_sections": {
+                                "intro": "Sovereign power under this Constitution is delegated to the "
+                                         "following State organs—",
+                                "paragraphs": {
+                                    "Paragraph a": {
+                                        "letter": "(a)",
+                                        "content": "Parliament and the legislative assemblies in the county governments;",
+                                    },
+                                    "Paragraph b": {
+                                        "letter": "(b)",
+                                        "content": "the national executive and the executive structures in the "
+                                                   "county governments; and",
+                                    },
+                                },
+                            },
+                        },
+                    },
+                },
+                "Section 2": {
+                    "title": "2. Supremacy of this Constitution",
+                    "Content": {"point": "This Constitution is the supreme law of the Republic."},
+                },
+            },
+        },
+        "CHAPTER TWELVE": {
+            "title": "Chapter TWELVE – PUBLIC FINANCE",
+            "sections": {
+                "Part 1": {
+                    "title": "Part 1 – PRINCIPLES AND FRAMEWORK OF PUBLIC FINANCE",
+                    "Sections": {
+                        "Section 201": {
+                            "title": "201. Principles of public finance",
+                            "Content": {
+                                "intro": "The following principles shall guide all aspects of public finance "
+                                         "in the Republic—",
+                                "paragraphs": {
+                                    "Paragraph a": {
+                                        "letter": "(a)",
+                                        "content": "there shall be openness and accountability;",
+                                    },
+                                },
+                            },
+                        },
+                    },
+                },
+                "Part 2": {
+                    "title": "Part 2 – OTHER PUBLIC FUNDS",
+                    "Sections": {
+                        "Section 206": {
+                            "title": "206. Consolidated Fund and other public funds",
+                            "sub_sections": {
+                                "Subsection 1": {
+                                    "number": "(1)",
+                                    "sub_sections": {"point": "There is established the Consolidated Fund."},
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+
+def test_saved_page_parses_to_the_getchapter_shape():
+    assert parse_constitution_file(FIXTURE) == EXPECTED
+
+
+def test_parse_act_matches_parse_constitution_for_chaptered_pages():
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+    assert parse_act(parse_html(html)) == EXPECTED
+
+
+def test_page_without_chapters_is_rejected():
+    with pytest.raises(AknParseError):
+        parse_constitution_html("<html><body><h1>Page not found</h1></body></html>")
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from benchmarks.fixtures import INDEX, FixtureServer, LISTING_PATH, generate
+from data_acquisition import constitution
+from data_acquisition.async_fetcher import AsyncFetcher
+from data_acquisition.case_law import async_crawler
+from data_acquisition.case_law.courts_and_tribunals.court_cases import iter_case_links
+from data_acquisition.crawl_journal import CrawlJournal
+from data_acquisition.case_law.taxonomy_parser import parse_elections
+from data_acquisition.fetcher import parse_html
+
+STATION_CASES = 5
+
+TAXONOMY_PAGES = {
+    "/": ('<html><body><div class="dropdown-menu">'
+          '<div class="dropdown-item"><a href="/judgments/court-class/superior-courts/">Superior Courts</a></div>'
+          '<div class="dropdown-item"><a href="/judgments/elections/">Elections</a></div>'
+          '</div></body></html>'),
+    "/judgments/court-class/superior-courts/": (
+        '<html><body><ul class="list-unstyled"><li><a href="/judgments/KEBENCH/">Benchmark Court</a></li></ul>'
+        '</body></html>'),
+    "/judgments/KEBENCH/": (
+        f'<html><body><ul class="list-unstyled"><li><a href="{LISTING_PATH}">Bench Station</a></li>'
+        '<li><a>Unlinked Station</a></li></ul></body></html>'),
+    "/judgments/elections/": (
+        '<html><body><div class="pt-4 pb-5"><ul>'
+        '<li><a href="/judgments/elections/2017/">2017</a> <a href="/judgments/elections/2013/">2013</a></li>'
+        '<li><a href="/judgments/elections/2022/">2022</a></li>'
+        '</ul></div></body></html>'),
+}
+
+
+@pytest.fixture
+def stub_site(tmp_path):
+    """The generated judgments plus a home page, a court, its stations and the Elections page"""
+    directory = str(tmp_path)
+    generate(directory, cases=STATION_CASES, paragraphs=2, chapters=1, sections=1)
+    with open(os.path.join(directory, INDEX), encoding="utf-8") as f:
+        index = json.load(f)
+    for number, (path, page) in enumerate(TAXONOMY_PAGES.items()):
+        name = f"taxonomy-{number}.html"
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(page)
+        index[path] = name
+    with open(os.path.join(directory, INDEX), "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    with FixtureServer(directory) as server:
+        yield server
+
+
+def test_parse_elections_keeps_every_anchor():
+    elections = parse_elections(parse_html(TAXONOMY_PAGES["/judgments/elections/"]))
+    assert [election["name"] for election in elections] == ["2017", "2013", "2022"]
+
+
+def test_crawl_builds_taxonomy_and_station_cases(stub_site):
+    taxonomy = asyncio.run(async_crawler.crawl(stub_site.base_url + "/", with_cases=True))
+    assert [c["classification"] for c in taxonomy] == ["Superior Courts", "Elections"]
+
+    court, = taxonomy[0]["courts"]
+    assert court["name"] == "Benchmark Court"
+    station, unlinked = court["stations"]
+    assert station["name"] == "Bench Station"
+    assert unlinked == {"name": "Unlinked Station", "link": ""}
+    citations = sorted(case["Header"]["neutral-citation"] for case in station["cases"])
+    assert len(citations) == STATION_CASES
+    assert "[2001] KEBENCH 1 (KLR)" in citations
+
+    assert [court["name"] for court in taxonomy[1]["courts"]] == ["2017", "2013", "2022"]
+
+
+def test_missing_judgment_and_listing_return_nothing(stub_site):
+    async def run():
+        async with AsyncFetcher() as fetcher:
+            case = await async_crawler.getCaseContent(fetcher, stub_site.base_url + "/akn/ke/judgment/none/eng")
+            links = await async_crawler.getCaseLinks(fetcher, stub_site.base_url + "/judgments/NONE/?page=")
+            return case, links
+    assert asyncio.run(run()) == (None, [])
+
+
+def test_async_listing_walk_matches_the_threaded_one(stub_site, tmp_path):
+    url = stub_site.base_url + LISTING_PATH + "?page="
+    journal = CrawlJournal(str(tmp_path / "journal.db"))
+
+    async def run():
+        async with AsyncFetcher() as fetcher:
+            return await async_crawler.getCaseLinks(fetcher, url, journal=journal)
+    links = asyncio.run(run())
+    assert links == list(iter_case_links(None, url))
+    assert len(links) == STATION_CASES
+    assert journal.listing_progress(url)[1:] == (links, True)
+    journal.close()
+
+
+def test_constitution_is_crawled_with_the_static_parser(stub_site, monkeypatch):
+    monkeypatch.setattr(constitution, "BASE_URL", stub_site.base_url)
+    expected = constitution.scrape_constitution_data()
+    assert asyncio.run(async_crawler.crawl_constitution(stub_site.base_url + "/")) == expected
+    assert expected["cover page"]["title"]
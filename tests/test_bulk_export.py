@@ -0,0 +1,103 @@
+import csv
+import os
+
+import pytest
+
+from data_acquisition.bulk_export import (
+    ARRAY_DELIMITER,
+    BulkExportWriter,
+    export_constitution,
+    export_taxonomy,
+)
+
+CASE = {"Header": {"title": "A v B", "neutral-citation": "[2020] KEHC 1 (KLR)"},
+        "Body": {"1.": "Held; dismissed, with costs."}}
+
+TAXONOMY = [{
+    "classification": "Superior Courts",
+    "courts": [{
+        "name": "High Court",
+        "link": "/judgments/KEHC/",
+        "stations": [
+            {"name": "Nairobi", "link": "/judgments/KEHC/NRB/", "cases": [CASE]},
+            {"name": "Nairobi", "link": "/judgments/KEHC/NRB/", "cases": [CASE]},
+            {"name": "Mombasa", "link": "/judgments/KEHC/MSA/"},
+        ],
+    }],
+}]
+
+CONSTITUTION = {
+    "cover page": {"title": "The Constitution of Kenya", "preamble": ["We, the people; of Kenya", "ACKNOWLEDGING"]},
+    "content": {"CHAPTER ONE": {"title": "Sovereignty", "Section 1": {"title": "Sovereignty of the people"}}},
+}
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    return rows[0], rows[1:]
+
+
+@pytest.fixture
+def exported(tmp_path):
+    with BulkExportWriter(str(tmp_path)) as writer:
+        export_taxonomy(writer, TAXONOMY)
+        export_constitution(writer, CONSTITUTION)
+    return writer
+
+
+def test_writes_one_file_per_label_and_type(exported, tmp_path):
+    assert sorted(os.listdir(tmp_path)) == [
+        "nodes_Classification.csv", "nodes_Constitution.csv", "nodes_Court.csv", "nodes_Node.csv",
+        "nodes_Segment.csv", "nodes_Station.csv",
+        "rels_BELONGS_TO.csv", "rels_HAS_CHILD.csv", "rels_PART_OF.csv",
+    ]
+
+
+def test_duplicate_station_is_exported_and_linked_once(exported):
+    _, stations = read_csv(exported.node_files()["Station"])
+    assert sorted(row[-2] for row in stations) == ["Mombasa", "Nairobi"]
+    _, part_of = read_csv(exported.relationship_files()["PART_OF"])
+    assert len(part_of) == 2
+    assert len({tuple(row) for row in part_of}) == 2
+
+
+def test_relationships_reference_exported_nodes(exported):
+    ids = set()
+    for path in exported.node_files().values():
+        _, rows = read_csv(path)
+        ids.update(row[0] for row in rows)
+    for path in exported.relationship_files().values():
+        header, rows = read_csv(path)
+        assert header == [":START_ID", ":END_ID", ":TYPE"]
+        for start, end, _ in rows:
+            assert start in ids and end in ids
+    _, nodes = read_csv(exported.node_files()["Node"])
+    _, has_child = read_csv(exported.relationship_files()["HAS_CHILD"])
+    assert len(has_child) == len(nodes)
+
+
+def test_array_items_keep_their_semicolons(exported):
+    header, rows = read_csv(exported.node_files()["Node"])
+    assert "preamble:string[]" in header
+    assert header[0] == "id:ID" and header[-1] == ":LABEL"
+    cover_page, = [row for row in rows if row[header.index("name")] == "cover page"]
+    value = cover_page[header.index("preamble:string[]")]
+    assert value.split(ARRAY_DELIMITER) == ["We, the people; of Kenya", "ACKNOWLEDGING"]
+    assert "--array-delimiter=U+001F" in exported.import_command()
+
+
+def test_rejects_array_items_containing_the_delimiter(tmp_path):
+    with pytest.raises(ValueError):
+        with BulkExportWriter(str(tmp_path)) as writer:
+            export_constitution(writer, {"cover page": {"preamble": ["a" + ARRAY_DELIMITER + "b", "c"]}})
+
+
+def test_same_data_exports_same_ids(tmp_path):
+    ids = []
+    for run in ("first", "second"):
+        with BulkExportWriter(str(tmp_path / run)) as writer:
+            export_taxonomy(writer, TAXONOMY)
+        _, rows = read_csv(writer.node_files()["Node"])
+        ids.append(sorted(row[0] for row in rows))
+    assert ids[0] == ids[1]
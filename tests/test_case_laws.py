@@ -0,0 +1,57 @@
+import contextlib
+import itertools
+import re
+
+from data_acquisition import neo4j_pool
+from data_acquisition.case_law import case_laws
+from data_acquisition.crawl_journal import CrawlJournal
+
+
+class FakeSession:
+    """Answers the taxonomy CREATEs with fresh element ids and counts the nodes created per label"""
+
+    RETURNS = {"Segment": "node_id", "Classification": "classification_id", "Court": "court_id",
+               "Station": "station_id"}
+
+    def __init__(self):
+        self.created = {label: 0 for label in self.RETURNS}
+        self.ids = itertools.count(1)
+
+    def run(self, query, **params):
+        label = re.search(r"CREATE \(\w+:(\w+)", query).group(1)
+        self.created[label] += 1
+        record = {self.RETURNS[label]: f"{label}:{next(self.ids)}"}
+        return type("Result", (), {"single": lambda self: record})()
+
+
+TAXONOMY = [
+    {"classification": "Superior Courts", "courts": [
+        {"name": "High Court", "stations": [{"name": "Nairobi", "link": "/nairobi"},
+                                            {"name": "Mombasa", "link": "/mombasa"}]},
+        {"name": "Court of Appeal", "stations": []},
+    ]},
+    {"classification": "Subordinate Courts", "courts": [
+        {"name": "Magistrates Court", "stations": [{"name": "Kisumu", "link": "/kisumu"}]},
+    ]},
+]
+
+
+def test_resumed_taxonomy_reuses_written_nodes(tmp_path, monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(neo4j_pool, "session", lambda **kwargs: contextlib.nullcontext(session))
+    journal = CrawlJournal(str(tmp_path / "journal.db"))
+
+    # The first run is interrupted while crawling the second station of the first classification
+    first = case_laws.insert_taxonomy(iter(TAXONOMY), journal=journal)
+    crawled = [next(first), next(first)]
+    first.close()
+    assert session.created == {"Segment": 1, "Classification": 1, "Court": 2, "Station": 2}
+    assert not journal.get_state("taxonomy_written")
+
+    resumed = list(case_laws.insert_taxonomy(iter(TAXONOMY), journal=journal))
+    assert session.created == {"Segment": 1, "Classification": 2, "Court": 3, "Station": 3}
+    assert journal.get_state("taxonomy_written")
+    assert [station["name"] for station in resumed] == ["Nairobi", "Mombasa", "Court of Appeal", "Kisumu"]
+    assert [station["parent_id"] for station in resumed[:2]] == [station["parent_id"] for station in crawled]
+    assert all(station["parent_id"] for station in resumed)
+    journal.close()
@@ -0,0 +1,84 @@
+import re
+
+import numpy as np
+import pytest
+
+from data_acquisition.chunking import ChunkStore, chunk_case, count_tokens, pack
+
+
+def words(letter, count):
+    return " ".join(f"{letter}{number}" for number in range(count))
+
+
+CASE = {
+    "Header": {"neutral-citation": "[2020] KEHC 1 (KLR)", "authority": "High Court", "date": "1 March 2020"},
+    "Body": {"1.": words("a", 30), "2.": words("b", 30), "3.": words("c", 200), "4.": words("d", 5)},
+}
+
+
+@pytest.mark.parametrize("budget, overlap", [(7, 3), (20, 0), (50, 12), (1, 0)])
+def test_pack_keeps_budget_and_overlap(budget, overlap):
+    counts = np.random.default_rng(0).integers(1, 10, size=200)
+    spans = pack(counts, budget, overlap)
+    assert spans[0][0] == 0 and spans[-1][1] == len(counts)
+    previous_end = 0
+    for start, end in spans:
+        assert end > start
+        assert end - start == 1 or counts[start:end].sum() <= budget
+        # Pieces repeated from the previous span fit in the overlap, and every span moves on
+        assert start <= previous_end and counts[start:previous_end].sum() <= overlap
+        assert end > previous_end
+        previous_end = end
+
+
+def test_overlong_paragraph_is_cut_to_the_budget():
+    chunks = list(chunk_case("/kehc/1", CASE, budget=64, overlap=8))
+    assert all(chunk["tokens"] <= 64 for chunk in chunks)
+    # 200 tokens in windows of 64 - 8
+    assert sum("3." in chunk["paragraphs"] for chunk in chunks) == 4
+    # Every word of the long paragraph lands in some chunk, in order
+    found = re.findall(r"c\d+", " ".join(chunk["text"] for chunk in chunks))
+    assert list(dict.fromkeys(found)) == [f"c{number}" for number in range(200)]
+
+
+def test_chunks_carry_the_tail_of_the_previous_paragraph():
+    first, second = list(chunk_case("/kehc/1", CASE, budget=64, overlap=8))[:2]
+    assert first["paragraphs"] == ["1."]
+    assert second["paragraphs"] == ["1.", "2."]
+    assert second["text"].startswith("1. " + " ".join(f"a{number}" for number in range(22, 30)) + "\n\n2. b0")
+    assert second["tokens"] == 8 + 30 and count_tokens(second["text"]) == second["tokens"] + 4
+
+
+def test_chunks_carry_whole_paragraphs_that_fit_the_overlap():
+    case = {"Header": {}, "Body": {f"{number}.": words(chr(96 + number), 6) for number in range(1, 7)}}
+    chunks = list(chunk_case("/kehc/2", case, budget=20, overlap=6))
+    assert [chunk["paragraphs"] for chunk in chunks] == [[f"{number}.", f"{number + 1}."] for number in range(1, 6)]
+    assert chunks[0]["key"] == "/kehc/2#chunk-0" and chunks[0]["court"] == ""
+
+
+def test_chunk_store_skips_unchanged_sources(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.db"), budget=64, overlap=8)
+    chunks = store.add_case("/kehc/1", CASE, station="/nairobi")
+    assert chunks and all(chunk["station"] == "/nairobi" for chunk in chunks)
+    assert store.add_case("/kehc/1", CASE, station="/nairobi") is None
+    assert store.add_cases([("/kehc/1", CASE, "/nairobi"), ("/kehc/2", CASE, "/nairobi")]) == 1
+    amended = dict(CASE, Body=dict(CASE["Body"], **{"4.": "Appeal allowed."}))
+    assert store.add_case("/kehc/1", amended, station="/nairobi")[-1]["text"].endswith("Appeal allowed.")
+    assert list(store.iter_chunks(["/kehc/1"]))[-1]["text"].endswith("Appeal allowed.")
+    store.close()
+
+
+@pytest.mark.parametrize("setting", [{"budget": 128}, {"overlap": 16}])
+def test_chunk_store_rechunks_when_settings_change(tmp_path, setting):
+    path = str(tmp_path / "chunks.db")
+    store = ChunkStore(path, budget=64, overlap=8)
+    store.add_case("/kehc/1", CASE)
+    store.close()
+    unchanged = ChunkStore(path, budget=64, overlap=8)
+    assert unchanged.add_case("/kehc/1", CASE) is None
+    unchanged.close()
+    store = ChunkStore(path, **dict({"budget": 64, "overlap": 8}, **setting))
+    chunks = store.add_case("/kehc/1", CASE)
+    assert chunks == list(chunk_case("/kehc/1", CASE, "", store.budget, store.overlap))
+    assert store.stats() == {"sources": 1, "chunks": len(chunks)}
+    store.close()
@@ -0,0 +1,75 @@
+import json
+import os
+
+from data_acquisition.corpus_store import PENDING, CorpusStore, export_journal
+
+
+def link(number):
+    return f"/akn/ke/judgment/kebench/{number}/eng"
+
+
+def stored_links(store):
+    return sorted(row["link"] for row in store.iter_rows())
+
+
+def test_unsharded_cases_survive_a_crash(tmp_path, make_case):
+    store = CorpusStore(str(tmp_path), shard_rows=5000)
+    assert store.add_cases([(link(n), make_case(n)) for n in range(1, 4)], station="s") == 3
+    # No close(): the process dies with every case still buffered
+    reopened = CorpusStore(str(tmp_path), shard_rows=5000)
+    assert reopened.stats()["buffered"] == 3
+    reopened.close()
+    assert stored_links(CorpusStore(str(tmp_path))) == sorted(link(n) for n in range(1, 4))
+
+
+def test_torn_pending_row_is_dropped(tmp_path, make_case):
+    store = CorpusStore(str(tmp_path))
+    store.add_cases([(link(1), make_case(1))])
+    with open(os.path.join(str(tmp_path), PENDING), "a", encoding="utf-8") as f:
+        f.write('{"link": "/akn/ke/judg')
+    reopened = CorpusStore(str(tmp_path))
+    reopened.close()
+    assert stored_links(reopened) == [link(1)]
+
+
+def test_links_are_stored_once(tmp_path, make_case):
+    store = CorpusStore(str(tmp_path), shard_rows=2)
+    assert store.add_cases([(link(n), make_case(n)) for n in (1, 2, 3)]) == 3
+    assert store.add_cases([(link(n), make_case(n)) for n in (2, 3, 4)]) == 1
+    store.close()
+    reopened = CorpusStore(str(tmp_path), shard_rows=2)
+    assert not reopened.add_case(link(1), make_case(1))
+    reopened.close()
+    assert stored_links(reopened) == sorted(link(n) for n in (1, 2, 3, 4))
+    assert reopened.stats()["cases"] == 4
+
+
+def test_crash_after_shard_before_truncate_does_not_duplicate(tmp_path, make_case):
+    store = CorpusStore(str(tmp_path), shard_rows=1000)
+    store.add_cases([(link(n), make_case(n)) for n in (1, 2)])
+    with open(os.path.join(str(tmp_path), PENDING), encoding="utf-8") as f:
+        pending = f.read()
+    store.close()
+    # As if the process died between writing the manifest and truncating pending.jsonl
+    with open(os.path.join(str(tmp_path), PENDING), "w", encoding="utf-8") as f:
+        f.write(pending)
+    reopened = CorpusStore(str(tmp_path))
+    assert reopened.stats()["buffered"] == 0
+    reopened.close()
+    assert reopened.stats()["cases"] == 2
+
+
+class Journal:
+    def __init__(self, cases):
+        self.cases = cases
+
+    def iter_cases(self):
+        return iter(self.cases)
+
+
+def test_reexport_appends_nothing(tmp_path, make_case):
+    journal = Journal([("s", link(n), make_case(n)) for n in range(1, 6)])
+    assert export_journal(journal, CorpusStore(str(tmp_path))) == 5
+    assert export_journal(journal, CorpusStore(str(tmp_path))) == 0
+    with open(os.path.join(str(tmp_path), "manifest.json"), encoding="utf-8") as f:
+        assert sum(shard["rows"] for shard in json.load(f)["shards"]) == 5
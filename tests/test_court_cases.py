@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from benchmarks.fixtures import FixtureServer, judgment_page
+from data_acquisition.case_law.courts_and_tribunals.case_parser import StaticParseError, parse_case
+from data_acquisition.case_law.courts_and_tribunals.court_cases import getCaseContent, iter_case_links
+from data_acquisition.fetcher import parse_html
+
+
+class RecordingDriver:
+    """Stands in for the browser fallback: records page loads and finds nothing"""
+
+    def __init__(self):
+        self.loaded = []
+
+    def get(self, url):
+        self.loaded.append(url)
+
+    def find_element(self, *args):
+        raise LookupError("no browser in tests")
+
+
+def test_parse_case_reads_header_and_paragraphs():
+    case = parse_case(parse_html(judgment_page(random.Random(0), 7, paragraphs=3)))
+    header = case["Header"]
+    assert header["neutral-citation"] == "[2007] KEBENCH 7 (KLR)"
+    assert header["authority"] == "Benchmark Court"
+    assert header["docket"] == "Petition 7 of 2007"
+    assert header["title"].startswith("Petitioner 7 v Respondent 7")
+    assert header["Petitioner"] == "Petitioner 7"
+    assert header["Respondent"] == "Respondent 7"
+    assert list(case["Body"]) == ["1.", "2.", "3."]
+    assert all(text.endswith("(KLR).") for text in case["Body"].values())
+
+
+def test_parse_case_rejects_pages_without_judgment_markup():
+    with pytest.raises(StaticParseError):
+        parse_case(parse_html("<html><body><p>Maintenance</p></body></html>"))
+
+
+def test_iter_case_links_walks_every_listing_page(listing_url, fixture_cases):
+    links = list(iter_case_links(None, listing_url))
+    assert len(links) == fixture_cases
+    assert links[0].endswith("/kebench/1/eng")
+    assert links[-1].endswith(f"/kebench/{fixture_cases}/eng")
+
+
+def test_get_case_content_parses_statically(site):
+    driver = RecordingDriver()
+    case = getCaseContent(driver, f"{site.base_url}/akn/ke/judgment/kebench/3/eng")
+    assert case["Header"]["neutral-citation"] == "[2003] KEBENCH 3 (KLR)"
+    assert driver.loaded == []
+
+
+def test_get_case_content_skips_missing_judgments_without_browser(site):
+    driver = RecordingDriver()
+    assert getCaseContent(driver, f"{site.base_url}/akn/ke/judgment/kebench/missing/eng") is None
+    assert driver.loaded == []
+
+
+def test_get_case_content_falls_back_to_browser_on_server_errors(fixture_dir):
+    driver = RecordingDriver()
+    with FixtureServer(fixture_dir, error_rate=1.0) as server:
+        link = f"{server.base_url}/akn/ke/judgment/kebench/3/eng"
+        assert getCaseContent(driver, link) is None
+    assert driver.loaded == [link]
+
+
+def test_static_parse_failures_are_counted(listing_url):
+    from data_acquisition.metrics import REGISTRY
+
+    before = REGISTRY.counter("stage_errors_total", stage="static_parse_case")
+    driver = RecordingDriver()
+    # A listing page is served fine but has no judgment markup
+    assert getCaseContent(driver, f"{listing_url}1") is None
+    assert REGISTRY.counter("stage_errors_total", stage="static_parse_case") == before + 1
+    assert driver.loaded == [f"{listing_url}1"]
+
+
+class FailingCorpus:
+    def add_cases(self, cases, station=""):
+        raise OSError("disk full")
+
+
+def test_cases_are_journaled_only_after_the_corpus_has_them(tmp_path, listing_url, fixture_cases, monkeypatch):
+    from data_acquisition.case_law.courts_and_tribunals import court_cases
+    from data_acquisition.corpus_store import CorpusStore
+    from data_acquisition.crawl_journal import CrawlJournal
+
+    monkeypatch.setattr(court_cases, "insert_hierarchy", lambda tree: "root")
+    monkeypatch.setattr(court_cases, "insert_with_parent", lambda parent_id, tree: None)
+    monkeypatch.setattr(court_cases.graph_queries, "invalidate", lambda *scopes: None)
+    journal = CrawlJournal(str(tmp_path / "journal.sqlite"))
+    with pytest.raises(OSError):
+        court_cases.scrape_court_data(url=listing_url, driver=RecordingDriver(), journal=journal,
+                                      corpus=FailingCorpus(), batch_size=10)
+    assert not journal.stored_case_links(court_cases.listing_url(listing_url))
+
+    corpus = CorpusStore(str(tmp_path / "corpus"))
+    count = court_cases.scrape_court_data(url=listing_url, driver=RecordingDriver(), journal=journal,
+                                          corpus=corpus, batch_size=10)
+    assert count == fixture_cases
+    # Nothing flushed to a shard yet: the pending file alone must hold every journaled case
+    recovered = CorpusStore(str(tmp_path / "corpus"))
+    assert recovered.stats()["buffered"] == fixture_cases
+    journal.close()
@@ -0,0 +1,81 @@
+import pytest
+
+from data_acquisition.crawl_journal import CrawlJournal
+
+LISTING = "https://kenyalaw.example/judgments/KEHC/nairobi/?page="
+STATION = "https://kenyalaw.example/judgments/KEHC/nairobi/"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal.db")
+
+
+@pytest.fixture
+def journal(path):
+    journal = CrawlJournal(path)
+    yield journal
+    journal.close()
+
+
+def test_listing_progress_trusts_only_a_contiguous_run_of_pages(journal):
+    assert journal.listing_progress(LISTING) == (1, [], False)
+    journal.record_listing_page(LISTING, 1, ["/a", "/b"])
+    journal.record_listing_page(LISTING, 2, ["/c"])
+    # Page 3 was never written, so page 4 can't be resumed from
+    journal.record_listing_page(LISTING, 4, ["/g"])
+    assert journal.listing_progress(LISTING) == (3, ["/a", "/b", "/c"], False)
+    journal.record_listing_page(LISTING, 3, ["/d", "/e"])
+    assert journal.listing_progress(LISTING) == (5, ["/a", "/b", "/c", "/d", "/e", "/g"], False)
+    journal.mark_listing_complete(LISTING)
+    assert journal.listing_progress(LISTING)[2]
+    assert journal.listing_progress(LISTING + "other") == (1, [], False)
+
+
+def test_listing_progress_without_a_first_page_starts_over(journal):
+    journal.record_listing_page(LISTING, 2, ["/c"])
+    assert journal.listing_progress(LISTING) == (1, [], False)
+
+
+def test_recorded_cases_round_trip(journal):
+    case = {"Header": {"neutral-citation": "[2020] KEHC 1 (KLR)", "title": "Wanjiku v Republic"},
+            "Body": {"1.": "Mahakama imeamua."}}
+    journal.record_case(STATION, "/kehc/1", case)
+    journal.record_case(STATION, "/kehc/2", {"Header": {}, "Body": {}})
+    journal.record_case("https://kenyalaw.example/judgments/KECA/", "/keca/1", case)
+    # Recording a case again replaces it
+    journal.record_case(STATION, "/kehc/2", case)
+    assert journal.stored_case_links(STATION) == {"/kehc/1", "/kehc/2"}
+    assert journal.stored_case_links("https://kenyalaw.example/judgments/KESC/") == set()
+    stored = {(station, link): data for station, link, data in journal.iter_cases()}
+    assert stored[(STATION, "/kehc/1")] == case
+    assert stored[(STATION, "/kehc/2")] == case
+    assert len(stored) == 3
+
+
+def test_stations_are_done_once_marked(journal):
+    assert not journal.is_station_done(STATION)
+    journal.mark_station_done(STATION, 12)
+    assert journal.is_station_done(STATION)
+    assert not journal.is_station_done(STATION + "?page=")
+    assert journal.stats()["stations"] == 1
+
+
+def test_state_survives_a_reopen(path):
+    journal = CrawlJournal(path)
+    journal.record_listing_page(LISTING, 1, ["/a"])
+    journal.record_case(STATION, "/a", {"Header": {}, "Body": {"1.": "Text."}})
+    journal.mark_station_done(STATION, 1)
+    journal.set_state("station_parent_ids", [["High Court", "Nairobi", "4:db:7"]])
+    journal.set_state("taxonomy_written", True)
+    journal.close()
+
+    reopened = CrawlJournal(path)
+    assert reopened.listing_progress(LISTING) == (2, ["/a"], False)
+    assert reopened.stored_case_links(STATION) == {"/a"}
+    assert reopened.is_station_done(STATION)
+    assert reopened.get_state("station_parent_ids") == [["High Court", "Nairobi", "4:db:7"]]
+    assert reopened.get_state("taxonomy_written") is True
+    assert reopened.get_state("missing", {}) == {}
+    assert reopened.stats() == {"listing_pages": 1, "listings": 0, "cases": 1, "stations": 1}
+    reopened.close()
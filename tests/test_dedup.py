@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from data_acquisition import dedup
+from data_acquisition.dedup import NearDuplicateIndex, lsh_params
+
+TEXT = " ".join(f"word{number % 97} clause{number % 13}" for number in range(400))
+
+
+def test_lsh_params_without_trapezoid(monkeypatch):
+    expected = lsh_params(0.85, 128)
+    monkeypatch.setattr(dedup, "_trapezoid", lambda y, x: float(np.sum((y[1:] + y[:-1]) * np.diff(x)) / 2))
+    assert lsh_params(0.85, 128) == expected
+
+
+def test_saved_index_finds_duplicates_after_reload(tmp_path):
+    path = str(tmp_path / "dedup.npz")
+    index = NearDuplicateIndex(path)
+    assert index.check("a", TEXT) == (None, 0.0)
+    index.close()
+    reloaded = NearDuplicateIndex(path)
+    canonical, similarity = reloaded.check("b", TEXT + " amended")
+    assert canonical == "a" and similarity >= reloaded.threshold
+
+
+@pytest.mark.parametrize("setting", [{"num_perm": 64}, {"shingle_size": 3}, {"threshold": 0.7}])
+def test_reload_with_other_settings_is_rejected(tmp_path, setting):
+    path = str(tmp_path / "dedup.npz")
+    index = NearDuplicateIndex(path)
+    index.check("a", TEXT)
+    index.close()
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(path, **setting)
+
+
+@pytest.mark.parametrize("text", ["", "Judgment reserved.", None])
+def test_text_without_shingles_is_never_a_duplicate(text):
+    index = NearDuplicateIndex(None)
+    assert index.check("a", text) == (None, 0.0)
+    assert index.check("b", text) == (None, 0.0)
+    assert index.check_case("c", {"Header": {}, "Body": {}}) == (None, 0.0)
+    assert index.stats()["documents"] == 0
@@ -0,0 +1,96 @@
+import copy
+
+import pytest
+
+from data_acquisition import graph_diff
+from data_acquisition.graph_upsert import _write_hashed
+from data_acquisition.graph_writer import write_tree
+from tests.fake_graph import FakeGraph
+
+DOCUMENT = {
+    "cover page": {"title": "The Constitution of Kenya", "preamble": ["We, the people of Kenya"]},
+    "CHAPTER ONE": {"title": "Sovereignty", "sections": [
+        {"title": f"Section {number}", "text": f"Text of section {number}."} for number in range(1, 12)
+    ] + [{"title": "Section 12", "subsections": [{"text": "(1) First."}, {"text": "(2) Second."}]}]},
+    "CHAPTER TWO": {"title": "The Republic", "sections": [{"title": "Section 13", "text": "Kenya is a republic."}]},
+}
+
+
+def stored(graph, node_id):
+    """{child_key or name: (props without hashes, children)} below node_id"""
+    tree = {}
+    for child in graph.children(node_id):
+        props = graph.nodes[child]["props"]
+        key = props.get("child_key") or props["name"]
+        tree[key] = ({k: v for k, v in props.items() if k not in graph_diff.HASH_PROPS}, stored(graph, child))
+    return tree
+
+
+def written(data, hashed=True):
+    graph = FakeGraph()
+    root = graph.create(["Constitution"], {"key": "constitution"})
+    if hashed:
+        _write_hashed(graph, [(root, data)])
+    else:
+        write_tree(graph, data, parent_id=root)
+    return graph, root
+
+
+def refreshed(graph, root, data):
+    """Apply the diff to data, check it leaves nothing to do, and return what was applied"""
+    summary = graph_diff.refresh_trees(graph, [(root, data)])
+    assert graph_diff.diff_trees(graph, [(root, data)]).is_empty()
+    return summary
+
+
+@pytest.fixture
+def document():
+    return copy.deepcopy(DOCUMENT)
+
+
+def test_unchanged_tree_gives_an_empty_plan(document):
+    graph, root = written(document)
+    plan = graph_diff.diff_trees(graph, [(root, document)])
+    assert plan.is_empty()
+    assert plan.unchanged_roots == 1 and graph.statements[-1].startswith("UNWIND $ids")
+
+
+def test_changed_paragraph_updates_it_and_its_ancestors_hashes(document):
+    graph, root = written(document)
+    document["CHAPTER ONE"]["sections"][10]["text"] = "Amended text of section 11."
+    plan = graph_diff.diff_trees(graph, [(root, document)])
+    assert not plan.creates and not plan.deletes
+    assert plan.hashes == [{"id": root, "content_hash": graph_diff.HashedNode(None, None, document).content_hash}]
+    chapter, section = plan.updates
+    assert graph.nodes[chapter["id"]]["props"]["name"] == "CHAPTER ONE"
+    assert set(chapter["props"]) == set(graph.nodes[chapter["id"]]["props"])
+    assert section["props"]["text"] == "Amended text of section 11." and section["props"]["child_key"] == "sections#10"
+    graph_diff.apply_plan(graph, plan)
+    assert graph_diff.diff_trees(graph, [(root, document)]).is_empty()
+    assert stored(graph, root) == stored(*written(document))
+
+
+def test_added_and_removed_subtrees(document):
+    graph, root = written(document)
+    document["CHAPTER THREE"] = {"title": "Citizenship", "sections": [{"title": "Section 14"}]}
+    del document["CHAPTER TWO"]
+    document["CHAPTER ONE"]["sections"].pop()
+    nodes = len(graph.nodes)
+    summary = refreshed(graph, root, document)
+    assert (summary["created"], summary["deleted"]) == (1, 2)
+    # Chapter three and its section in; chapter two, its section and section 12 with its subsections out
+    assert len(graph.nodes) == nodes + 2 - 5
+    assert stored(graph, root) == stored(*written(document))
+
+
+def test_trees_stored_without_hashes_are_backfilled(document):
+    graph, root = written(document, hashed=False)
+    assert not any("content_hash" in node["props"] for node in graph.nodes.values())
+    summary = refreshed(graph, root, document)
+    assert (summary["created"], summary["deleted"]) == (0, 0)
+    assert all("content_hash" in node["props"] for node_id, node in graph.nodes.items() if node_id != root)
+    assert stored(graph, root) == stored(*written(document))
+    # Items past the ninth are matched to the nodes created for them
+    chapter, = (node for node in graph.children(root) if graph.nodes[node]["props"]["name"] == "CHAPTER ONE")
+    sections = [graph.nodes[node]["props"] for node in graph.children(chapter)]
+    assert [props["child_key"] for props in sections] == [f"sections#{index}" for index in range(12)]
@@ -0,0 +1,144 @@
+import pytest
+
+from data_acquisition import graph_queries
+from data_acquisition.graph_queries import (CASE_BY_CITATION_QUERY, CHILDREN_QUERY, ROOT_LABELS_QUERY,
+                                            SUBTREE_QUERY, GraphQueries, QueryCache)
+
+
+class StandInGraph:
+    """A local stand-in for Neo4j: answers GraphQueries' Cypher from an in-memory tree and logs every call"""
+
+    def __init__(self):
+        self.nodes = {}
+        self.parent = {}
+        self.calls = []
+
+    def add(self, node_id, parent=None, labels=("Node",), **props):
+        self.nodes[node_id] = {"labels": list(labels), "props": props}
+        if parent is not None:
+            self.parent[node_id] = parent
+        return node_id
+
+    def children_of(self, node_id):
+        return [child for child, parent in self.parent.items() if parent == node_id]
+
+    def descendants(self, node_id):
+        for child in self.children_of(node_id):
+            yield node_id, child
+            yield from self.descendants(child)
+
+    def __call__(self, cypher, params):
+        self.calls.append((cypher, params))
+        if cypher == ROOT_LABELS_QUERY:
+            node_id = params["node_id"]
+            if node_id not in self.nodes:
+                return []
+            while node_id in self.parent:
+                node_id = self.parent[node_id]
+            return [{"labels": self.nodes[node_id]["labels"]}]
+        if cypher == CHILDREN_QUERY:
+            return [{"id": child, "props": dict(self.nodes[child]["props"])}
+                    for child in self.children_of(params["node_id"])]
+        if cypher == SUBTREE_QUERY:
+            node_id = params["node_id"]
+            if node_id not in self.nodes:
+                return []
+            root = dict(self.nodes[node_id]["props"])
+            rows = [{"root": root, "parent": parent, "id": child, "props": dict(self.nodes[child]["props"])}
+                    for parent, child in self.descendants(node_id)]
+            return rows or [{"root": root, "parent": None, "id": None, "props": None}]
+        if cypher == CASE_BY_CITATION_QUERY:
+            return [{"id": node_id, "header": dict(self.nodes[child]["props"])}
+                    for node_id, node in self.nodes.items()
+                    if "Case" in node["labels"] and node["props"].get("citation") in params["citations"]
+                    for child in self.children_of(node_id) if self.nodes[child]["props"].get("name") == "Header"]
+        if "-[:HAS_CHILD*]->(s:Node" in cypher:
+            return [{"id": child}
+                    for root, node in self.nodes.items()
+                    if f"(r:{node['labels'][0]}" in cypher and root not in self.parent
+                    and (params["key"] is None or node["props"].get("key") == params["key"])
+                    for _, child in self.descendants(root) if self.nodes[child]["props"].get("name") == params["name"]]
+        raise AssertionError(f"unexpected query {cypher}")
+
+    def count(self, cypher):
+        return sum(1 for called, _ in self.calls if called == cypher)
+
+
+@pytest.fixture
+def graph():
+    graph = StandInGraph()
+    graph.add("constitution", labels=("Constitution",), key="The Constitution of Kenya, 2010")
+    graph.add("chp1", "constitution", name="CHAPTER ONE", title="Sovereignty")
+    graph.add("sec1", "chp1", name="Section 1", title="Sovereignty of the people")
+    graph.add("act", labels=("Legislation",), key="/akn/ke/act/2012/18")
+    graph.add("act_sec1", "act", name="Section 1", title="Short title")
+    graph.add("station", labels=("Node", "Station"), name="Nairobi")
+    graph.add("case", "station", labels=("Node", "Case"), name="case", citation="[2019] KECA 123 (KLR)")
+    graph.add("header", "case", name="Header", title="A v B", **{"neutral-citation": "[2019] KECA 123 (KLR)"})
+    return graph
+
+
+@pytest.fixture
+def queries(graph):
+    return GraphQueries(runner=graph, cache=QueryCache(ttl=600))
+
+
+def test_children_are_cached_until_their_document_is_written(graph, queries):
+    assert [child["props"]["title"] for child in queries.children("chp1")] == ["Sovereignty of the people"]
+    graph.nodes["sec1"]["props"]["title"] = "Sovereignty"
+    assert queries.children("chp1")[0]["props"]["title"] == "Sovereignty of the people"
+    assert graph.count(CHILDREN_QUERY) == 1
+    # What constitution.insert_hierarchy and graph_diff invalidate after writing the document
+    graph_queries.invalidate("Constitution")
+    assert queries.children("chp1")[0]["props"]["title"] == "Sovereignty"
+
+
+def test_a_write_to_one_document_keeps_the_others_cached(queries, graph):
+    queries.subtree("chp1")
+    queries.children("act")
+    graph_queries.invalidate("Legislation")
+    queries.subtree("chp1")
+    queries.children("act")
+    assert graph.count(SUBTREE_QUERY) == 1
+    assert graph.count(CHILDREN_QUERY) == 2
+
+
+def test_case_subtrees_are_dropped_when_cases_are_written(queries, graph):
+    assert queries.subtree("case")["children"][0]["title"] == "A v B"
+    graph.nodes["header"]["props"]["title"] = "A v B and another"
+    # court_cases.write_batch invalidates "cases" and the station it wrote under, not the case node
+    graph_queries.invalidate("cases", "node:station")
+    assert queries.subtree("case")["children"][0]["title"] == "A v B and another"
+
+
+def test_invalidation_during_a_read_is_not_cached(queries, graph):
+    runner = graph.__call__
+
+    def invalidating_runner(cypher, params):
+        if cypher == CHILDREN_QUERY:
+            graph_queries.invalidate("Constitution")
+        return runner(cypher, params)
+
+    queries.runner = invalidating_runner
+    queries.children("chp1")
+    queries.children("chp1")
+    assert graph.count(CHILDREN_QUERY) == 2
+
+
+def test_sections_start_from_the_labelled_root(queries, graph):
+    assert queries.article(1)["title"] == "Sovereignty of the people"
+    assert queries.section(1, "Legislation", key="/akn/ke/act/2012/18")["title"] == "Short title"
+    section_queries = [cypher for cypher, _ in graph.calls if "(s:Node" in cypher]
+    assert "MATCH (r:Constitution)-" in section_queries[0]
+    assert "MATCH (r:Legislation {key: $key})-" in section_queries[1]
+    with pytest.raises(ValueError):
+        queries.section(1, "Constitution) DETACH DELETE (x")
+
+
+def test_case_by_citation_matches_case_nodes_on_the_canonical_citation(queries, graph):
+    found = queries.case_by_citation("[2019]  KECA 0123")
+    assert found["id"] == "case"
+    cypher, params = graph.calls[-1]
+    assert "(c:Case)" in cypher
+    assert "[2019] KECA 123 (KLR)" in params["citations"]
+    assert queries.case_by_citation("[2020] KECA 1 (KLR)") is None
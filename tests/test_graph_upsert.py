@@ -0,0 +1,65 @@
+import pytest
+
+from data_acquisition import graph_upsert, neo4j_pool
+from data_acquisition.case_law.courts_and_tribunals import court_cases
+from tests.fake_graph import FakeGraph, session_factory
+
+COURTS = [
+    {"name": "High Court", "link": "/judgments/KEHC/", "stations": [
+        {"name": "Nairobi", "link": "/judgments/KEHC/nairobi/"},
+        {"name": "Mombasa", "link": "/judgments/KEHC/mombasa/"},
+    ]},
+    {"name": "Court of Appeal", "link": "/judgments/KECA/", "stations": []},
+]
+
+
+def case(number, paragraphs=2):
+    return {"Header": {"neutral-citation": f"[2020] KEHC {number} (KLR)", "title": f"Case {number}"},
+            "Body": {f"{index}.": f"Paragraph {index} of case {number}." for index in range(1, paragraphs + 1)}}
+
+
+@pytest.fixture
+def graph():
+    return FakeGraph()
+
+
+def test_second_upsert_courts_creates_nothing(graph):
+    segment = graph_upsert.upsert_segment(graph, "Case Law")
+    classification = graph_upsert.upsert_classification(graph, segment, "Superior Courts")
+    first = graph_upsert.upsert_courts(graph, classification, COURTS)
+    counts = graph.counts()
+    assert graph_upsert.upsert_segment(graph, "Case Law") == segment
+    assert graph_upsert.upsert_classification(graph, segment, "Superior Courts") == classification
+    assert sorted(graph_upsert.upsert_courts(graph, classification, COURTS)) == sorted(first)
+    assert graph.counts() == counts
+    assert len(graph.labelled("Station")) == 2 and len(graph.labelled("Court")) == 2
+
+
+def test_second_upsert_cases_creates_nothing(graph):
+    parent = graph.create(["Station"], {"link": "/judgments/KEHC/nairobi/"})
+    cases = [(f"/akn/ke/judgment/kehc/{number}/eng", case(number)) for number in range(1, 4)]
+    assert graph_upsert.upsert_cases(graph, parent, cases) == 3
+    counts = graph.counts()
+    assert graph_upsert.upsert_cases(graph, parent, cases) == 0
+    assert graph.counts() == counts
+    assert len(graph.children(parent)) == 3
+
+
+def test_second_upsert_tree_creates_nothing(graph):
+    document = {"cover page": {"title": "The Constitution of Kenya"},
+                "CHAPTER ONE": {"title": "Sovereignty", "sections": [{"title": "1"}, {"title": "2"}]}}
+    root = graph_upsert.upsert_tree(graph, document)
+    counts = graph.counts()
+    assert graph_upsert.upsert_tree(graph, document) == root
+    assert graph.counts() == counts
+
+
+def test_rescraping_a_station_without_parent_reuses_its_root(listing_url, graph, monkeypatch):
+    monkeypatch.setattr(neo4j_pool, "session", session_factory(graph))
+    monkeypatch.setattr(court_cases.graph_queries, "invalidate", lambda *scopes: None)
+    monkeypatch.setattr(graph_upsert, "_enabled", True)
+    court_cases.scrape_court_data(None, listing_url, batch_size=10)
+    counts = graph.counts()
+    court_cases.scrape_court_data(None, listing_url, batch_size=10)
+    assert graph.counts() == counts
+    assert len(graph.labelled("Constitution")) == 1
@@ -0,0 +1,115 @@
+import os
+import random
+
+import pytest
+
+from benchmarks.fixtures import judgment_page
+from data_acquisition.akn_parser import parse_constitution_file
+from data_acquisition.case_law.courts_and_tribunals.case_parser import parse_case
+from data_acquisition.fetcher import parse_html
+from data_acquisition.graph_writer import write_subtrees, write_tree
+from tests.fake_graph import FakeGraph
+
+CONSTITUTION = os.path.join(os.path.dirname(__file__), "fixtures", "constitution.html")
+PRIMITIVE = (str, int, float, bool)
+
+
+def _primitive_props(data):
+    return {k: v for k, v in data.items()
+            if isinstance(v, PRIMITIVE) or (isinstance(v, list) and all(isinstance(x, PRIMITIVE) for x in v))}
+
+
+def create_nodes_recursively(tx, data, parent_id=None, node_label="Node"):
+    """The per-node writer graph_writer replaced, as of the baseline commit"""
+    if parent_id is None:
+        result = tx.run("CREATE (n:Constitution) SET n += $props RETURN elementId(n) AS node_id",
+                        props=_primitive_props(data))
+        parent_id = result.single()["node_id"]
+    for key, value in data.items():
+        if isinstance(value, (dict, list)):
+            for item in [value] if isinstance(value, dict) else value:
+                if isinstance(item, dict):
+                    query = "CREATE (n:" + node_label + " {name: $name}) SET n += $props RETURN elementId(n) AS node_id"
+                    child_id = tx.run(query, name=key, props=_primitive_props(item)).single()["node_id"]
+                    tx.run("MATCH (p), (c) WHERE elementId(p) = $parent_id AND elementId(c) = $child_id "
+                           "CREATE (p)-[:HAS_CHILD]->(c)", parent_id=parent_id, child_id=child_id)
+                    create_nodes_recursively(tx, item, parent_id=child_id, node_label=node_label)
+                else:
+                    tx.run("MATCH (n) WHERE elementId(n) = $parent_id "
+                           "SET n[$key] = coalesce(n[$key], []) + $value", parent_id=parent_id, key=key, value=item)
+        else:
+            tx.run("MATCH (n) WHERE elementId(n) = $parent_id SET n[$key] = $value",
+                   parent_id=parent_id, key=key, value=value)
+    return parent_id
+
+
+class BaselineGraph(FakeGraph):
+    """A FakeGraph that also runs the baseline writer's per-node statements"""
+
+    def _node(self, match, name, props):
+        return [{"node_id": self.create([match.group(1)], dict(props, name=name))}]
+
+    def _edge(self, match, parent_id, child_id):
+        self.relate(parent_id, "HAS_CHILD", child_id)
+        return []
+
+    def _set(self, match, parent_id, key, value):
+        self.nodes[parent_id]["props"][key] = value
+        return []
+
+    def _append(self, match, parent_id, key, value):
+        props = self.nodes[parent_id]["props"]
+        props[key] = list(props.get(key) or []) + [value]
+        return []
+
+    HANDLERS = [
+        (r"^CREATE \(n:(\w+) \{name: \$name\}\) SET n \+= \$props", _node),
+        (r"CREATE \(p\)-\[:HAS_CHILD\]->\(c\)$", _edge),
+        (r"SET n\[\$key\] = \$value", _set),
+        (r"SET n\[\$key\] = coalesce\(n\[\$key\], \[\]\) \+ \$value", _append),
+    ] + FakeGraph.HANDLERS
+
+
+def undoubled(tree):
+    """The baseline set a child's primitive lists as properties and then appended them again; keep one copy"""
+    labels, props, children = tree
+    props = {key: value[:len(value) // 2] if isinstance(value, list) and value and value[:len(value) // 2] * 2 == value
+             else value for key, value in props.items()}
+    return labels, props, [undoubled(child) for child in children]
+
+
+def cases():
+    return {"case": [parse_case(parse_html(judgment_page(random.Random(number), number, paragraphs=3)))
+                     for number in range(1, 4)]}
+
+
+MIXED = {"title": "Act", "version": 2, "notes": ["first", {"text": "a note"}, "second"],
+         "part": {"title": "Part I", "sections": [{"title": "1", "tags": ["x", "y"]}, {"title": "2"}]}}
+
+
+@pytest.mark.parametrize("data", [cases(), parse_constitution_file(CONSTITUTION), MIXED],
+                         ids=["cases", "constitution", "mixed"])
+def test_write_tree_matches_the_per_node_writer(data):
+    baseline = BaselineGraph()
+    baseline_root = create_nodes_recursively(baseline, data)
+    graph = FakeGraph()
+    root = write_tree(graph, data)
+    assert graph.tree(root) == undoubled(baseline.tree(baseline_root))
+    assert graph.labelled("Constitution") == [root]
+    assert len(graph.edges) == len(baseline.edges) == len(graph.nodes) - 1
+
+
+@pytest.mark.parametrize("data", [cases(), MIXED], ids=["cases", "mixed"])
+def test_subtrees_under_existing_parents_match_the_per_node_writer(data):
+    baseline = BaselineGraph()
+    parent = baseline.create(["Station"], {"name": "Nairobi"})
+    create_nodes_recursively(baseline, data, parent_id=parent)
+    graph = FakeGraph()
+    first, second = graph.create(["Station"], {"name": "Nairobi"}), graph.create(["Station"], {"name": "Nairobi"})
+    write_tree(graph, data, parent_id=first)
+    write_subtrees(graph, [(second, data)])
+    expected = undoubled(baseline.tree(parent))
+    assert graph.tree(first) == expected
+    # write_subtrees leaves the parent's own properties alone; only the children are written
+    labels, _, children = graph.tree(second)
+    assert (labels, children) == (expected[0], expected[2])
@@ -0,0 +1,24 @@
+import os
+
+from data_acquisition import legislation
+from data_acquisition.graph_upsert import document_key
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "constitution.html")
+
+
+def test_acts_are_keyed_on_their_source():
+    same_title = {"cover page": {"title": "The Finance Act"}}
+    first = dict(same_title, source="/akn/ke/act/2023/4")
+    second = dict(same_title, source="/akn/ke/act/2023/4/eng@2024-01-01")
+    assert document_key(first) != document_key(second)
+    assert document_key({"cover page": {"title": ""}, "source": "/akn/ke/act/2012/18"}) == "/akn/ke/act/2012/18"
+    assert document_key(same_title) == "The Finance Act"
+
+
+def test_default_store_passes_the_source_as_key(monkeypatch):
+    calls = []
+    monkeypatch.setattr("data_acquisition.constitution.insert_hierarchy",
+                        lambda data, root_label, key=None: calls.append((root_label, key)))
+    report = legislation.ingest_corpus([FIXTURE], workers=1)
+    assert report["failed"] == 0
+    assert calls == [(legislation.LEGISLATION_ROOT_LABEL, FIXTURE)]
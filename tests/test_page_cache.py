@@ -0,0 +1,79 @@
+import os
+import threading
+
+from data_acquisition.page_cache import PageCache
+
+
+def stored_bytes(cache):
+    return cache._db.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)"
+    ).fetchone()[0]
+
+
+def page(number, size=2000):
+    # Random-ish text so gzip can't shrink pages to nothing
+    return "".join(chr(33 + (number * 7919 + i * 104729) % 90) for i in range(size))
+
+
+def test_round_trip_with_validators(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put("http://x/a", 200, "<html>a</html>", etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    cached = cache.get("http://x/a")
+    assert (cached.status, cached.text, cached.etag) == (200, "<html>a</html>", '"v1"')
+    assert cache.get("http://x/missing") is None
+
+
+def test_identical_pages_share_a_blob(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put("http://x/a", 200, page(1))
+    cache.put("http://x/b", 200, page(1))
+    assert cache.stats()["blobs"] == 1
+    assert cache.total_bytes() == stored_bytes(cache)
+    cache.delete("http://x/a")
+    assert cache.get("http://x/b").text == page(1)
+    cache.put("http://x/b", 200, page(2))
+    assert cache.stats()["blobs"] == 1
+    assert cache.total_bytes() == stored_bytes(cache)
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=10 ** 9)
+    for number in range(5):
+        cache.put(f"http://x/{number}", 200, page(number))
+    blob = cache.total_bytes() // 5
+    cache.get("http://x/0")
+    cache.max_bytes = blob * 3
+    cache.put("http://x/5", 200, page(5))
+    kept = {url for url, in cache._db.execute("SELECT url FROM pages")}
+    assert kept == {"http://x/0", "http://x/4", "http://x/5"}
+    assert cache.total_bytes() == stored_bytes(cache) <= cache.max_bytes
+
+
+def test_running_total_survives_reopen(tmp_path):
+    cache = PageCache(str(tmp_path))
+    for number in range(3):
+        cache.put(f"http://x/{number}", 200, page(number))
+    total = cache.total_bytes()
+    cache.close()
+    assert PageCache(str(tmp_path)).total_bytes() == total
+
+
+def test_concurrent_puts_and_evictions_keep_every_blob(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=20000)
+
+    def fill(worker):
+        for number in range(40):
+            # Workers overlap on content, so blobs are shared and evicted under each other
+            cache.put(f"http://x/{worker}/{number}", 200, page(number % 15))
+
+    threads = [threading.Thread(target=fill, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.total_bytes() == stored_bytes(cache) <= cache.max_bytes
+    for content_hash, in cache._db.execute("SELECT DISTINCT content_hash FROM pages"):
+        assert os.path.exists(cache._blob_path(content_hash))
+    for url, in cache._db.execute("SELECT url FROM pages").fetchall():
+        assert cache.get(url) is not None
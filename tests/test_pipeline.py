@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from data_acquisition.pipeline import run_pipeline
+
+
+def producer_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "pipeline-producer"]
+
+
+def test_writes_every_item_in_batches():
+    batches = []
+    assert run_pipeline(range(7), batches.append, batch_size=3, queue_size=2) == 7
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_partial_batch_is_flushed_after_interval():
+    flushed = threading.Event()
+    batches = []
+
+    def items():
+        yield from range(3)
+        # The batch isn't full; it must still be written while this producer is busy
+        flushed.wait(5)
+        yield 3
+
+    def write(batch):
+        batches.append(batch)
+        flushed.set()
+
+    run_pipeline(items(), write, batch_size=50, flush_interval=0.1)
+    assert batches == [[0, 1, 2], [3]]
+
+
+def test_producer_error_is_raised_after_earlier_items_are_written():
+    batches = []
+
+    def items():
+        yield 1
+        yield 2
+        raise RuntimeError("listing page failed")
+
+    with pytest.raises(RuntimeError, match="listing page failed"):
+        run_pipeline(items(), batches.append, batch_size=10)
+    assert batches == [[1, 2]]
+
+
+def test_writer_failure_stops_producer_before_returning():
+    in_use = threading.Event()
+
+    def items():
+        for number in range(20):
+            in_use.set()
+            time.sleep(0.01)
+            in_use.clear()
+            yield number
+
+    def write(batch):
+        raise ConnectionError("graph unavailable")
+
+    with pytest.raises(ConnectionError):
+        run_pipeline(items(), write, batch_size=2, queue_size=1)
+    # The caller may now close what the producer was using
+    assert not producer_threads()
+    assert not in_use.is_set()
+
+
+def test_writer_failure_unblocks_a_finished_producer():
+    def write(batch):
+        # Meanwhile the producer runs out of items and blocks on the full queue
+        time.sleep(0.2)
+        raise ConnectionError("graph unavailable")
+
+    start = time.monotonic()
+    with pytest.raises(ConnectionError):
+        run_pipeline(iter(range(3)), write, batch_size=2, queue_size=1)
+    assert not producer_threads()
+    assert time.monotonic() - start < 3
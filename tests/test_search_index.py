@@ -0,0 +1,123 @@
+import pytest
+
+from data_acquisition.search_index import SearchIndex
+
+
+def test_readding_a_shorter_case_drops_its_old_paragraphs(tmp_path, make_case):
+    index = SearchIndex(str(tmp_path))
+    index.add_case("/akn/ke/judgment/kebench/1/eng", make_case(paragraphs=14))
+    index.add_case("/akn/ke/judgment/kebench/2/eng", make_case(paragraphs=3))
+    index.flush()
+    index.add_case("/akn/ke/judgment/kebench/1/eng", make_case(paragraphs=13))
+    index.flush()
+    assert index.stats()["documents"] == 16
+    assert not [hit for hit in index.search("paragraph 14") if hit["key"].endswith("#14")]
+    index.close()
+
+    reopened = SearchIndex(str(tmp_path))
+    assert reopened.stats()["documents"] == 16
+    reopened.close()
+
+
+def test_readding_a_buffered_case_replaces_it(tmp_path, make_case):
+    index = SearchIndex(str(tmp_path))
+    index.add_case("/akn/ke/judgment/kebench/1/eng", make_case(paragraphs=5, topic="tenancy"))
+    index.add_case("/akn/ke/judgment/kebench/1/eng", make_case(paragraphs=2, topic="succession"))
+    index.flush()
+    assert index.stats()["documents"] == 2
+    assert {hit["paragraph"] for hit in index.search("succession")} == {"1", "2"}
+    index.close()
+
+
+def test_a_case_readded_empty_stays_removed_after_reopen(tmp_path, make_case):
+    index = SearchIndex(str(tmp_path))
+    index.add_case("/akn/ke/judgment/kebench/1/eng", make_case(paragraphs=4))
+    index.flush()
+    index.add_case("/akn/ke/judgment/kebench/1/eng", make_case(paragraphs=0))
+    index.close()
+    reopened = SearchIndex(str(tmp_path))
+    assert reopened.stats()["documents"] == 0
+    reopened.close()
+
+
+def test_merge_keeps_sources_replaceable(tmp_path, make_case):
+    index = SearchIndex(str(tmp_path), max_segments=100)
+    for version in (6, 5, 4):
+        index.add_case("/akn/ke/judgment/kebench/1/eng", make_case(paragraphs=version))
+        index.flush()
+    index.merge()
+    index.add_case("/akn/ke/judgment/kebench/1/eng", make_case(paragraphs=2))
+    index.flush()
+    assert index.stats()["documents"] == 2
+    index.close()
+
+
+def judgment(*paragraphs, court="High Court", date="1 March 2020"):
+    return {"Header": {"authority": court, "date": date}, "Body": {str(n): text for n, text in enumerate(paragraphs, 1)}}
+
+
+JUDGMENTS = {
+    "/kehc/1": judgment("The tenancy was terminated without notice of the tenancy termination.",
+                        "Costs to the respondent."),
+    "/kehc/2": judgment("A long judgment that mentions the tenancy once among many other words about land, "
+                        "succession, evidence, procedure, the appeal, the ruling and the costs of the suit.",
+                        court="High Court", date="5 June 2021"),
+    "/keca/1": judgment("The notice of termination of the tenancy was valid.", court="Court of Appeal",
+                        date="10 January 2019"),
+    "/kesc/1": judgment("Termination notice was served; the tenancy ended.", court="Supreme Court",
+                        date="2 February 2022"),
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path), max_segments=100)
+    for number, (link, data) in enumerate(JUDGMENTS.items()):
+        index.add_case(link, data, station=f"/station/{number % 2}")
+        # One segment per case, to exercise scoring across segments
+        index.flush()
+    yield index
+    index.close()
+
+
+def keys(hits):
+    return [hit["key"] for hit in hits]
+
+
+def test_bm25_ranks_frequent_terms_in_short_paragraphs_first(index):
+    hits = index.search("tenancy")
+    assert keys(hits)[0] == "/kehc/1#1" and keys(hits)[-1] == "/kehc/2#1"
+    assert [hit["score"] for hit in hits] == sorted((hit["score"] for hit in hits), reverse=True)
+    # The rarer term outweighs the common one
+    assert keys(index.search("tenancy costs"))[:2] == ["/kehc/1#2", "/kehc/2#1"]
+    assert index.search("tenancy", k=2) == hits[:2]
+    assert index.search("adjournment") == [] and index.search("   ") == []
+
+
+def test_quoted_phrases_must_match_in_order(index):
+    assert set(keys(index.search("termination notice"))) == {"/kehc/1#1", "/keca/1#1", "/kesc/1#1"}
+    assert keys(index.search('"termination notice"')) == ["/kesc/1#1"]
+    assert keys(index.search('"notice of termination" tenancy')) == ["/keca/1#1"]
+    assert index.search('"tenancy notice"') == []
+
+
+def test_filters_restrict_by_court_station_and_date(index):
+    assert keys(index.search("tenancy", court="court of appeal")) == ["/keca/1#1"]
+    assert set(keys(index.search("tenancy", station="/station/0"))) == {"/kehc/1#1", "/keca/1#1"}
+    assert set(keys(index.search("tenancy", date_from="2020-03-01"))) == {"/kehc/1#1", "/kehc/2#1", "/kesc/1#1"}
+    assert set(keys(index.search("tenancy", date_from="2020-01-01", date_to="2021-12-31"))) == {"/kehc/1#1",
+                                                                                                 "/kehc/2#1"}
+    assert index.search("tenancy", court="Magistrates Court") == []
+
+
+def test_merge_returns_the_same_results(index):
+    queries = ["tenancy", "tenancy costs", '"termination notice"', "notice"]
+    before = [[(hit["key"], round(hit["score"], 5)) for hit in index.search(query)] for query in queries]
+    index.add_case("/kehc/1", judgment("Costs to the respondent."))
+    index.add_case("/kehc/1", JUDGMENTS["/kehc/1"])
+    index.flush()
+    assert index.stats()["segments"] == 5
+    index.merge()
+    assert index.stats()["segments"] == 1 and index.stats()["documents"] == 5
+    after = [[(hit["key"], round(hit["score"], 5)) for hit in index.search(query)] for query in queries]
+    assert after == before
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from benchmarks.fixtures import FixtureServer
+from data_acquisition.async_fetcher import AsyncFetcher
+from data_acquisition.fetcher import fetch_page
+from data_acquisition.throttle import (CLOSED, HALF_OPEN, OPEN, AIMDLimit, CircuitBreaker, CircuitOpenError,
+                                       Throttle, backoff_delay, classify_status, configure_throttle,
+                                       retry_after_seconds)
+
+FAST_RETRIES = {"retry_base": 0.001, "retry_cap": 0.01}
+
+
+def judgment(server, number):
+    return f"{server.base_url}/akn/ke/judgment/kebench/{number}/eng"
+
+
+# AIMD limit
+
+def test_limit_grows_by_one_per_round_trip_only_when_saturated():
+    limit = AIMDLimit(initial=4, maximum=8)
+    limit.on_success(0.01, limit.epoch, saturated=False)
+    assert limit.limit == 4
+    for _ in range(4):
+        limit.on_success(0.01, limit.epoch, saturated=True)
+    assert 4.9 < limit.limit < 5
+    for _ in range(100):
+        limit.on_success(0.01, limit.epoch, saturated=True)
+    assert limit.limit == 8
+
+
+def test_limit_backs_off_once_per_epoch():
+    limit = AIMDLimit(initial=16, minimum=2, backoff=0.5)
+    epoch = limit.epoch
+    # A burst of failures from requests admitted in the same epoch
+    assert [limit.on_failure(epoch) for _ in range(5)] == [True, False, False, False, False]
+    assert limit.limit == 8
+    for _ in range(5):
+        limit.on_failure(limit.epoch)
+    assert limit.limit == 2 and limit.slots == 2
+
+
+def test_slow_responses_count_as_failures():
+    limit = AIMDLimit(initial=8, latency_target=1.0)
+    assert limit.on_success(2.0, limit.epoch, saturated=True)
+    assert limit.limit == 4
+
+
+# Circuit breaker
+
+def test_breaker_opens_after_threshold_and_probes_after_cooldown():
+    breaker = CircuitBreaker(threshold=3, cooldown=10)
+    assert not breaker.on_failure(0.0)
+    assert not breaker.on_failure(0.0, counts=False)
+    assert not breaker.on_failure(0.0)
+    assert breaker.on_failure(1.0)
+    assert breaker.state == OPEN
+    assert breaker.wait_time(5.0) == pytest.approx(6.0)
+    # After the cooldown one probe goes through, the others wait for it
+    assert breaker.wait_time(11.0) == 0.0
+    assert breaker.state == HALF_OPEN
+    assert breaker.wait_time(11.0) == 10
+    assert breaker.on_success()
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.on_failure(0.0)
+    assert breaker.wait_time(10.0) == 0.0
+    assert breaker.on_failure(10.0, counts=False)
+    assert breaker.state == OPEN and breaker.wait_time(15.0) == pytest.approx(5.0)
+
+
+# Retry and backoff
+
+def test_backoff_is_full_jitter_within_the_cap():
+    delays = [backoff_delay(attempt, base=0.5, cap=3) for attempt in range(6) for _ in range(50)]
+    assert all(0 <= delay <= 3 for delay in delays)
+    assert max(backoff_delay(0, base=0.5, cap=3) for _ in range(50)) <= 0.5
+    assert 7 <= backoff_delay(0, base=0.5, cap=30, retry_after=7) <= 7.5
+    assert backoff_delay(0, base=0.5, cap=3, retry_after=60) == 3
+
+
+def test_retry_after_and_status_classification():
+    assert retry_after_seconds("12") == 12
+    assert 25 <= retry_after_seconds(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert retry_after_seconds("soon") is None
+    assert classify_status(429, "3") == (True, 3)
+    assert classify_status(503) == (True, None)
+    assert classify_status(404) == (False, None)
+
+
+# Throttle against the fixture server
+
+def test_fetch_retries_server_errors_until_they_succeed(fixture_dir):
+    throttle = configure_throttle(True, retries=8, **FAST_RETRIES)
+    with FixtureServer(fixture_dir, error_rate=0.4, seed=3) as server:
+        statuses = [fetch_page(judgment(server, number))[0] for number in range(1, 11)]
+        faults = dict(server.faults)
+    assert statuses == [200] * 10
+    state = throttle.host(server.base_url)
+    assert faults["errors"] > 0
+    assert state.retries == faults["errors"]
+    assert state.limit.decreases > 0
+
+
+def test_limit_settles_under_server_capacity(fixture_dir):
+    throttle = Throttle(initial=16, maximum=16, retries=10, **FAST_RETRIES)
+    with FixtureServer(fixture_dir, latency=0.02, capacity=3, retry_after=0) as server:
+        session = requests.Session()
+
+        def fetch(number):
+            url = judgment(server, number)
+            response = throttle.call(url, lambda: session.get(url, timeout=10),
+                                     classify=lambda r: classify_status(r.status_code, r.headers.get("Retry-After")))
+            return response.status_code
+
+        with ThreadPoolExecutor(16) as pool:
+            statuses = list(pool.map(fetch, [number % 25 + 1 for number in range(64)]))
+        overloaded = server.faults["overloaded"]
+    assert statuses == [200] * 64
+    assert overloaded > 0
+    state = throttle.host(server.base_url)
+    assert state.limit.limit < 16 and state.limit.decreases > 0
+    assert state.in_flight == 0
+
+
+def test_open_circuit_fails_fast_instead_of_waiting(fixture_dir):
+    throttle = configure_throttle(True, retries=1, breaker_threshold=2, breaker_cooldown=30,
+                                  breaker_max_wait=0.2, **FAST_RETRIES)
+    with FixtureServer(fixture_dir, error_rate=1.0) as server:
+        # Both attempts fail, each in a new epoch, so the second opens the circuit
+        assert fetch_page(judgment(server, 1))[0] == 503
+        started = time.monotonic()
+        with pytest.raises(CircuitOpenError):
+            fetch_page(judgment(server, 2))
+        requests_made = server.faults["requests"]
+    assert time.monotonic() - started < 2
+    assert requests_made == 2
+    assert throttle.host(server.base_url).breaker.state == OPEN
+
+
+def test_half_open_probe_closes_the_circuit_once_the_host_recovers():
+    throttle = Throttle(retries=0, breaker_threshold=1, breaker_cooldown=0.05, **FAST_RETRIES)
+    outcomes = iter([503, 200])
+    assert throttle.call("http://host/a", lambda: next(outcomes), classify=classify_status) == 503
+    assert throttle.host("http://host/").breaker.state == OPEN
+    assert throttle.call("http://host/b", lambda: next(outcomes), classify=classify_status) == 200
+    assert throttle.host("http://host/").breaker.state == CLOSED
+
+
+def test_async_throttle_retries_overload_against_the_fixture_server(fixture_dir):
+    async def run(server):
+        async with AsyncFetcher(per_host_limit=16) as fetcher:
+            fetcher.throttle.retries = 10
+            fetcher.throttle.retry_base, fetcher.throttle.retry_cap = 0.001, 0.01
+            results = await asyncio.gather(*(fetcher.fetch_page(judgment(server, number))
+                                             for number in range(1, 26)))
+            return [status for status, _ in results], fetcher.throttle.host(server.base_url)
+
+    with FixtureServer(fixture_dir, latency=0.02, capacity=3, retry_after=0) as server:
+        statuses, state = asyncio.run(run(server))
+        overloaded = server.faults["overloaded"]
+    assert statuses == [200] * 25
+    assert overloaded > 0 and state.retries == overloaded
+    assert state.limit.limit < 16 and state.in_flight == 0
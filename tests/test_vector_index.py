@@ -0,0 +1,55 @@
+import random
+
+import numpy as np
+
+from benchmarks.fixtures import judgment_page
+from data_acquisition.case_law.courts_and_tribunals.case_parser import parse_case
+from data_acquisition.documents import case_documents
+from data_acquisition.fetcher import parse_html
+from data_acquisition.vector_index import HashingEmbedder, VectorIndex
+
+
+def corpus(make_case, cases):
+    return (document for number in range(1, cases + 1)
+            for document in case_documents(f"/akn/ke/judgment/kebench/{number}/eng", make_case(number)))
+
+
+def test_one_add_appends_in_full_batches(tmp_path, make_case, monkeypatch):
+    index = VectorIndex(str(tmp_path), embedder=HashingEmbedder(32))
+    appends = []
+    append = index._append
+    monkeypatch.setattr(index, "_append", lambda documents: appends.append(len(documents)) or append(documents))
+    assert index.add(corpus(make_case, 500), batch_size=256) == 1500
+    assert appends == [256] * 5 + [220]
+    assert len(index.courts) == len(index.deleted) == 1500
+
+
+def test_rows_and_filters_survive_reopen(tmp_path, make_case):
+    index = VectorIndex(str(tmp_path), embedder=HashingEmbedder(32))
+    index.add(corpus(make_case, 400))
+    index.add_case("/akn/ke/judgment/kebench/7/eng", make_case(7, court="High Court"))
+    assert int((~index.deleted).sum()) == 1200
+    hits = index.search("land tenure", k=5, court="high court", exact=True)
+    assert {hit["key"].split("#")[0] for hit in hits} == {"/akn/ke/judgment/kebench/7/eng"}
+
+    reopened = VectorIndex(str(tmp_path))
+    assert len(reopened.records) == 1203
+    np.testing.assert_array_equal(reopened.deleted, index.deleted)
+    np.testing.assert_array_equal(reopened.courts, index.courts)
+    reopened.build_ann(lists=8)
+    assert reopened.search("land tenure", k=3, court="High Court")
+
+
+def test_ivf_with_default_settings_keeps_recall(tmp_path, make_case):
+    index = VectorIndex(str(tmp_path))
+    index.add(document for number in range(1, 1001)
+              for document in case_documents(f"/akn/ke/judgment/kebench/{number}/eng",
+                                             parse_case(parse_html(judgment_page(random.Random(number), number, 3)))))
+    index.build_ann()
+    report = index.evaluate(queries=100, k=10)
+    assert report["vectors"] == 3000 and report["lists"] == 54 and report["nprobe"] == 14
+    assert report["recall"] >= 0.8
+    # Vectors added after the build are scanned in full
+    index.add_case("/akn/ke/judgment/kebench/late/eng", make_case(9999))
+    hit, = index.search("case 9999 paragraph 2 on land tenure and succession", k=1)
+    assert hit["key"] == "/akn/ke/judgment/kebench/late/eng#2"